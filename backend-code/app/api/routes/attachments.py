@@ -0,0 +1,134 @@
+import re
+import uuid
+from email.utils import format_datetime, parsedate_to_datetime
+from urllib.parse import quote
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from minio.error import S3Error
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import get_db
+from app.db.models import Attachment, ConversationParticipant, Message, User
+from app.services.auth import Principal, get_current_principal
+from app.services.minio_client import stat_object, stream_object
+
+router = APIRouter()
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+# Uploader-supplied types that browsers may render in place; anything else (HTML, SVG, XML, scripts...)
+# is served as an opaque download so it can never execute on this origin
+INLINE_TYPES = frozenset({
+    "image/png", "image/jpeg", "image/gif", "image/webp", "image/avif", "image/bmp",
+    "video/mp4", "video/webm", "video/ogg", "video/quicktime",
+    "audio/mpeg", "audio/ogg", "audio/wav", "audio/webm", "audio/mp4", "audio/aac", "audio/flac",
+    "application/pdf",
+})
+
+
+def _parse_range(header: str, size: int) -> tuple[int, int] | None:
+    # Single byte range -> inclusive (start, end); None when the header is absent or ignorable
+    m = _RANGE_RE.match(header.strip())
+    if not m or (not m.group(1) and not m.group(2)):
+        return None
+    if m.group(1):
+        start = int(m.group(1))
+        end = int(m.group(2)) if m.group(2) else size - 1
+    else:
+        suffix = int(m.group(2))
+        start, end = max(size - suffix, 0), size - 1
+    if start >= size or end < start:
+        raise HTTPException(
+            status_code=416,
+            detail="Range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}", "X-Content-Type-Options": "nosniff"},
+        )
+    return start, min(end, size - 1)
+
+
+def _not_modified(request: Request, etag: str, last_modified) -> bool:
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        return inm.strip() == "*" or etag in [t.strip() for t in inm.split(",")]
+    ims = request.headers.get("if-modified-since")
+    if ims and last_modified is not None:
+        try:
+            return int(last_modified.timestamp()) <= int(parsedate_to_datetime(ims).timestamp())
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+@router.get("/{attachment_id}")
+async def download_attachment(
+    attachment_id: str,
+    request: Request,
+    thumbnail: bool = False,
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        att_uuid = uuid.UUID(attachment_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid attachment id")
+
+    # the attachment must belong to a conversation the caller participates in
+    caller_id = principal.uid or select(User.id).where(User.email == principal.sub).scalar_subquery()
+    res = await db.execute(
+        select(Attachment)
+        .join(Message, Message.id == Attachment.message_id)
+        .join(ConversationParticipant, ConversationParticipant.conversation_id == Message.conversation_id)
+        .where(Attachment.id == att_uuid, ConversationParticipant.user_id == caller_id)
+        .limit(1)
+    )
+    att = res.scalar_one_or_none()
+    if not att:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    object_key = att.thumbnail_url if thumbnail else att.storage_url
+    if not object_key:
+        raise HTTPException(status_code=404, detail="Thumbnail not ready")
+
+    try:
+        stat = await stat_object(object_key)
+    except S3Error:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    etag = f'"{stat.etag}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=86400",
+        "X-Content-Type-Options": "nosniff",
+    }
+    if stat.last_modified is not None:
+        headers["Last-Modified"] = format_datetime(stat.last_modified, usegmt=True)
+    # conditional hit: answer from metadata alone, no object fetch
+    if _not_modified(request, etag, stat.last_modified):
+        return Response(status_code=304, headers=headers)
+
+    size = stat.size
+    if thumbnail:
+        media_type = "image/jpeg"
+    else:
+        media_type = (att.content_type or stat.content_type or "").split(";")[0].strip().lower()
+        disposition = "inline"
+        if media_type not in INLINE_TYPES:
+            media_type, disposition = "application/octet-stream", "attachment"
+        headers["Content-Disposition"] = f"{disposition}; filename*=UTF-8''{quote(att.file_name)}"
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    # If-Range: only honor the range if the client's validator still matches
+    if range_header and request.headers.get("if-range", etag) == etag:
+        byte_range = _parse_range(range_header, size)
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(stream_object(object_key), media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        stream_object(object_key, start, end - start + 1),
+        status_code=206,
+        media_type=media_type,
+        headers=headers,
+    )
@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
-from app.db.models import User
+from app.db.models import GmailAccount, User
 from app.core.config import settings
 from app.services.auth import create_access_token, get_current_subject
+from app.services.user_cache import get_user_by_email, invalidate_user
+from app.services.gmail_sync import schedule_account
 
 router = APIRouter()
 
@@ -12,6 +15,8 @@ SCOPES = [
     "openid",
     "email",
     "profile",
+    "https://www.googleapis.com/auth/gmail.readonly",
+    "https://www.googleapis.com/auth/gmail.send",
 ]
 
 def _google_auth_url(state: str = "state") -> str:
@@ -97,6 +102,19 @@ async def google_callback(
         db.add(user)
     await db.commit()
     await db.refresh(user)
+    await invalidate_user(user.email)
+
+    # prompt=consent returns a refresh token on every login; keep the newest one
+    refresh_token = tokens.get("refresh_token")
+    if refresh_token:
+        stmt = pg_insert(GmailAccount).values(user_id=user.id, email=email, refresh_token=refresh_token)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[GmailAccount.user_id],
+            set_={"email": stmt.excluded.email, "refresh_token": stmt.excluded.refresh_token, "sync_error": None},
+        ).returning(GmailAccount.id)
+        account_id = (await db.execute(stmt)).scalar_one()
+        await db.commit()
+        await schedule_account(account_id, only_new=True)
 
     token = create_access_token(subject=user.email, extra={"uid": str(user.id)})
     
@@ -117,17 +135,10 @@ async def google_callback(
 
 @router.get("/me")
 async def me(subject: str = Depends(get_current_subject), db: AsyncSession = Depends(get_db)):
-    res = await db.execute(select(User).where(User.email == subject))
-    user = res.scalar_one_or_none()
+    user = await get_user_by_email(db, subject)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return {
-        "id": str(user.id),
-        "email": user.email,
-        "display_name": user.display_name,
-        "avatar_url": user.avatar_url,
-        "provider": user.provider,
-    }
+    return user
 
 
 @router.post("/profile")
@@ -136,13 +147,13 @@ async def update_profile(
     subject: str = Depends(get_current_subject),
     db: AsyncSession = Depends(get_db),
 ):
-    res = await db.execute(select(User).where(User.email == subject))
-    user = res.scalar_one_or_none()
-    if not user:
+    if display_name is None:
+        if not await get_user_by_email(db, subject):
+            raise HTTPException(status_code=404, detail="User not found")
+        return {"ok": True}
+    res = await db.execute(update(User).where(User.email == subject).values(display_name=display_name))
+    if res.rowcount == 0:
         raise HTTPException(status_code=404, detail="User not found")
-    if display_name is not None:
-        user.display_name = display_name
-    db.add(user)
     await db.commit()
-    await db.refresh(user)
+    await invalidate_user(subject)
     return {"ok": True}
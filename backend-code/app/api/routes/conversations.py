@@ -1,19 +1,93 @@
+from datetime import datetime
 import uuid
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func, insert, select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.db.session import get_db
-from app.db.models import Conversation, ConversationParticipant, User
-from app.schemas.common import ConversationOut, CreateConversationIn
+from sqlalchemy.orm import aliased
+from app.db.session import get_db, get_read_db
+from app.db.models import Conversation, ConversationParticipant, Message, User
+from app.schemas.common import ConversationOut, CreateConversationIn, InboxPage
+from app.services.auth import Principal, get_current_principal
+from app.services.codec import RowJSONResponse
+from app.services.pagination import encode_cursor, decode_cursor
+from app.services.redis_client import publish
+from app.services.user_cache import get_user_ids
+from app.services.ws_registry import set_members
 
 router = APIRouter()
 
-@router.get("/", response_model=list[ConversationOut])
-async def list_conversations(user_id: str | None = None, db: AsyncSession = Depends(get_db)):
-    # MVP: return all conversations if no user filter
-    res = await db.execute(select(Conversation).order_by(Conversation.created_at.desc()))
-    rows = res.scalars().all()
-    return rows
+PREVIEW_CHARS = 140
+
+@router.get("/", response_model=InboxPage)
+async def list_conversations(
+    cursor: str | None = None,
+    limit: int = Query(30, ge=1, le=100),
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db),
+):
+    # Caller's inbox ordered by last activity, with latest-message preview and unread count,
+    # in one query driven by ix_conversation_participants_user_id.
+    # tokens minted by google_callback carry the uid claim; older ones fall back to an email lookup
+    caller_id = principal.uid or select(User.id).where(User.email == principal.sub).scalar_subquery()
+    # unread = newer than the caller's read high-water mark and not sent by the caller
+    unread = (
+        select(func.count())
+        .where(
+            Message.conversation_id == Conversation.id,
+            Message.created_at > func.coalesce(ConversationParticipant.last_read_at, datetime.min),
+            Message.sender_user_id.is_distinct_from(caller_id),
+        )
+        .correlate(Conversation, ConversationParticipant)
+        .scalar_subquery()
+    )
+    last_msg = aliased(Message)
+    activity = func.coalesce(Conversation.last_message_at, Conversation.created_at)
+    stmt = (
+        select(
+            Conversation.id,
+            Conversation.subject,
+            Conversation.created_at,
+            activity.label("last_message_at"),
+            last_msg.id.label("m_id"),
+            last_msg.sender_user_id,
+            last_msg.external_from_email,
+            func.left(last_msg.body_text, PREVIEW_CHARS).label("preview"),
+            last_msg.created_at.label("m_created_at"),
+            unread.label("unread_count"),
+        )
+        .select_from(ConversationParticipant)
+        .join(Conversation, Conversation.id == ConversationParticipant.conversation_id)
+        .outerjoin(last_msg, last_msg.id == Conversation.last_message_id)
+        .where(ConversationParticipant.user_id == caller_id)
+    )
+    if cursor:
+        stmt = stmt.where(tuple_(activity, Conversation.id) < tuple_(*decode_cursor(cursor)))
+    stmt = stmt.order_by(activity.desc(), Conversation.id.desc()).limit(limit + 1)
+    rows = (await db.execute(stmt)).all()
+
+    # InboxItem-shaped dicts straight from the row tuples; encoded by orjson without re-validation
+    items = [
+        {
+            "id": r.id,
+            "subject": r.subject,
+            "created_at": r.created_at,
+            "last_message_at": r.last_message_at,
+            "last_message": {
+                "id": r.m_id,
+                "sender_user_id": r.sender_user_id,
+                "external_from_email": r.external_from_email,
+                "body_text": r.preview,
+                "created_at": r.m_created_at,
+            } if r.m_id else None,
+            "unread_count": r.unread_count,
+        }
+        for r in rows[:limit]
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last.last_message_at, last.id)
+    return RowJSONResponse({"items": items, "next_cursor": next_cursor})
 
 @router.post("/", response_model=ConversationOut)
 async def create_conversation(payload: CreateConversationIn, creator_user_id: str | None = None, db: AsyncSession = Depends(get_db)):
@@ -21,38 +95,44 @@ async def create_conversation(payload: CreateConversationIn, creator_user_id: st
     db.add(convo)
     await db.flush()
 
-    # Add participants: if user exists, use user_id, else external_email
-    for email in payload.participants:
-        res = await db.execute(select(User).where(User.email == email))
-        user = res.scalar_one_or_none()
-        part = ConversationParticipant(
-            conversation_id=convo.id,
-            user_id=user.id if user else None,
-            external_email=None if user else email,
+    # Add participants: if user exists, use user_id, else external_email.
+    # One IN lookup and one multi-row insert regardless of participant count.
+    emails = list(dict.fromkeys(payload.participants))
+    if emails:
+        user_ids = await get_user_ids(db, emails)
+        # Core insert on the table: the ORM bulk path drops None values and would split the rows into one
+        # statement per alternating user_id / external_email run
+        await db.execute(
+            insert(ConversationParticipant.__table__),
+            [
+                {
+                    "conversation_id": convo.id,
+                    "user_id": user_ids.get(email),
+                    "external_email": None if email in user_ids else email,
+                }
+                for email in emails
+            ],
         )
-        db.add(part)
 
     await db.commit()
-    await db.refresh(convo)
+    await set_members(str(convo.id), emails)
+    # let WS workers route this conversation's events to already-connected participants
+    await publish("events:conversations", {"conversation_id": str(convo.id), "participants": payload.participants})
     return convo
 
 
 @router.get("/{conversation_id}/participants")
-async def get_participants(conversation_id: str, db: AsyncSession = Depends(get_db)):
+async def get_participants(conversation_id: str, db: AsyncSession = Depends(get_read_db)):
     try:
         convo_uuid = uuid.UUID(conversation_id)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid conversation id")
-    res = await db.execute(select(ConversationParticipant).where(ConversationParticipant.conversation_id == convo_uuid))
-    parts = res.scalars().all()
-    # return emails (registered users by email + external_email)
-    emails: list[str] = []
-    for p in parts:
-        if p.user_id:
-            ures = await db.execute(select(User).where(User.id == p.user_id))
-            u = ures.scalar_one_or_none()
-            if u and u.email:
-                emails.append(u.email)
-        elif p.external_email:
-            emails.append(p.external_email)
+    # return emails (registered users by email + external_email) in a single join
+    res = await db.execute(
+        select(func.coalesce(User.email, ConversationParticipant.external_email))
+        .select_from(ConversationParticipant)
+        .outerjoin(User, User.id == ConversationParticipant.user_id)
+        .where(ConversationParticipant.conversation_id == convo_uuid)
+    )
+    emails = [e for e in res.scalars().all() if e]
     return {"emails": emails}
@@ -1,4 +1,19 @@
+import asyncio
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from app.core.config import settings
+from app.db.session import db_pool_stats, engine, read_engine
+from app.services.minio_client import get_minio, run_minio
+from app.services.redis_client import get_redis
+from app.services.attachments import thumbnail_queue_stats
+from app.services.gmail_sync import gmail_queue_stats
+from app.services.presence import presence_metrics
+from app.services.ratelimit import ratelimit_metrics
+from app.services.receipts import receipt_metrics
+from app.services.typing import typing_metrics
+from app.services.user_cache import user_cache_stats
+from app.ws import ws_stats
 
 router = APIRouter()
 
@@ -6,6 +21,50 @@ router = APIRouter()
 async def live():
     return {"status": "ok"}
 
+async def _probe_db(eng) -> None:
+    async with eng.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+async def _probe_redis() -> None:
+    await get_redis().ping()
+
+
+async def _probe_minio() -> None:
+    if not await run_minio(get_minio().bucket_exists, settings.MINIO_BUCKET):
+        raise RuntimeError("bucket missing")
+
+
+async def _check(probe) -> str:
+    try:
+        await asyncio.wait_for(probe, settings.HEALTH_PROBE_TIMEOUT_SECONDS)
+        return "ok"
+    except asyncio.TimeoutError:
+        return "timeout"
+    except Exception as e:
+        return f"error: {type(e).__name__}"
+
 @router.get("/ready")
 async def ready():
-    return {"status": "ok"}
+    # probes run concurrently, so the worst case is one timeout rather than the sum
+    probes = {"postgres": _probe_db(engine), "redis": _probe_redis(), "minio": _probe_minio()}
+    if read_engine is not engine:
+        probes["postgres_replica"] = _probe_db(read_engine)
+    results = dict(zip(probes, await asyncio.gather(*(_check(p) for p in probes.values()))))
+    ok = all(r == "ok" for r in results.values())
+    return JSONResponse({"status": "ok" if ok else "unavailable", "checks": results}, status_code=200 if ok else 503)
+
+@router.get("/stats")
+async def stats():
+    # per-process counters for cache sizing and write-behind tuning, plus shared queue depth
+    return {
+        "db_pool": db_pool_stats(),
+        "user_cache": user_cache_stats(),
+        "presence": presence_metrics,
+        "receipts": receipt_metrics,
+        "typing": typing_metrics,
+        "ratelimit": ratelimit_metrics,
+        "ws": ws_stats(),
+        "thumbnails": await thumbnail_queue_stats(),
+        "gmail": await gmail_queue_stats(),
+    }
@@ -1,25 +1,94 @@
+import asyncio
 import uuid
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Query
+from minio.error import S3Error
+from sqlalchemy import insert, select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.db.session import get_db
-from app.db.models import Message, Conversation
-from app.schemas.common import MessageOut, CreateMessageIn
+from app.db.session import get_db, get_read_db
+from app.db.models import Attachment, Message, Conversation, ConversationParticipant, GmailAccount
+from app.schemas.common import AttachmentOut, MessageOut, MessagePage, CreateMessageIn
+from app.services.codec import RowJSONResponse
+from app.services.pagination import encode_cursor, decode_cursor
+from app.services.message_stream import append_message
+from app.services.receipts import derive_status
+from app.services.attachments import attachment_type, enqueue_thumbnails, upload_prefix
+from app.services.auth import Principal, get_optional_principal
+from app.services.minio_client import stat_object
+from app.services.gmail_sync import enqueue_send
 
 router = APIRouter()
 
-@router.get("/{conversation_id}", response_model=list[MessageOut])
-async def list_messages(conversation_id: str, db: AsyncSession = Depends(get_db)):
+# MessageOut / AttachmentOut fields as Core columns: pages are built from row tuples and encoded by
+# orjson, skipping ORM identity-map loading and response_model validation
+MESSAGE_OUT_COLUMNS = [Message.__table__.c[f] for f in MessageOut.model_fields if f != "attachments"]
+ATTACHMENT_OUT_COLUMNS = [Attachment.__table__.c[f] for f in AttachmentOut.model_fields]
+
+@router.get("/{conversation_id}", response_model=MessagePage)
+async def list_messages(
+    conversation_id: str,
+    before: str | None = None,
+    after: str | None = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_read_db),
+):
     try:
         convo_uuid = uuid.UUID(conversation_id)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid conversation id")
-    res = await db.execute(select(Message).where(Message.conversation_id == convo_uuid).order_by(Message.created_at.asc()))
-    rows = res.scalars().all()
-    return rows
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+
+    # Keyset pagination on (created_at, id), served by ix_messages_conversation_created_id.
+    # Items are always returned oldest-first; next_cursor continues in the requested direction
+    # (older messages by default / with `before`, newer messages with `after`).
+    key = tuple_(Message.created_at, Message.id)
+    stmt = select(*MESSAGE_OUT_COLUMNS).where(Message.conversation_id == convo_uuid)
+    if after:
+        stmt = stmt.where(key > tuple_(*decode_cursor(after))).order_by(Message.created_at.asc(), Message.id.asc())
+    else:
+        if before:
+            stmt = stmt.where(key < tuple_(*decode_cursor(before)))
+        stmt = stmt.order_by(Message.created_at.desc(), Message.id.desc())
+    res = await db.execute(stmt.limit(limit + 1))
+    rows = res.all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not after:
+        rows.reverse()
+    next_cursor = None
+    if has_more and rows:
+        edge = rows[-1] if after else rows[0]
+        next_cursor = encode_cursor(edge.created_at, edge.id)
+    items = [dict(r._mapping) for r in rows]
+    if items:
+        # delivery/read state comes from the participants' receipt high-water marks
+        pres = await db.execute(
+            select(ConversationParticipant.user_id, ConversationParticipant.last_read_at, ConversationParticipant.last_delivered_at)
+            .where(ConversationParticipant.conversation_id == convo_uuid, ConversationParticipant.user_id.is_not(None))
+        )
+        marks = [tuple(p) for p in pres.all()]
+        for item, r in zip(items, rows):
+            item["status"] = derive_status(r, marks)
+        # one IN query for the whole page's attachments
+        ares = await db.execute(
+            select(Attachment.message_id, *ATTACHMENT_OUT_COLUMNS).where(Attachment.message_id.in_([r.id for r in rows]))
+        )
+        by_message: dict[uuid.UUID, list[dict]] = {}
+        for message_id, *values in ares.all():
+            by_message.setdefault(message_id, []).append(dict(zip(AttachmentOut.model_fields, values)))
+        for item in items:
+            item["attachments"] = by_message.get(item["id"], [])
+    return RowJSONResponse({"items": items, "next_cursor": next_cursor})
 
 @router.post("/{conversation_id}", response_model=MessageOut)
-async def send_message(conversation_id: str, payload: CreateMessageIn, sender_user_id: str | None = None, db: AsyncSession = Depends(get_db)):
+async def send_message(
+    conversation_id: str,
+    payload: CreateMessageIn,
+    sender_user_id: str | None = None,
+    principal: Principal | None = Depends(get_optional_principal),
+    db: AsyncSession = Depends(get_db),
+):
     try:
         convo_uuid = uuid.UUID(conversation_id)
     except Exception:
@@ -29,17 +98,59 @@ async def send_message(conversation_id: str, payload: CreateMessageIn, sender_us
     convo = res.scalar_one_or_none()
     if not convo:
         raise HTTPException(status_code=404, detail="Conversation not found")
+    uploads = payload.attachments or []
+    if uploads and principal is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    # only objects the caller uploaded through POST /uploads; size and type come from storage, not the client
+    for a in uploads:
+        if not a.object_key.startswith(upload_prefix(principal)) or ".." in a.object_key:
+            raise HTTPException(status_code=403, detail="Not your upload")
+    try:
+        stats = await asyncio.gather(*(stat_object(a.object_key) for a in uploads))
+    except S3Error:
+        raise HTTPException(status_code=400, detail="Attachment not uploaded")
+
+    sender_uuid = uuid.UUID(sender_user_id) if sender_user_id else None
+    gmail_account_id = None
+    if sender_uuid:
+        gmail_account_id = (
+            await db.execute(select(GmailAccount.id).where(GmailAccount.user_id == sender_uuid))
+        ).scalar_one_or_none()
 
     msg = Message(
         conversation_id=convo.id,
-        sender_user_id=uuid.UUID(sender_user_id) if sender_user_id else None,
+        sender_user_id=sender_uuid,
         body_text=payload.text,
         direction="outbound",
-        status="sent",
+        # linked senders go out through Gmail; the worker moves it on to sent/failed
+        status="queued" if gmail_account_id else "sent",
     )
     db.add(msg)
+    await db.flush()
+    attachments = []
+    for a, stat in zip(uploads, stats):
+        content_type = stat.content_type or "application/octet-stream"
+        attachments.append({
+            "id": uuid.uuid4(),
+            "message_id": msg.id,
+            "type": a.type or attachment_type(content_type),
+            "file_name": a.file_name,
+            "content_type": content_type,
+            "size_bytes": stat.size,
+            "storage_url": a.object_key,  # object key in MINIO_BUCKET
+            "thumbnail_url": None,
+        })
+    if attachments:
+        await db.execute(insert(Attachment), attachments)
+    convo.last_message_at = msg.created_at
+    convo.last_message_id = msg.id
     await db.commit()
-    await db.refresh(msg)
 
-    # TODO: trigger Gmail send and WebSocket pub
-    return msg
+    # Push to connected participants; the stream id doubles as the client's resume offset
+    out = MessageOut.model_validate(msg)
+    out.attachments = [AttachmentOut(**a) for a in attachments]
+    await enqueue_thumbnails(str(convo.id), attachments)
+    await append_message(str(convo.id), out.model_dump(mode="json"))
+    if gmail_account_id:
+        await enqueue_send(msg.id, gmail_account_id)
+    return out
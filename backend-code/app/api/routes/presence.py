@@ -1,13 +1,15 @@
-from datetime import datetime, timezone
+import uuid
+from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
-from sqlalchemy import select, update
+from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.session import get_db
-from app.db.models import User, Message
-from app.services.auth import get_current_subject
-from app.services.redis_client import get_redis, publish
+from app.services.auth import Principal, get_current_principal, get_current_subject
+from app.services.presence import record_heartbeat, lookup_presence
+from app.services.receipts import record_receipts
+from app.services.typing import set_typing_state, typing_limiter, typing_metrics
+from app.services.user_cache import get_user_ids
 
 router = APIRouter()
 
@@ -18,72 +20,63 @@ class HeartbeatOut(BaseModel):
 
 
 @router.post("/presence/heartbeat", response_model=HeartbeatOut)
-async def presence_heartbeat(subject: str = Depends(get_current_subject), db: AsyncSession = Depends(get_db)):
-    # mark online in redis with TTL and update last_seen in DB
-    r = get_redis()
-    now = datetime.now(timezone.utc)
-    await r.setex(f"presence:{subject}", 60, "online")
-    await r.set(f"last_seen:{subject}", now.isoformat())
-    # update DB last_seen
-    res = await db.execute(select(User).where(User.email == subject))
-    user = res.scalar_one_or_none()
-    if user:
-        user.last_seen = now
-        db.add(user)
-        await db.commit()
+async def presence_heartbeat(subject: str = Depends(get_current_subject)):
+    # Redis only; last_seen reaches Postgres via the batched flusher in app.services.presence
+    now = await record_heartbeat(subject)
     return HeartbeatOut(ok=True, now=now)
 
 
 @router.get("/presence/last-seen")
 async def get_last_seen(user_email: str):
-    r = get_redis()
-    last = await r.get(f"last_seen:{user_email}")
-    online = await r.get(f"presence:{user_email}") == "online"
-    return {"online": online, "last_seen": last}
+    res = await lookup_presence([user_email])
+    return res[user_email]
+
+
+class PresenceLookupIn(BaseModel):
+    emails: list[str] = Field(max_length=500)
+
+
+@router.post("/presence/lookup")
+async def presence_lookup(payload: PresenceLookupIn):
+    # {email: {online, last_seen}} for a whole contact list in one Redis round trip
+    emails = list(dict.fromkeys(payload.emails))
+    return {"users": await lookup_presence(emails)}
 
 
 class TypingIn(BaseModel):
-    conversation_id: str
+    conversation_id: uuid.UUID
     typing: bool
 
 
 @router.post("/typing")
 async def set_typing(payload: TypingIn, subject: str = Depends(get_current_subject)):
-    r = get_redis()
-    key = f"typing:{payload.conversation_id}:{subject}"
-    if payload.typing:
-        await r.setex(key, 5, "1")  # 5s TTL
-    else:
-        await r.delete(key)
-    # broadcast event
-    await publish("events:typing", {"conversation_id": payload.conversation_id, "user": subject, "typing": payload.typing})
-    return {"ok": True}
+    # keystroke-driven: throttle per user locally, broadcast only on typing state changes
+    if not typing_limiter.allow(subject):
+        typing_metrics["throttled"] += 1
+        raise HTTPException(status_code=429, detail="Too many typing updates")
+    changed = await set_typing_state(str(payload.conversation_id), subject, payload.typing)
+    return {"ok": True, "changed": changed}
 
 
 class ReceiptsIn(BaseModel):
-    conversation_id: str
-    message_ids: list[str]
+    conversation_id: uuid.UUID
+    message_ids: list[uuid.UUID] = Field(max_length=1000)
 
 
-@router.post("/receipts/delivered")
-async def receipts_delivered(payload: ReceiptsIn, db: AsyncSession = Depends(get_db)):
-    await db.execute(
-        update(Message)
-        .where(Message.id.in_(payload.message_ids))
-        .values(status="delivered")
-    )
-    await db.commit()
-    await publish("events:receipts", {"conversation_id": payload.conversation_id, "message_ids": payload.message_ids, "status": "delivered"})
+async def _buffer_receipts(payload: ReceiptsIn, status: str, principal: Principal, db: AsyncSession) -> dict:
+    # Buffered and coalesced per conversation; applied as one UPDATE of the reader's high-water marks
+    reader_id = principal.uid or (await get_user_ids(db, [principal.sub])).get(principal.sub)
+    if reader_id is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    record_receipts(payload.conversation_id, reader_id, principal.sub, payload.message_ids, status)
     return {"ok": True}
 
 
+@router.post("/receipts/delivered")
+async def receipts_delivered(payload: ReceiptsIn, principal: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    return await _buffer_receipts(payload, "delivered", principal, db)
+
+
 @router.post("/receipts/read")
-async def receipts_read(payload: ReceiptsIn, db: AsyncSession = Depends(get_db)):
-    await db.execute(
-        update(Message)
-        .where(Message.id.in_(payload.message_ids))
-        .values(status="read")
-    )
-    await db.commit()
-    await publish("events:receipts", {"conversation_id": payload.conversation_id, "message_ids": payload.message_ids, "status": "read"})
-    return {"ok": True}
+async def receipts_read(payload: ReceiptsIn, principal: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    return await _buffer_receipts(payload, "read", principal, db)
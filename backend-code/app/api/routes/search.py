@@ -0,0 +1,97 @@
+import html
+import uuid
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import REAL, cast, func, literal_column, select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import get_read_db
+from app.db.models import SEARCH_CONFIG, SEARCH_DOCUMENT_SQL, ConversationParticipant, Message, User
+from app.schemas.common import SearchHit, SearchPage
+from app.services.auth import Principal, get_current_principal
+from app.services.pagination import encode_rank_cursor, decode_rank_cursor
+
+router = APIRouter()
+
+# ts_headline marks matches with private-use characters so the snippet can be escaped before <mark> goes in
+MARK_START, MARK_STOP = "\ue000", "\ue001"
+HEADLINE_OPTIONS = (
+    f'StartSel="{MARK_START}", StopSel="{MARK_STOP}", '
+    'MaxFragments=2, MaxWords=24, MinWords=8, FragmentDelimiter=" … "'
+)
+
+
+def _snippet(raw: str | None) -> str:
+    return html.escape(raw or "").replace(MARK_START, "<mark>").replace(MARK_STOP, "</mark>")
+
+
+@router.get("/messages", response_model=SearchPage)
+async def search_messages(
+    q: str = Query(..., min_length=1, max_length=256),
+    conversation_id: str | None = None,
+    cursor: str | None = None,
+    limit: int = Query(20, ge=1, le=100),
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db),
+):
+    # Matches come from ix_messages_search_tsv, restricted to the caller's conversations and ordered
+    # by rank with (created_at, id) tie-breaks; snippets are rendered only for the returned page.
+    caller_id = principal.uid or select(User.id).where(User.email == principal.sub).scalar_subquery()
+    config = literal_column(f"'{SEARCH_CONFIG}'::regconfig")
+    tsq = func.websearch_to_tsquery(config, q)
+    rank = func.ts_rank_cd(Message.search_tsv, tsq)
+
+    stmt = (
+        select(Message.id, Message.created_at, rank.label("rank"))
+        .where(
+            Message.search_tsv.op("@@")(tsq),
+            Message.conversation_id.in_(
+                select(ConversationParticipant.conversation_id).where(ConversationParticipant.user_id == caller_id)
+            ),
+        )
+    )
+    if conversation_id:
+        try:
+            stmt = stmt.where(Message.conversation_id == uuid.UUID(conversation_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid conversation id")
+    if cursor:
+        c_rank, c_created_at, c_id = decode_rank_cursor(cursor)
+        stmt = stmt.where(tuple_(rank, Message.created_at, Message.id) < tuple_(cast(c_rank, REAL), c_created_at, c_id))
+    hits = (
+        stmt.order_by(rank.desc(), Message.created_at.desc(), Message.id.desc())
+        .limit(limit + 1)
+        .subquery("hits")
+    )
+
+    rows = (
+        await db.execute(
+            select(
+                Message.id,
+                Message.conversation_id,
+                Message.sender_user_id,
+                Message.external_from_email,
+                hits.c.created_at,
+                hits.c.rank,
+                func.ts_headline(config, text(SEARCH_DOCUMENT_SQL), tsq, HEADLINE_OPTIONS).label("headline"),
+            )
+            .join(hits, hits.c.id == Message.id)
+            .order_by(hits.c.rank.desc(), hits.c.created_at.desc(), hits.c.id.desc())
+        )
+    ).all()
+
+    items = [
+        SearchHit(
+            message_id=r.id,
+            conversation_id=r.conversation_id,
+            sender_user_id=r.sender_user_id,
+            external_from_email=r.external_from_email,
+            created_at=r.created_at,
+            snippet=_snippet(r.headline),
+            rank=r.rank,
+        )
+        for r in rows[:limit]
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_rank_cursor(last.rank, last.created_at, last.id)
+    return SearchPage(items=items, next_cursor=next_cursor)
@@ -0,0 +1,64 @@
+import math
+import re
+import uuid
+from fastapi import APIRouter, Depends, HTTPException
+from app.core.config import settings
+from app.schemas.common import UploadIn, UploadOut, UploadPart, CompleteUploadIn
+from app.services.attachments import upload_prefix
+from app.services.auth import Principal, get_current_principal
+from app.services.minio_client import (
+    presign_put,
+    create_multipart_upload,
+    presign_upload_parts,
+    complete_multipart_upload,
+    abort_multipart_upload,
+)
+
+router = APIRouter()
+
+
+def _safe_name(file_name: str) -> str:
+    name = re.sub(r"[^A-Za-z0-9._-]+", "_", file_name).strip("._")
+    return name[-120:] or "file"
+
+
+@router.post("/", response_model=UploadOut)
+async def create_upload(payload: UploadIn, principal: Principal = Depends(get_current_principal)):
+    # Bytes go straight from the client to MinIO; the API only signs URLs
+    if payload.size_bytes <= 0 or payload.size_bytes > settings.MINIO_MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=400, detail="Invalid upload size")
+    object_key = f"{upload_prefix(principal)}{uuid.uuid4()}/{_safe_name(payload.file_name)}"
+    expires_in = settings.MINIO_PRESIGN_EXPIRES_SECONDS
+
+    if payload.size_bytes < settings.MINIO_MULTIPART_THRESHOLD:
+        return UploadOut(object_key=object_key, expires_in=expires_in, url=await presign_put(object_key))
+
+    part_size = settings.MINIO_PART_SIZE
+    part_count = math.ceil(payload.size_bytes / part_size)
+    upload_id = await create_multipart_upload(object_key, payload.content_type)
+    urls = await presign_upload_parts(object_key, upload_id, part_count)
+    return UploadOut(
+        object_key=object_key,
+        expires_in=expires_in,
+        upload_id=upload_id,
+        part_size=part_size,
+        parts=[UploadPart(part_number=n, url=url) for n, url in enumerate(urls, start=1)],
+    )
+
+
+@router.post("/complete")
+async def complete_upload(payload: CompleteUploadIn, principal: Principal = Depends(get_current_principal)):
+    if not payload.object_key.startswith(upload_prefix(principal)):
+        raise HTTPException(status_code=403, detail="Not your upload")
+    if not payload.parts:
+        raise HTTPException(status_code=400, detail="No parts")
+    try:
+        await complete_multipart_upload(payload.object_key, payload.upload_id, [(p.part_number, p.etag) for p in payload.parts])
+    except Exception:
+        # drop the stored parts; the client starts a fresh upload rather than leaving them to pile up
+        try:
+            await abort_multipart_upload(payload.object_key, payload.upload_id)
+        except Exception:
+            pass
+        raise HTTPException(status_code=400, detail="Failed to complete upload")
+    return {"ok": True, "object_key": payload.object_key}
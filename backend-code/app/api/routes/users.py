@@ -2,14 +2,14 @@ from fastapi import APIRouter, Depends
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
-from app.db.models import User, Invite
+from app.db.models import Invite
+from app.services.user_cache import get_user_by_email
 
 router = APIRouter()
 
 @router.get("/exists")
 async def user_exists(email: str, db: AsyncSession = Depends(get_db)):
-    res = await db.execute(select(User).where(User.email == email))
-    user = res.scalar_one_or_none()
+    user = await get_user_by_email(db, email)
     return {"exists": user is not None}
 
 @router.post("/invites")
@@ -12,26 +12,127 @@ class Settings(BaseSettings):
     POSTGRES_DB: str = "mailchat"
     POSTGRES_USER: str = "mailchat"
     POSTGRES_PASSWORD: str = "mailchat"
+    # optional streaming replica for read-only routes (get_read_db); falls back to the primary
+    DATABASE_REPLICA_URL: str | None = None
+    # per-process pool, applied to primary and replica engines alike
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: float = 5.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = False  # recycle already bounds connection age; pre-ping costs a round trip per checkout
+    DB_STATEMENT_TIMEOUT_MS: int = 15000
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 500
 
     # Redis
     REDIS_URL: str
 
+    # Realtime message streams (one Redis Stream per conversation)
+    MESSAGE_STREAM_MAXLEN: int = 1000
+    MESSAGE_REPLAY_MAX: int = 500
+
+    # WebSocket connections: bounded per-socket send queue, keepalive and idle eviction
+    WS_SEND_QUEUE_SIZE: int = 256
+    WS_SEND_TIMEOUT_SECONDS: float = 10.0
+    WS_PING_INTERVAL_SECONDS: float = 20.0
+    WS_IDLE_TIMEOUT_SECONDS: float = 60.0
+    # cluster registry: per-user node leases (renewed every third of the lease) and cached member sets
+    WS_LEASE_SECONDS: int = 30
+    CONV_MEMBERS_TTL_SECONDS: int = 3600
+
+    # Presence: heartbeats hit Redis only; last_seen is written behind to Postgres in bulk
+    PRESENCE_TTL_SECONDS: int = 60
+    PRESENCE_FLUSH_INTERVAL_SECONDS: float = 5.0
+
+    # Typing indicators: state transitions only, per-user token bucket
+    TYPING_TTL_SECONDS: int = 5
+    TYPING_RATE_PER_SECOND: float = 2.0
+    TYPING_BURST: float = 5.0
+
+    # Read/delivered receipts are buffered per conversation and applied once per window
+    RECEIPT_FLUSH_INTERVAL_SECONDS: float = 0.5
+
+    # User lookup cache: per-process LRU in front of Redis in front of Postgres
+    USER_CACHE_LOCAL_SIZE: int = 10000
+    USER_CACHE_LOCAL_TTL_SECONDS: float = 30.0
+    USER_CACHE_REDIS_TTL_SECONDS: int = 300
+
     # MinIO
     MINIO_ENDPOINT: str
     MINIO_ACCESS_KEY: str
     MINIO_SECRET_KEY: str
     MINIO_SECURE: bool = False
     MINIO_BUCKET: str = "mailchat-media"
+    MINIO_REGION: str = "us-east-1"  # fixed so presigning never needs a region lookup round trip
+    MINIO_PUBLIC_ENDPOINT: str | None = None  # host clients use for presigned URLs, if different
+    MINIO_THREADS: int = 8  # bounded pool for blocking MinIO calls
+    MINIO_PRESIGN_EXPIRES_SECONDS: int = 900
+    MINIO_MAX_UPLOAD_BYTES: int = 2 * 1024 ** 3
+    MINIO_MULTIPART_THRESHOLD: int = 64 * 1024 ** 2
+    MINIO_PART_SIZE: int = 16 * 1024 ** 2
+    MINIO_DOWNLOAD_CHUNK_BYTES: int = 256 * 1024  # per-download buffer when proxying objects
+
+    # Thumbnail worker (python -m app.workers.thumbnails)
+    THUMBNAIL_MAX_PX: int = 320
+    THUMBNAIL_PROCESSES: int = 2
+    THUMBNAIL_MAX_ATTEMPTS: int = 3
+    THUMBNAIL_RETRY_BASE_SECONDS: float = 30.0  # doubled per attempt; retries wait in a delayed zset
+    THUMBNAIL_MAX_SOURCE_BYTES: int = 50 * 1024 ** 2  # larger images are skipped without downloading
+    THUMBNAIL_MAX_IMAGE_PIXELS: int = 50_000_000  # PIL.Image.MAX_IMAGE_PIXELS: decompression-bomb guard
 
     # Google OAuth
     GOOGLE_CLIENT_ID: str | None = None
     GOOGLE_CLIENT_SECRET: str | None = None
     GOOGLE_REDIRECT_URI: str | None = None
 
+    # Gmail sync (app.workers.gmail_sync): per-account quota pacing in Gmail API units, batched fetches,
+    # incremental polling and the outbound send queue
+    GMAIL_HTTP_TIMEOUT_SECONDS: float = 20.0
+    GMAIL_QUOTA_UNITS_PER_SECOND: float = 200.0  # Gmail allows 250/user/s
+    GMAIL_QUOTA_BURST: float = 500.0
+    GMAIL_FETCH_BATCH: int = 50  # message ids per batch request (max 100)
+    GMAIL_SYNC_INTERVAL_SECONDS: float = 60.0
+    GMAIL_SYNC_LEASE_SECONDS: float = 300.0
+    GMAIL_SYNC_CONCURRENCY: int = 50  # accounts synced at once per worker process
+    GMAIL_SYNC_MAX_MESSAGES_PER_RUN: int = 2000
+    GMAIL_SEND_WORKERS: int = 32
+    GMAIL_SEND_CONCURRENCY_PER_ACCOUNT: int = 2
+    GMAIL_SEND_LEASE_SECONDS: float = 60.0
+    GMAIL_SEND_MAX_ATTEMPTS: int = 6
+
+    # Bulk NDJSON backfill (app.workers.ingest): records per COPY + INSERT transaction
+    INGEST_CHUNK_SIZE: int = 5000
+    INGEST_STATEMENT_TIMEOUT_MS: int = 300000
+
     # JWT
     JWT_SECRET: str = "change-me"
     JWT_ALGORITHM: str = "HS256"
     JWT_EXPIRES_MINUTES: int = 60 * 24 * 14
+    JWT_CACHE_SIZE: int = 10000  # verified tokens kept in the per-process LRU
+
+    # /health/ready: per-dependency probe timeout
+    HEALTH_PROBE_TIMEOUT_SECONDS: float = 2.0
+
+    # Rate limiting: "<requests>/<seconds>" per route ("METHOD /path/template") and client (JWT subject,
+    # else IP), enforced by a Redis sliding window. Unlisted routes get RATE_LIMIT_DEFAULT, "off" disables.
+    # Permits are leased from Redis in batches of RATE_LIMIT_LEASE_FRACTION of the limit, valid for
+    # RATE_LIMIT_LEASE_SECONDS, so most requests are decided in process.
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_DEFAULT: str = "600/60"
+    RATE_LIMIT_ROUTES: dict[str, str] = {
+        "POST /presence/heartbeat": "30/60",
+        "POST /typing": "300/60",
+        "POST /receipts/read": "240/60",
+        "POST /receipts/delivered": "240/60",
+        "POST /messages/{conversation_id}": "120/60",
+        "POST /conversations/": "30/60",
+        "GET /search/messages": "60/60",
+        "POST /uploads/": "60/60",
+        "GET /auth/google/callback": "20/60",
+    }
+    RATE_LIMIT_EXEMPT_PREFIXES: list[str] = ["/health/", "/metrics"]
+    RATE_LIMIT_LEASE_FRACTION: float = 0.05
+    RATE_LIMIT_LEASE_SECONDS: float = 1.0
+    RATE_LIMIT_REDIS_COOLDOWN_SECONDS: float = 5.0  # after a Redis error, local buckets only for this long
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
 
@@ -1,9 +1,15 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import String, DateTime, ForeignKey, Integer, Boolean, Text
+from sqlalchemy import String, DateTime, ForeignKey, Integer, Boolean, Text, Index, Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import mapped_column, Mapped, relationship
 from app.db.session import Base
 
+# Full-text search: text config shared by the generated column and the query side, and the
+# searchable document (plain body, else the HTML body with tags stripped)
+SEARCH_CONFIG = "english"
+SEARCH_DOCUMENT_SQL = "coalesce(body_text, regexp_replace(coalesce(body_html, ''), '<[^>]*>', ' ', 'g'))"
+
 class User(Base):
     __tablename__ = "users"
     id: Mapped[uuid.UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
@@ -29,34 +35,65 @@ class Conversation(Base):
     __tablename__ = "conversations"
     id: Mapped[uuid.UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
     subject: Mapped[str | None] = mapped_column(String(255))
-    gmail_thread_id: Mapped[str | None] = mapped_column(String(128))
+    gmail_thread_id: Mapped[str | None] = mapped_column(String(128), unique=True)  # resolves inbound Gmail threads
     created_by_user_id: Mapped[uuid.UUID | None] = mapped_column(ForeignKey("users.id"))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # denormalized from the newest message (maintained by send_message) for inbox ordering/preview
+    last_message_at: Mapped[datetime | None] = mapped_column(DateTime, default=datetime.utcnow)
+    last_message_id: Mapped[uuid.UUID | None] = mapped_column(nullable=True)
 
 class ConversationParticipant(Base):
     __tablename__ = "conversation_participants"
     id: Mapped[uuid.UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
-    conversation_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("conversations.id", ondelete="CASCADE"))
-    user_id: Mapped[uuid.UUID | None] = mapped_column(ForeignKey("users.id"), nullable=True)
+    conversation_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("conversations.id", ondelete="CASCADE"), index=True)
+    user_id: Mapped[uuid.UUID | None] = mapped_column(ForeignKey("users.id"), nullable=True, index=True)
     external_email: Mapped[str | None] = mapped_column(String(320), nullable=True)
+    # per-reader receipt high-water marks (newest message read / delivered)
+    last_read_message_id: Mapped[uuid.UUID | None] = mapped_column(nullable=True)
+    last_read_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    last_delivered_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # keyset pagination over a conversation's history: (created_at, id) cursor
+        Index("ix_messages_conversation_created_id", "conversation_id", "created_at", "id"),
+        Index("ix_messages_search_tsv", "search_tsv", postgresql_using="gin"),
+    )
     id: Mapped[uuid.UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
     conversation_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("conversations.id", ondelete="CASCADE"))
-    sender_user_id: Mapped[uuid.UUID | None] = mapped_column(ForeignKey("users.id"), nullable=True)
+    sender_user_id: Mapped[uuid.UUID | None] = mapped_column(ForeignKey("users.id"), nullable=True, index=True)
     external_from_email: Mapped[str | None] = mapped_column(String(320))
     body_text: Mapped[str | None] = mapped_column(Text)
     body_html: Mapped[str | None] = mapped_column(Text)
     direction: Mapped[str] = mapped_column(String(10), default="outbound")
-    gmail_message_id: Mapped[str | None] = mapped_column(String(128))
+    gmail_message_id: Mapped[str | None] = mapped_column(String(128), unique=True)  # sync/send idempotency key
+    # queued -> sending -> sent | failed for Gmail-backed sends; sent for local-only; delivered for inbound
     status: Mapped[str] = mapped_column(String(12), default="sent")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # maintained by Postgres; deferred so regular message loads never fetch it
+    search_tsv: Mapped[str | None] = mapped_column(
+        TSVECTOR,
+        Computed(f"to_tsvector('{SEARCH_CONFIG}', {SEARCH_DOCUMENT_SQL})", persisted=True),
+        deferred=True,
+    )
+
+class GmailAccount(Base):
+    __tablename__ = "gmail_accounts"
+    id: Mapped[uuid.UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
+    user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), unique=True)
+    email: Mapped[str] = mapped_column(String(320))
+    refresh_token: Mapped[str] = mapped_column(Text)
+    # incremental sync cursor (users.history.list startHistoryId); None until bootstrapped
+    history_id: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    last_synced_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    sync_error: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 class Attachment(Base):
     __tablename__ = "attachments"
     id: Mapped[uuid.UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
-    message_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("messages.id", ondelete="CASCADE"))
+    message_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("messages.id", ondelete="CASCADE"), index=True)
     type: Mapped[str] = mapped_column(String(10))  # voice|image|doc|video|other
     file_name: Mapped[str] = mapped_column(String(255))
     content_type: Mapped[str] = mapped_column(String(127))
@@ -1,19 +1,101 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+import time
+from typing import Any
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.core.config import settings
+from app.services.metrics import DB_POOL_WAIT_SECONDS, instrument_engine
 
-engine = create_async_engine(settings.DATABASE_URL, echo=False, pool_pre_ping=True)
+# per-engine pool checkout counters, exported via /health/stats
+pool_metrics: dict[str, dict[str, float]] = {}
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    # Records how long checkouts wait for a free connection (or for a new one to be opened)
+    metrics: dict[str, float]
+    role: str
+
+    def _do_get(self) -> Any:
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            self.metrics["errors"] += 1
+            raise
+        finally:
+            waited = (time.perf_counter() - started) * 1000
+            self.metrics["checkouts"] += 1
+            self.metrics["wait_ms_total"] += waited
+            self.metrics["wait_ms_max"] = max(self.metrics["wait_ms_max"], waited)
+            DB_POOL_WAIT_SECONDS.labels(self.role).observe(waited / 1000)
+
+    def recreate(self) -> "TimedQueuePool":
+        # engine.dispose() swaps in a fresh pool; keep counting into the same metrics
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        pool.role = self.role
+        return pool
+
+
+def _make_engine(url: str, role: str, **server_settings: str) -> AsyncEngine:
+    eng = create_async_engine(
+        url,
+        echo=False,
+        poolclass=TimedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args={
+            "prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE,
+            "server_settings": {
+                "application_name": f"{settings.APP_NAME} ({role})",
+                "statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS),
+                **server_settings,
+            },
+        },
+    )
+    eng.pool.metrics = pool_metrics.setdefault(role, {"checkouts": 0, "errors": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0})
+    eng.pool.role = role
+    instrument_engine(eng.sync_engine, role)
+    return eng
+
+
+engine = _make_engine(settings.DATABASE_URL, "primary")
+# Read-only routes tolerate replica lag; without a replica they share the primary pool
+read_engine = (
+    _make_engine(settings.DATABASE_REPLICA_URL, "replica", default_transaction_read_only="on")
+    if settings.DATABASE_REPLICA_URL
+    else engine
+)
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+ReadSessionLocal = async_sessionmaker(read_engine, expire_on_commit=False, class_=AsyncSession)
 
 class Base(DeclarativeBase):
     pass
 
-async def init_db():
-    # Import models here to ensure they are registered
-    from app.db import models  # noqa: F401
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-
 async def get_db() -> AsyncSession:
     async with AsyncSessionLocal() as session:
         yield session
+
+async def get_read_db() -> AsyncSession:
+    async with ReadSessionLocal() as session:
+        yield session
+
+
+def db_pool_stats() -> dict[str, Any]:
+    engines = {"primary": engine}
+    if read_engine is not engine:
+        engines["replica"] = read_engine
+    out = {}
+    for role, eng in engines.items():
+        m = pool_metrics[role]
+        out[role] = {
+            **m,
+            "wait_ms_avg": m["wait_ms_total"] / m["checkouts"] if m["checkouts"] else 0.0,
+            "size": eng.pool.size(),
+            "checked_out": eng.pool.checkedout(),
+            "overflow": eng.pool.overflow(),
+        }
+    return out
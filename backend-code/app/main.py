@@ -8,12 +8,24 @@ from app.api.routes.conversations import router as conversations_router
 from app.api.routes.messages import router as messages_router
 from app.api.routes.auth import router as auth_router
 from app.api.routes.presence import router as presence_router
-from app.db.session import init_db
+from app.api.routes.uploads import router as uploads_router
+from app.api.routes.attachments import router as attachments_router
+from app.api.routes.search import router as search_router
+from app.api.routes.metrics import router as metrics_router
+from app.services.metrics import MetricsMiddleware
 from app.services.minio_client import ensure_bucket
-from app.ws import router as ws_router
+from app.services.ratelimit import RateLimitMiddleware
+from app.services.presence import start_presence_flusher, stop_presence_flusher
+from app.services.receipts import start_receipt_flusher, stop_receipt_flusher
+from app.services.user_cache import start_user_cache_listener, stop_user_cache_listener
+from app.ws import router as ws_router, start_event_listener, stop_event_listener
 
 app = FastAPI(title=settings.APP_NAME)
 
+# innermost of the three: CORS headers reach 429s, and throttled requests still show up in the metrics
+app.add_middleware(RateLimitMiddleware)
+app.add_middleware(MetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[o.strip() for o in settings.API_CORS_ORIGINS.split(",") if o.strip()],
@@ -23,15 +35,31 @@ app.add_middleware(
 )
 
 app.include_router(health_router, prefix="/health", tags=["health"]) 
+app.include_router(metrics_router)
 app.include_router(users_router, prefix="/users", tags=["users"]) 
 app.include_router(conversations_router, prefix="/conversations", tags=["conversations"]) 
 app.include_router(messages_router, prefix="/messages", tags=["messages"]) 
 app.include_router(auth_router, prefix="/auth", tags=["auth"]) 
 app.include_router(presence_router, tags=["presence"]) 
+app.include_router(uploads_router, prefix="/uploads", tags=["uploads"]) 
+app.include_router(attachments_router, prefix="/attachments", tags=["attachments"]) 
+app.include_router(search_router, prefix="/search", tags=["search"]) 
 app.include_router(ws_router)
 
 
 @app.on_event("startup")
 async def on_startup():
-    await init_db()
+    # schema is managed by Alembic (`alembic upgrade head`); workers issue no DDL at boot
     await ensure_bucket()
+    start_event_listener()
+    start_presence_flusher()
+    start_receipt_flusher()
+    start_user_cache_listener()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await stop_event_listener()
+    await stop_presence_flusher()
+    await stop_receipt_flusher()
+    await stop_user_cache_listener()
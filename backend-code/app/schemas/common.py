@@ -1,32 +1,116 @@
+import uuid
 from pydantic import BaseModel
 from datetime import datetime
 
+class AttachmentOut(BaseModel):
+    id: uuid.UUID
+    type: str
+    file_name: str
+    content_type: str
+    size_bytes: int
+    storage_url: str
+    thumbnail_url: str | None = None
+
+    class Config:
+        from_attributes = True
+
 class MessageOut(BaseModel):
-    id: str
-    conversation_id: str
-    sender_user_id: str | None = None
+    id: uuid.UUID
+    conversation_id: uuid.UUID
+    sender_user_id: uuid.UUID | None = None
     external_from_email: str | None = None
     body_text: str | None = None
     body_html: str | None = None
     direction: str
     status: str
     created_at: datetime
+    attachments: list[AttachmentOut] = []
 
     class Config:
         from_attributes = True
 
+class MessagePage(BaseModel):
+    items: list[MessageOut]
+    next_cursor: str | None = None
+
+class SearchHit(BaseModel):
+    message_id: uuid.UUID
+    conversation_id: uuid.UUID
+    sender_user_id: uuid.UUID | None = None
+    external_from_email: str | None = None
+    created_at: datetime
+    snippet: str  # HTML-escaped, matches wrapped in <mark>
+    rank: float
+
+class SearchPage(BaseModel):
+    items: list[SearchHit]
+    next_cursor: str | None = None
+
 class ConversationOut(BaseModel):
-    id: str
+    id: uuid.UUID
     subject: str | None = None
     created_at: datetime
 
     class Config:
         from_attributes = True
 
+class MessagePreview(BaseModel):
+    id: uuid.UUID
+    sender_user_id: uuid.UUID | None = None
+    external_from_email: str | None = None
+    body_text: str | None = None
+    created_at: datetime
+
+class InboxItem(BaseModel):
+    id: uuid.UUID
+    subject: str | None = None
+    created_at: datetime
+    last_message_at: datetime | None = None
+    last_message: MessagePreview | None = None
+    unread_count: int = 0
+
+class InboxPage(BaseModel):
+    items: list[InboxItem]
+    next_cursor: str | None = None
+
 class CreateConversationIn(BaseModel):
     participants: list[str]
     subject: str | None = None
 
+class AttachmentIn(BaseModel):
+    object_key: str  # as returned by POST /uploads, once the client has PUT the bytes
+    file_name: str
+    # accepted for compatibility; the stored object's own size and content type are what get recorded
+    content_type: str | None = None
+    size_bytes: int | None = None
+    type: str | None = None  # voice|image|doc|video|other; inferred from the content type if omitted
+
 class CreateMessageIn(BaseModel):
     text: str | None = None
-    attachments: list[str] | None = None  # URLs after upload
+    attachments: list[AttachmentIn] | None = None
+
+class UploadIn(BaseModel):
+    file_name: str
+    content_type: str
+    size_bytes: int
+
+class UploadPart(BaseModel):
+    part_number: int
+    url: str
+
+class UploadOut(BaseModel):
+    object_key: str
+    expires_in: int
+    url: str | None = None  # single PUT
+    upload_id: str | None = None  # multipart: PUT each part, then POST /uploads/complete
+    part_size: int | None = None
+    parts: list[UploadPart] = []
+
+class CompletedPart(BaseModel):
+    part_number: int
+    etag: str
+
+class CompleteUploadIn(BaseModel):
+    object_key: str
+    upload_id: str
+    parts: list[CompletedPart]
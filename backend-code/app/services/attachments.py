@@ -0,0 +1,65 @@
+import json
+import time
+import uuid
+from typing import Any
+from app.services.auth import Principal
+from app.services.redis_client import get_redis
+
+UPLOAD_PREFIX = "uploads/"  # every client-uploaded object key lives under uploads/<owner>/
+THUMBNAIL_PREFIX = "thumbnails/"
+
+# Reliable queue: producers LPUSH, workers BLMOVE into the processing list and LREM when done
+THUMBNAIL_QUEUE = "jobs:thumbnails"
+THUMBNAIL_PROCESSING = "jobs:thumbnails:processing"
+THUMBNAIL_DELAYED = "jobs:thumbnails:delayed"  # zset of retries scored by due time
+THUMBNAIL_STATS = "jobs:thumbnails:stats"  # hash: processed / failed / retried / skipped / total_ms
+
+THUMBNAIL_TYPES = ("image", "video")
+
+
+def upload_prefix(principal: Principal) -> str:
+    # the only keys a caller may presign, complete or attach
+    owner = principal.uid or uuid.uuid5(uuid.NAMESPACE_URL, principal.sub)
+    return f"{UPLOAD_PREFIX}{owner}/"
+
+
+def attachment_type(content_type: str) -> str:
+    major = content_type.split("/", 1)[0].lower()
+    if major == "image":
+        return "image"
+    if major == "video":
+        return "video"
+    if major == "audio":
+        return "voice"
+    if content_type in ("application/pdf", "text/plain") or content_type.startswith("application/vnd"):
+        return "doc"
+    return "other"
+
+
+async def enqueue_thumbnails(conversation_id: str, attachments: list[dict[str, Any]]) -> int:
+    jobs = [
+        json.dumps({
+            "attachment_id": str(a["id"]),
+            "message_id": str(a["message_id"]),
+            "conversation_id": conversation_id,
+            "type": a["type"],
+            "object_key": a["storage_url"],
+            "attempt": 0,
+            "enqueued_at": time.time(),
+        })
+        for a in attachments
+        if a["type"] in THUMBNAIL_TYPES
+    ]
+    if jobs:
+        await get_redis().lpush(THUMBNAIL_QUEUE, *jobs)
+    return len(jobs)
+
+
+async def thumbnail_queue_stats() -> dict[str, int]:
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.llen(THUMBNAIL_QUEUE)
+    pipe.llen(THUMBNAIL_PROCESSING)
+    pipe.zcard(THUMBNAIL_DELAYED)
+    pipe.hgetall(THUMBNAIL_STATS)
+    queued, processing, delayed, stats = await pipe.execute()
+    return {"queued": queued, "processing": processing, "delayed": delayed, **{k: int(v) for k, v in stats.items()}}
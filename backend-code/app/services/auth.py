@@ -1,3 +1,8 @@
+import hashlib
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from typing import Any, Optional
 from jose import jwt
@@ -8,6 +13,17 @@ from app.core.config import settings
 security = HTTPBearer(auto_error=False)
 
 
+@dataclass(frozen=True, slots=True)
+class Principal:
+    sub: str  # user email
+    uid: uuid.UUID | None  # users.id from the "uid" claim, when the token carries one
+    exp: int
+
+
+# Verified tokens keyed by a digest of the raw token; entries are dropped once `exp` passes
+_verified: OrderedDict[bytes, Principal] = OrderedDict()
+
+
 def create_access_token(subject: str, extra: Optional[dict[str, Any]] = None) -> str:
     now = datetime.now(timezone.utc)
     expire = now + timedelta(minutes=settings.JWT_EXPIRES_MINUTES)
@@ -18,15 +34,49 @@ def create_access_token(subject: str, extra: Optional[dict[str, Any]] = None) ->
     return token
 
 
-def get_current_subject(creds: HTTPAuthorizationCredentials | None = Depends(security)) -> str:
-    if creds is None or creds.scheme.lower() != "bearer":
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    token = creds.credentials
+def _decode(token: str) -> Principal:
     try:
         payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
-        sub = payload.get("sub")
-        if not sub:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return sub
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid token")
+    sub = payload.get("sub")
+    if not sub:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    try:
+        uid = uuid.UUID(payload["uid"]) if payload.get("uid") else None
+    except (TypeError, ValueError):
+        uid = None
+    return Principal(sub=sub, uid=uid, exp=int(payload.get("exp") or 0))
+
+
+def verify_token(token: str) -> Principal:
+    # Shared by HTTP and WebSocket auth: decode once, then serve repeats from a bounded LRU
+    key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    principal = _verified.get(key)
+    if principal is not None:
+        if principal.exp and principal.exp <= time.time():
+            del _verified[key]
+            raise HTTPException(status_code=401, detail="Invalid token")
+        _verified.move_to_end(key)
+        return principal
+    principal = _decode(token)
+    _verified[key] = principal
+    if len(_verified) > settings.JWT_CACHE_SIZE:
+        _verified.popitem(last=False)
+    return principal
+
+
+async def get_current_principal(creds: HTTPAuthorizationCredentials | None = Depends(security)) -> Principal:
+    if creds is None or creds.scheme.lower() != "bearer":
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return verify_token(creds.credentials)
+
+
+async def get_optional_principal(creds: HTTPAuthorizationCredentials | None = Depends(security)) -> Principal | None:
+    if creds is None or creds.scheme.lower() != "bearer":
+        return None
+    return verify_token(creds.credentials)
+
+
+async def get_current_subject(principal: Principal = Depends(get_current_principal)) -> str:
+    return principal.sub
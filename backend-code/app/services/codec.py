@@ -0,0 +1,29 @@
+import uuid
+from typing import Any
+import orjson
+from fastapi.responses import ORJSONResponse
+
+# JSON for the hot paths: pubsub/stream event payloads, WebSocket frames and list responses.
+# orjson writes UUID and datetime natively, in the same format as pydantic's JSON mode.
+_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj: Any) -> Any:
+    # orjson only recognises uuid.UUID itself; asyncpg returns its own subclass in Core rows
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    raise TypeError
+
+
+def dumps(obj: Any) -> str:
+    return orjson.dumps(obj, default=_default, option=_OPTIONS).decode()
+
+
+def loads(data: str | bytes) -> Any:
+    return orjson.loads(data)
+
+
+class RowJSONResponse(ORJSONResponse):
+    # list pages built straight from Core rows
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=_OPTIONS)
@@ -0,0 +1,271 @@
+import abc
+import base64
+import email.utils
+import json
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.message import EmailMessage
+from typing import Any
+import httpx
+from app.core.config import settings
+
+GMAIL_API = "https://gmail.googleapis.com/gmail/v1/users/me"
+GMAIL_BATCH = "https://gmail.googleapis.com/batch/gmail/v1"
+TOKEN_URL = "https://oauth2.googleapis.com/token"
+BATCH_MAX = 100  # Gmail batch endpoint limit per request
+
+# Headers stamped on app-originated mail so the sender's and recipients' mailbox syncs map it back
+HEADER_MESSAGE_ID = "X-MailChat-Message-Id"
+HEADER_CONVERSATION_ID = "X-MailChat-Conversation-Id"
+
+
+class GmailError(Exception):
+    def __init__(self, status: int, detail: str = ""):
+        super().__init__(f"gmail {status}: {detail[:200]}")
+        self.status = status
+        self.retryable = status >= 500 or status in (408, 429)
+
+
+class GmailRateLimited(GmailError):
+    def __init__(self, retry_after: float, detail: str = ""):
+        super().__init__(429, detail)
+        self.retry_after = retry_after
+
+
+class GmailHistoryExpired(GmailError):
+    # startHistoryId is older than Gmail retains (about a week): incremental sync cannot continue
+    def __init__(self) -> None:
+        super().__init__(404, "history expired")
+
+
+@dataclass(frozen=True, slots=True)
+class GmailAccountRef:
+    id: uuid.UUID
+    email: str
+    refresh_token: str
+
+
+@dataclass(slots=True)
+class GmailMessage:
+    id: str
+    thread_id: str
+    internal_date: datetime
+    from_email: str | None
+    recipients: list[str]
+    subject: str | None
+    body_text: str | None
+    body_html: str | None
+    label_ids: list[str] = field(default_factory=list)
+    headers: dict[str, str] = field(default_factory=dict)  # lower-cased names
+
+
+@dataclass(frozen=True, slots=True)
+class HistoryPage:
+    message_ids: list[str]  # messageAdded ids, in history order
+    history_id: str  # cursor to persist once this page is ingested
+    next_page_token: str | None
+
+
+@dataclass(frozen=True, slots=True)
+class SentMessage:
+    id: str
+    thread_id: str
+
+
+class GmailClient(abc.ABC):
+    # The surface the sync engine needs; HttpGmailClient talks to Google, FakeGmailClient is in-memory
+
+    @abc.abstractmethod
+    async def current_history_id(self, account: GmailAccountRef) -> str: ...
+
+    @abc.abstractmethod
+    async def list_history(self, account: GmailAccountRef, start_history_id: str, page_token: str | None = None) -> HistoryPage: ...
+
+    @abc.abstractmethod
+    async def batch_get(self, account: GmailAccountRef, message_ids: list[str]) -> list[GmailMessage]: ...
+
+    @abc.abstractmethod
+    async def send(self, account: GmailAccountRef, raw: bytes, thread_id: str | None = None) -> SentMessage: ...
+
+    @abc.abstractmethod
+    async def find_by_rfc822_id(self, account: GmailAccountRef, rfc822_id: str) -> SentMessage | None: ...
+
+
+def rfc822_id(message_id: uuid.UUID) -> str:
+    return f"<{message_id}@mailchat>"
+
+
+def build_mime(
+    message_id: uuid.UUID,
+    conversation_id: uuid.UUID,
+    sender: str,
+    recipients: list[str],
+    subject: str | None,
+    body_text: str | None,
+) -> bytes:
+    # Deterministic Message-ID: a retried send can be found (and not resent) via rfc822msgid:
+    msg = EmailMessage()
+    msg["From"] = sender
+    msg["To"] = ", ".join(recipients)
+    msg["Subject"] = subject or ""
+    msg["Message-ID"] = rfc822_id(message_id)
+    msg[HEADER_MESSAGE_ID] = str(message_id)
+    msg[HEADER_CONVERSATION_ID] = str(conversation_id)
+    msg.set_content(body_text or "")
+    return msg.as_bytes()
+
+
+def _b64(data: str) -> str:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4)).decode("utf-8", errors="replace")
+
+
+def _walk_bodies(part: dict[str, Any], out: dict[str, str]) -> None:
+    mime = part.get("mimeType", "")
+    data = (part.get("body") or {}).get("data")
+    if data and mime in ("text/plain", "text/html") and mime not in out and not part.get("filename"):
+        out[mime] = _b64(data)
+    for child in part.get("parts") or []:
+        _walk_bodies(child, out)
+
+
+def parse_message(resource: dict[str, Any]) -> GmailMessage:
+    # users.messages.get?format=full -> GmailMessage (first text/plain and text/html parts)
+    payload = resource.get("payload") or {}
+    headers = {h["name"].lower(): h["value"] for h in payload.get("headers") or []}
+    bodies: dict[str, str] = {}
+    _walk_bodies(payload, bodies)
+    from_email = email.utils.parseaddr(headers.get("from", ""))[1].lower() or None
+    recipients = [
+        addr.lower()
+        for _, addr in email.utils.getaddresses([headers.get("to", ""), headers.get("cc", "")])
+        if addr
+    ]
+    return GmailMessage(
+        id=resource["id"],
+        thread_id=resource["threadId"],
+        internal_date=datetime.fromtimestamp(int(resource.get("internalDate", 0)) / 1000, tz=timezone.utc).replace(tzinfo=None),
+        from_email=from_email,
+        recipients=recipients,
+        subject=headers.get("subject"),
+        body_text=bodies.get("text/plain"),
+        body_html=bodies.get("text/html"),
+        label_ids=list(resource.get("labelIds") or []),
+        headers=headers,
+    )
+
+
+class HttpGmailClient(GmailClient):
+    def __init__(self, http: httpx.AsyncClient | None = None):
+        self.http = http or httpx.AsyncClient(timeout=settings.GMAIL_HTTP_TIMEOUT_SECONDS)
+        self._tokens: dict[uuid.UUID, tuple[str, float]] = {}  # account id -> (access token, expires at)
+
+    async def _access_token(self, account: GmailAccountRef) -> str:
+        cached = self._tokens.get(account.id)
+        if cached and cached[1] > time.time() + 60:
+            return cached[0]
+        res = await self.http.post(TOKEN_URL, data={
+            "client_id": settings.GOOGLE_CLIENT_ID,
+            "client_secret": settings.GOOGLE_CLIENT_SECRET,
+            "refresh_token": account.refresh_token,
+            "grant_type": "refresh_token",
+        })
+        if res.status_code != 200:
+            raise GmailError(401 if res.status_code == 400 else res.status_code, res.text)
+        body = res.json()
+        self._tokens[account.id] = (body["access_token"], time.time() + int(body.get("expires_in", 3600)))
+        return body["access_token"]
+
+    @staticmethod
+    def _raise_for(status: int, text: str, retry_after: str | None) -> None:
+        if status == 429 or (status == 403 and "rateLimitExceeded" in text):
+            raise GmailRateLimited(float(retry_after or 1), text)
+        raise GmailError(status, text)
+
+    async def _request(self, account: GmailAccountRef, method: str, url: str, **kwargs: Any) -> dict[str, Any]:
+        headers = {"Authorization": f"Bearer {await self._access_token(account)}"}
+        res = await self.http.request(method, url, headers=headers, **kwargs)
+        if res.status_code == 401:
+            self._tokens.pop(account.id, None)
+        if res.status_code >= 400:
+            self._raise_for(res.status_code, res.text, res.headers.get("retry-after"))
+        return res.json()
+
+    async def current_history_id(self, account: GmailAccountRef) -> str:
+        return str((await self._request(account, "GET", f"{GMAIL_API}/profile"))["historyId"])
+
+    async def list_history(self, account: GmailAccountRef, start_history_id: str, page_token: str | None = None) -> HistoryPage:
+        params = {"startHistoryId": start_history_id, "historyTypes": "messageAdded", "maxResults": 500}
+        if page_token:
+            params["pageToken"] = page_token
+        try:
+            body = await self._request(account, "GET", f"{GMAIL_API}/history", params=params)
+        except GmailError as e:
+            if e.status == 404:
+                raise GmailHistoryExpired()
+            raise
+        ids: list[str] = []
+        last = start_history_id
+        for record in body.get("history") or []:
+            last = record["id"]
+            ids.extend(m["message"]["id"] for m in record.get("messagesAdded") or [])
+        next_token = body.get("nextPageToken")
+        # the response historyId is the mailbox head; only safe to jump to once every page is read
+        return HistoryPage(message_ids=ids, history_id=str(body["historyId"]) if not next_token else last, next_page_token=next_token)
+
+    async def batch_get(self, account: GmailAccountRef, message_ids: list[str]) -> list[GmailMessage]:
+        # One multipart/mixed request per BATCH_MAX ids instead of a request per message
+        out: list[GmailMessage] = []
+        for i in range(0, len(message_ids), BATCH_MAX):
+            chunk = message_ids[i:i + BATCH_MAX]
+            boundary = f"batch_{uuid.uuid4().hex}"
+            body = "".join(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <{mid}>\r\n\r\n"
+                f"GET /gmail/v1/users/me/messages/{mid}?format=full\r\n\r\n"
+                for mid in chunk
+            ) + f"--{boundary}--\r\n"
+            res = await self.http.post(
+                GMAIL_BATCH,
+                content=body.encode(),
+                headers={
+                    "Authorization": f"Bearer {await self._access_token(account)}",
+                    "Content-Type": f"multipart/mixed; boundary={boundary}",
+                },
+            )
+            if res.status_code >= 400:
+                self._raise_for(res.status_code, res.text, res.headers.get("retry-after"))
+            out.extend(self._parse_batch(res))
+        return out
+
+    def _parse_batch(self, res: httpx.Response) -> list[GmailMessage]:
+        boundary = res.headers["content-type"].split("boundary=", 1)[1].strip('"')
+        messages = []
+        for part in res.text.split(f"--{boundary}")[1:]:
+            if part.startswith("--"):
+                break
+            # part = outer headers, blank line, "HTTP/1.1 <status> ...", inner headers, blank line, JSON
+            _, _, inner = part.partition("\r\n\r\n")
+            status_line, _, rest = inner.partition("\r\n")
+            status = int(status_line.split(" ", 2)[1])
+            _, _, payload = rest.partition("\r\n\r\n")
+            if status == 404:
+                continue  # deleted between history.list and the fetch
+            if status >= 400:
+                self._raise_for(status, payload, None)
+            messages.append(parse_message(json.loads(payload)))
+        return messages
+
+    async def send(self, account: GmailAccountRef, raw: bytes, thread_id: str | None = None) -> SentMessage:
+        body: dict[str, Any] = {"raw": base64.urlsafe_b64encode(raw).decode()}
+        if thread_id:
+            body["threadId"] = thread_id
+        res = await self._request(account, "POST", f"{GMAIL_API}/messages/send", json=body)
+        return SentMessage(id=res["id"], thread_id=res["threadId"])
+
+    async def find_by_rfc822_id(self, account: GmailAccountRef, rfc822_id: str) -> SentMessage | None:
+        res = await self._request(
+            account, "GET", f"{GMAIL_API}/messages", params={"q": f"rfc822msgid:{rfc822_id}", "maxResults": 1}
+        )
+        found = res.get("messages") or []
+        return SentMessage(id=found[0]["id"], thread_id=found[0]["threadId"]) if found else None
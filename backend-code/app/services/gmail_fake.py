@@ -0,0 +1,127 @@
+import email
+import email.policy
+import email.utils
+import itertools
+import uuid
+from collections import Counter
+from datetime import datetime
+from app.services.gmail_client import (
+    GmailAccountRef,
+    GmailClient,
+    GmailHistoryExpired,
+    GmailMessage,
+    GmailRateLimited,
+    HistoryPage,
+    SentMessage,
+)
+from app.services.ratelimit import TokenBucket
+
+
+class FakeGmailClient(GmailClient):
+    # In-memory Gmail for exercising the sync pipeline locally: one mailbox per account email,
+    # a shared monotonically increasing history id, cross-delivery between fake mailboxes and
+    # optional per-account quota enforcement (Gmail charges 2/5/100 units for history/get/send).
+    UNITS = {"history": 2, "get": 5, "send": 100, "list": 5, "profile": 1}
+
+    def __init__(self, units_per_second: float | None = None, page_size: int = 100):
+        self._ids = itertools.count(1000)
+        self.mailboxes: dict[str, list[tuple[int, GmailMessage]]] = {}
+        self.threads: dict[tuple[str, str], str] = {}  # (mailbox, rfc822 root id) -> thread id
+        self.min_history: dict[str, int] = {}
+        self.page_size = page_size
+        self.calls: Counter[str] = Counter()
+        self._quota = TokenBucket(rate=units_per_second, burst=units_per_second) if units_per_second else None
+
+    def _charge(self, account: GmailAccountRef, op: str, n: int = 1) -> None:
+        self.calls[op] += n
+        if self._quota and not self._quota.allow(account.email, self.UNITS[op] * n):
+            raise GmailRateLimited(0.5, "userRateLimitExceeded")
+
+    def deliver(self, mailbox: str, msg: GmailMessage) -> GmailMessage:
+        # Append a message to a mailbox as if it had arrived; returns it with its mailbox-local ids
+        box = self.mailboxes.setdefault(mailbox.lower(), [])
+        root = msg.headers.get("references", "").split()[:1] or [msg.headers.get("message-id") or msg.id]
+        thread_id = msg.thread_id or self.threads.setdefault((mailbox.lower(), root[0]), f"t{next(self._ids):x}")
+        local = GmailMessage(
+            id=f"m{next(self._ids):x}",
+            thread_id=thread_id,
+            internal_date=msg.internal_date,
+            from_email=msg.from_email,
+            recipients=list(msg.recipients),
+            subject=msg.subject,
+            body_text=msg.body_text,
+            body_html=msg.body_html,
+            label_ids=list(msg.label_ids),
+            headers=dict(msg.headers),
+        )
+        box.append((next(self._ids), local))
+        return local
+
+    def expire_history(self, mailbox: str) -> None:
+        box = self.mailboxes.get(mailbox.lower(), [])
+        self.min_history[mailbox.lower()] = box[-1][0] if box else next(self._ids)
+
+    async def current_history_id(self, account: GmailAccountRef) -> str:
+        self._charge(account, "profile")
+        box = self.mailboxes.get(account.email.lower(), [])
+        return str(box[-1][0] if box else next(self._ids))
+
+    async def list_history(self, account: GmailAccountRef, start_history_id: str, page_token: str | None = None) -> HistoryPage:
+        self._charge(account, "history")
+        start = int(start_history_id)
+        if start < self.min_history.get(account.email.lower(), 0):
+            raise GmailHistoryExpired()
+        offset = int(page_token or 0)
+        entries = [(h, m) for h, m in self.mailboxes.get(account.email.lower(), []) if h > start]
+        page = entries[offset:offset + self.page_size]
+        more = offset + self.page_size < len(entries)
+        head = entries[-1][0] if entries else start
+        return HistoryPage(
+            message_ids=[m.id for _, m in page],
+            history_id=str(page[-1][0] if more else head),
+            next_page_token=str(offset + self.page_size) if more else None,
+        )
+
+    async def batch_get(self, account: GmailAccountRef, message_ids: list[str]) -> list[GmailMessage]:
+        self._charge(account, "get", len(message_ids))
+        wanted = set(message_ids)
+        return [m for _, m in self.mailboxes.get(account.email.lower(), []) if m.id in wanted]
+
+    async def send(self, account: GmailAccountRef, raw: bytes, thread_id: str | None = None) -> SentMessage:
+        self._charge(account, "send")
+        parsed = email.message_from_bytes(raw, policy=email.policy.default)
+        headers = {k.lower(): str(v) for k, v in parsed.items()}
+        body = parsed.get_body(("plain",))
+        recipients = [a.lower() for _, a in email.utils.getaddresses([headers.get("to", ""), headers.get("cc", "")]) if a]
+        msg = GmailMessage(
+            id="",
+            thread_id=thread_id or "",
+            internal_date=datetime.utcnow(),
+            from_email=account.email.lower(),
+            recipients=recipients,
+            subject=headers.get("subject"),
+            body_text=body.get_content() if body else None,
+            body_html=None,
+            label_ids=["SENT"],
+            headers=headers,
+        )
+        sent = self.deliver(account.email, msg)
+        for rcpt in recipients:
+            if rcpt in self.mailboxes and rcpt != account.email.lower():
+                self.deliver(rcpt, GmailMessage(**{**_fields(msg), "thread_id": "", "label_ids": ["INBOX", "UNREAD"]}))
+        return SentMessage(id=sent.id, thread_id=sent.thread_id)
+
+    async def find_by_rfc822_id(self, account: GmailAccountRef, rfc822_id: str) -> SentMessage | None:
+        self._charge(account, "list")
+        for _, m in self.mailboxes.get(account.email.lower(), []):
+            if m.headers.get("message-id") == rfc822_id:
+                return SentMessage(id=m.id, thread_id=m.thread_id)
+        return None
+
+
+def _fields(msg: GmailMessage) -> dict:
+    return {f: getattr(msg, f) for f in GmailMessage.__slots__}
+
+
+def fake_account(email_address: str) -> GmailAccountRef:
+    return GmailAccountRef(id=uuid.uuid5(uuid.NAMESPACE_DNS, email_address), email=email_address, refresh_token="fake")
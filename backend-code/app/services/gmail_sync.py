@@ -0,0 +1,480 @@
+import asyncio
+import json
+import logging
+import random
+import time
+import uuid
+from datetime import datetime
+from typing import Any
+import httpx
+from sqlalchemy import DateTime, Uuid, column, func, select, update, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.db.models import Conversation, ConversationParticipant, GmailAccount, Message, User
+from app.schemas.common import MessageOut
+from app.services.gmail_client import (
+    HEADER_CONVERSATION_ID,
+    HEADER_MESSAGE_ID,
+    GmailAccountRef,
+    GmailClient,
+    GmailError,
+    GmailHistoryExpired,
+    GmailMessage,
+    GmailRateLimited,
+    build_mime,
+    rfc822_id,
+)
+from app.services.message_stream import append_message
+from app.services.redis_client import get_redis, publish
+from app.services.user_cache import get_user_ids
+from app.services.ws_registry import publish_to_conversation, set_members
+
+logger = logging.getLogger(__name__)
+
+# Inbound: accounts due for an incremental sync, scored by due time; claiming pushes the score out by a lease
+SYNC_SCHEDULE = "gmail:sync:schedule"
+# Outbound: reliable queue like the thumbnail jobs, plus a zset of delayed retries scored by due time
+SEND_QUEUE = "jobs:gmail:send"
+SEND_PROCESSING = "jobs:gmail:send:processing"
+SEND_DELAYED = "jobs:gmail:send:delayed"
+SEND_SLOTS = "gmail:send:slots:"  # per-account zset of in-flight job ids scored by lease expiry
+QUOTA_BUCKET = "gmail:quota:"  # per-account token bucket hash (tokens, ts) shared by every worker process
+GMAIL_STATS = "jobs:gmail:stats"  # hash: synced_accounts / ingested / sent / failed / retried / throttled
+
+SKIP_LABELS = {"DRAFT", "SPAM", "TRASH"}
+
+_CLAIM_LUA = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[3])
+for _, id in ipairs(due) do redis.call('ZADD', KEYS[1], ARGV[2], id) end
+return due
+"""
+_SLOT_LUA = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then return 0 end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return 1
+"""
+_PROMOTE_LUA = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, 500)
+for _, job in ipairs(due) do
+  redis.call('ZREM', KEYS[1], job)
+  redis.call('LPUSH', KEYS[2], job)
+end
+return #due
+"""
+# Per-account Gmail quota pacing (units/s, see FakeGmailClient.UNITS for the costs). Takes ARGV[4] units
+# and returns 0, or leaves the bucket alone and returns the seconds until they are available.
+_QUOTA_LUA = """
+local now, rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+if tokens < cost then return tostring((cost - tokens) / rate) end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens - cost), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return '0'
+"""
+_scripts: dict[str, Any] = {}
+_MESSAGE_COLUMNS = [c for c in Message.__table__.c if c.name != "search_tsv"]
+
+
+def _script(name: str, source: str) -> Any:
+    if name not in _scripts:
+        _scripts[name] = get_redis().register_script(source)
+    return _scripts[name]
+
+
+async def _pace(account_id: uuid.UUID, units: int) -> None:
+    # the bucket lives in Redis so every sync and send worker draws from the account's one quota
+    cost = min(units, settings.GMAIL_QUOTA_BURST)
+    while True:
+        wait = float(await _script("quota", _QUOTA_LUA)(
+            keys=[f"{QUOTA_BUCKET}{account_id}"],
+            args=[time.time(), settings.GMAIL_QUOTA_UNITS_PER_SECOND, settings.GMAIL_QUOTA_BURST, cost],
+        ))
+        if wait <= 0:
+            return
+        await asyncio.sleep(wait + random.random() * 0.05)
+
+
+def account_ref(account: GmailAccount) -> GmailAccountRef:
+    return GmailAccountRef(id=account.id, email=account.email.lower(), refresh_token=account.refresh_token)
+
+
+async def schedule_account(account_id: uuid.UUID, delay: float = 0.0, only_new: bool = False) -> None:
+    await get_redis().zadd(SYNC_SCHEDULE, {str(account_id): time.time() + delay}, nx=only_new)
+
+
+async def claim_due_accounts(limit: int) -> list[uuid.UUID]:
+    now = time.time()
+    ids = await _script("claim", _CLAIM_LUA)(keys=[SYNC_SCHEDULE], args=[now, now + settings.GMAIL_SYNC_LEASE_SECONDS, limit])
+    return [uuid.UUID(i) for i in ids]
+
+
+async def enqueue_send(message_id: uuid.UUID, account_id: uuid.UUID) -> None:
+    await get_redis().lpush(SEND_QUEUE, json.dumps({
+        "message_id": str(message_id),
+        "account_id": str(account_id),
+        "attempt": 0,
+        "enqueued_at": time.time(),
+    }))
+
+
+async def _delay(job: dict[str, Any], seconds: float) -> None:
+    await get_redis().zadd(SEND_DELAYED, {json.dumps(job): time.time() + seconds})
+
+
+async def promote_delayed() -> int:
+    return await _script("promote", _PROMOTE_LUA)(keys=[SEND_DELAYED, SEND_QUEUE], args=[time.time()])
+
+
+async def gmail_queue_stats() -> dict[str, int]:
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.llen(SEND_QUEUE)
+    pipe.llen(SEND_PROCESSING)
+    pipe.zcard(SEND_DELAYED)
+    pipe.zcount(SYNC_SCHEDULE, "-inf", time.time())
+    pipe.hgetall(GMAIL_STATS)
+    queued, processing, delayed, due, stats = await pipe.execute()
+    return {
+        "send_queued": queued,
+        "send_processing": processing,
+        "send_delayed": delayed,
+        "accounts_due": due,
+        **{k: int(v) for k, v in stats.items()},
+    }
+
+
+# ---- inbound ----
+
+def _header_uuid(msg: GmailMessage, name: str) -> uuid.UUID | None:
+    try:
+        return uuid.UUID(msg.headers.get(name.lower(), ""))
+    except ValueError:
+        return None
+
+
+async def _trusted_hints(db: AsyncSession, owner: str, msgs: list[GmailMessage]) -> dict[str, uuid.UUID]:
+    # The X-MailChat headers are only believed for mail the app sent: the mailbox owner is a participant of the
+    # named conversation and the sender is a participant whose linked Gmail account sent it. Anything else
+    # (including forged headers from outside) resolves by thread like ordinary mail.
+    hinted = {m.id: cid for m in msgs if (cid := _header_uuid(m, HEADER_CONVERSATION_ID))}
+    if not hinted:
+        return {}
+    res = await db.execute(
+        select(
+            ConversationParticipant.conversation_id,
+            func.lower(func.coalesce(User.email, ConversationParticipant.external_email)),
+            func.lower(GmailAccount.email),
+        )
+        .select_from(ConversationParticipant)
+        .outerjoin(User, User.id == ConversationParticipant.user_id)
+        .outerjoin(GmailAccount, GmailAccount.user_id == ConversationParticipant.user_id)
+        .where(ConversationParticipant.conversation_id.in_(set(hinted.values())))
+    )
+    members: dict[uuid.UUID, set[str]] = {}
+    linked: dict[uuid.UUID, set[str]] = {}
+    for cid, member, account_email in res.tuples().all():
+        members.setdefault(cid, set()).add(member)
+        if account_email:
+            linked.setdefault(cid, set()).add(account_email)
+    sender = {m.id: m.from_email for m in msgs}
+    return {
+        mid: cid for mid, cid in hinted.items()
+        if owner in members.get(cid, ()) and sender[mid] in linked.get(cid, ())
+    }
+
+
+async def _resolve_conversations(db: AsyncSession, owner: str, msgs: list[GmailMessage]) -> tuple[dict[str, uuid.UUID], dict[uuid.UUID, list[str]]]:
+    # gmail message id -> conversation id; also returns the conversations created here with their participants.
+    # App-originated mail carries its conversation id; everything else resolves by thread id.
+    out = await _trusted_hints(db, owner, msgs)
+
+    first_in_thread: dict[str, GmailMessage] = {}
+    for m in msgs:
+        if m.id not in out:
+            first_in_thread.setdefault(m.thread_id, m)
+    if not first_in_thread:
+        return out, {}
+    created = (await db.execute(
+        pg_insert(Conversation)
+        .values([
+            {"id": uuid.uuid4(), "subject": (m.subject or "")[:255], "gmail_thread_id": tid, "created_at": m.internal_date, "last_message_at": None}
+            for tid, m in first_in_thread.items()
+        ])
+        .on_conflict_do_nothing(index_elements=["gmail_thread_id"])
+        .returning(Conversation.id, Conversation.gmail_thread_id)
+    )).all()
+    by_thread = dict((tid, cid) for cid, tid in created)
+    missing = [tid for tid in first_in_thread if tid not in by_thread]
+    if missing:
+        res = await db.execute(select(Conversation.gmail_thread_id, Conversation.id).where(Conversation.gmail_thread_id.in_(missing)))
+        by_thread.update(res.tuples().all())
+
+    new_members: dict[uuid.UUID, list[str]] = {}
+    for cid, tid in created:
+        m = first_in_thread[tid]
+        new_members[cid] = list(dict.fromkeys([owner, *([m.from_email] if m.from_email else []), *m.recipients]))
+    if new_members:
+        user_ids = await get_user_ids(db, list({e for emails in new_members.values() for e in emails}))
+        await db.execute(pg_insert(ConversationParticipant).values([
+            {"id": uuid.uuid4(), "conversation_id": cid, "user_id": user_ids.get(e), "external_email": None if e in user_ids else e}
+            for cid, emails in new_members.items()
+            for e in emails
+        ]))
+    for m in msgs:
+        if m.id not in out and m.thread_id in by_thread:
+            out[m.id] = by_thread[m.thread_id]
+    return out, new_members
+
+
+async def ingest_messages(account: GmailAccountRef, messages: list[GmailMessage]) -> int:
+    # One transaction per fetched batch: resolve conversations, multi-row insert deduplicated on
+    # id / gmail_message_id, bump the inbox ordering, then fan out to connected clients
+    msgs = [m for m in messages if not SKIP_LABELS.intersection(m.label_ids)]
+    if not msgs:
+        return 0
+    async with AsyncSessionLocal() as db:
+        conv_for, new_members = await _resolve_conversations(db, account.email, msgs)
+        # a trusted app-originated copy of a message the conversation already holds is not stored twice
+        app_ids = {m.id: mid for m in msgs if m.id in conv_for and (mid := _header_uuid(m, HEADER_MESSAGE_ID))}
+        present: set[tuple[uuid.UUID, uuid.UUID]] = set()
+        if app_ids:
+            res = await db.execute(select(Message.id, Message.conversation_id).where(Message.id.in_(set(app_ids.values()))))
+            present = set(res.tuples().all())
+        senders = await get_user_ids(db, list({m.from_email for m in msgs if m.from_email}))
+        rows = []
+        for m in msgs:
+            if m.id not in conv_for or (app_ids.get(m.id), conv_for[m.id]) in present:
+                continue
+            outbound = m.from_email == account.email
+            rows.append({
+                "id": uuid.uuid4(),
+                "conversation_id": conv_for[m.id],
+                "sender_user_id": senders.get(m.from_email),
+                "external_from_email": None if m.from_email in senders else m.from_email,
+                "body_text": m.body_text,
+                "body_html": m.body_html,
+                "direction": "outbound" if outbound else "inbound",
+                "gmail_message_id": m.id,
+                "status": "sent" if outbound else "delivered",
+                "created_at": m.internal_date,
+            })
+        if not rows:
+            await db.commit()
+            return 0
+        inserted = (await db.execute(
+            pg_insert(Message).values(rows).on_conflict_do_nothing().returning(*_MESSAGE_COLUMNS)
+        )).all()
+        if inserted:
+            newest: dict[uuid.UUID, Any] = {}
+            for r in inserted:
+                if r.conversation_id not in newest or r.created_at > newest[r.conversation_id].created_at:
+                    newest[r.conversation_id] = r
+            v = values(column("cid", Uuid), column("at", DateTime), column("mid", Uuid), name="v").data(
+                [(cid, r.created_at, r.id) for cid, r in newest.items()]
+            )
+            await db.execute(
+                update(Conversation)
+                .where(Conversation.id == v.c.cid)
+                .where((Conversation.last_message_at.is_(None)) | (Conversation.last_message_at < v.c.at))
+                .values(last_message_at=v.c.at, last_message_id=v.c.mid)
+            )
+        await db.commit()
+
+    for cid, emails in new_members.items():
+        await set_members(str(cid), emails)
+        await publish("events:conversations", {"conversation_id": str(cid), "participants": emails})
+    for r in sorted(inserted, key=lambda r: r.created_at):
+        await append_message(str(r.conversation_id), MessageOut.model_validate(r._mapping).model_dump(mode="json"))
+    return len(inserted)
+
+
+async def sync_account(client: GmailClient, account_id: uuid.UUID) -> int:
+    # Incremental sync from the stored history cursor; the cursor advances page by page, after
+    # each page's messages are ingested, so a crash only replays (deduplicated) work
+    async with AsyncSessionLocal() as db:
+        account = await db.get(GmailAccount, account_id)
+    if account is None:
+        await get_redis().zrem(SYNC_SCHEDULE, str(account_id))
+        return 0
+    ref = account_ref(account)
+    if account.history_id is None:
+        await _pace(ref.id, 1)
+        await _save_cursor(account_id, await client.current_history_id(ref))
+        return 0
+
+    start, token, total = account.history_id, None, 0
+    try:
+        while True:
+            await _pace(ref.id, 2)
+            page = await client.list_history(ref, start, token)
+            ids = list(dict.fromkeys(page.message_ids))
+            for i in range(0, len(ids), settings.GMAIL_FETCH_BATCH):
+                chunk = ids[i:i + settings.GMAIL_FETCH_BATCH]
+                await _pace(ref.id, 5 * len(chunk))
+                total += await ingest_messages(ref, await client.batch_get(ref, chunk))
+            await _save_cursor(account_id, page.history_id)
+            if not page.next_page_token or total >= settings.GMAIL_SYNC_MAX_MESSAGES_PER_RUN:
+                break
+            token = page.next_page_token
+    except GmailHistoryExpired:
+        # Gmail no longer has the gap; restart from the mailbox head (older mail comes from a backfill)
+        await _save_cursor(account_id, await client.current_history_id(ref), error="history expired; resumed from head")
+    await get_redis().hincrby(GMAIL_STATS, "ingested", total)
+    return total
+
+
+async def _save_cursor(account_id: uuid.UUID, history_id: str, error: str | None = None) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(GmailAccount)
+            .where(GmailAccount.id == account_id)
+            .values(history_id=history_id, last_synced_at=datetime.utcnow(), sync_error=error)
+        )
+        await db.commit()
+
+
+async def record_sync_error(account_id: uuid.UUID, error: str) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(GmailAccount).where(GmailAccount.id == account_id).values(sync_error=error[:255]))
+        await db.commit()
+
+
+# ---- outbound ----
+
+async def _set_status(message_id: uuid.UUID, conversation_id: uuid.UUID, status: str, **extra: Any) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(Message).where(Message.id == message_id).values(status=status, **extra))
+        await db.commit()
+    await publish_to_conversation(str(conversation_id), {
+        "type": "message.status",
+        "conversation_id": str(conversation_id),
+        "message_id": str(message_id),
+        "status": status,
+    })
+
+
+async def _claim_send(message_id: uuid.UUID) -> dict[str, Any] | None:
+    # queued -> sending; a message already carrying a gmail_message_id was sent and is never resent.
+    # A row found already in "sending" was claimed by a worker that may have died after reaching Gmail.
+    async with AsyncSessionLocal() as db:
+        claimable = (Message.id == message_id, Message.status.in_(("queued", "sending")), Message.gmail_message_id.is_(None))
+        previous = (await db.execute(select(Message.status).where(*claimable).with_for_update())).scalar_one_or_none()
+        if previous is None:
+            await db.commit()
+            return None
+        row = (await db.execute(
+            update(Message)
+            .where(*claimable)
+            .values(status="sending")
+            .returning(Message.conversation_id, Message.sender_user_id, Message.body_text)
+        )).first()
+        if row is None:
+            await db.commit()
+            return None
+        convo = (await db.execute(
+            select(Conversation.subject, Conversation.gmail_thread_id).where(Conversation.id == row.conversation_id)
+        )).first()
+        res = await db.execute(
+            select(func.coalesce(User.email, ConversationParticipant.external_email))
+            .select_from(ConversationParticipant)
+            .outerjoin(User, User.id == ConversationParticipant.user_id)
+            .where(
+                ConversationParticipant.conversation_id == row.conversation_id,
+                ConversationParticipant.user_id.is_distinct_from(row.sender_user_id),
+            )
+        )
+        account = (await db.execute(select(GmailAccount).where(GmailAccount.user_id == row.sender_user_id))).scalar_one_or_none()
+        await db.commit()
+    return {
+        "conversation_id": row.conversation_id,
+        "body_text": row.body_text,
+        "subject": convo.subject if convo else None,
+        "thread_id": convo.gmail_thread_id if convo else None,
+        "recipients": [e for e in res.scalars().all() if e],
+        "account": account,
+        "resumed": previous == "sending",
+    }
+
+
+async def _acquire_slot(account_id: str, job_id: str) -> bool:
+    now = time.time()
+    return bool(await _script("slot", _SLOT_LUA)(
+        keys=[f"{SEND_SLOTS}{account_id}"],
+        args=[now, now + settings.GMAIL_SEND_LEASE_SECONDS, settings.GMAIL_SEND_CONCURRENCY_PER_ACCOUNT, job_id, int(settings.GMAIL_SEND_LEASE_SECONDS) * 2],
+    ))
+
+
+async def send_one(client: GmailClient, job: dict[str, Any]) -> str:
+    # Returns the outcome: sent / skipped / deferred / retry / failed
+    r = get_redis()
+    message_id = uuid.UUID(job["message_id"])
+    if not await _acquire_slot(job["account_id"], job["message_id"]):
+        await _delay(job, 1.0)  # account already at its in-flight limit
+        return "deferred"
+    try:
+        claim = await _claim_send(message_id)
+        if claim is None:
+            return "skipped"
+        cid = claim["conversation_id"]
+        await publish_to_conversation(str(cid), {
+            "type": "message.status", "conversation_id": str(cid), "message_id": str(message_id), "status": "sending",
+        })
+        account = claim["account"]
+        if account is None or not claim["recipients"]:
+            await _set_status(message_id, cid, "failed")
+            await r.hincrby(GMAIL_STATS, "failed", 1)
+            return "failed"
+        ref = account_ref(account)
+        try:
+            sent = None
+            if job["attempt"] > 0 or claim["resumed"]:
+                # an earlier attempt may have reached Gmail before failing; never send twice
+                await _pace(ref.id, 5)
+                sent = await client.find_by_rfc822_id(ref, rfc822_id(message_id))
+            if sent is None:
+                raw = build_mime(message_id, cid, ref.email, claim["recipients"], claim["subject"], claim["body_text"])
+                await _pace(ref.id, 100)
+                try:
+                    sent = await client.send(ref, raw, claim["thread_id"])
+                except GmailError as e:
+                    # the conversation's thread may belong to another participant's mailbox
+                    if e.status != 404 or not claim["thread_id"]:
+                        raise
+                    sent = await client.send(ref, raw, None)
+        except GmailRateLimited as e:
+            await _set_status(message_id, cid, "queued")
+            await _delay(job, e.retry_after + random.random())
+            await r.hincrby(GMAIL_STATS, "throttled", 1)
+            return "deferred"
+        except (GmailError, httpx.TransportError) as e:
+            retryable = not isinstance(e, GmailError) or e.retryable
+            job["attempt"] += 1
+            if retryable and job["attempt"] < settings.GMAIL_SEND_MAX_ATTEMPTS:
+                await _set_status(message_id, cid, "queued")
+                await _delay(job, min(300.0, 2 ** job["attempt"]) + random.random())
+                await r.hincrby(GMAIL_STATS, "retried", 1)
+                return "retry"
+            logger.warning("gmail send %s failed permanently: %s", message_id, e)
+            await _set_status(message_id, cid, "failed")
+            await r.hincrby(GMAIL_STATS, "failed", 1)
+            return "failed"
+
+        await _set_status(message_id, cid, "sent", gmail_message_id=sent.id)
+        async with AsyncSessionLocal() as db:
+            taken = select(Conversation.id).where(Conversation.gmail_thread_id == sent.thread_id).exists()
+            await db.execute(
+                update(Conversation)
+                .where(Conversation.id == cid, Conversation.gmail_thread_id.is_(None), ~taken)
+                .values(gmail_thread_id=sent.thread_id)
+            )
+            await db.commit()
+        await r.hincrby(GMAIL_STATS, "sent", 1)
+        return "sent"
+    finally:
+        await r.zrem(f"{SEND_SLOTS}{job['account_id']}", job["message_id"])
@@ -0,0 +1,71 @@
+import time
+from typing import Any
+from redis.exceptions import ResponseError
+from app.core.config import settings
+from app.services.codec import dumps, loads
+from app.services.redis_client import get_redis
+from app.services.ws_registry import ROUTE_LUA, members_key, publish_to_conversation
+
+# XADD and node-targeted PUBLISH in one atomic step so live events leave in stream-id order.
+# Returns {seq, routed}; routed is 0 when the member set was not cached and nothing was sent.
+_APPEND_LUA = ROUTE_LUA + """
+local seq = redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '*', 'data', ARGV[2])
+local ev = '{"type":"message","conversation_id":"' .. ARGV[3] .. '","seq":"' .. seq .. '","message":' .. ARGV[2] .. '}'
+if route(KEYS[2], ARGV[4], ev) < 0 then return {seq, 0} end
+return {seq, 1}
+"""
+_append_script = None
+
+
+def stream_key(conversation_id: str) -> str:
+    return f"stream:messages:{conversation_id}"
+
+
+def parse_seq(seq: str) -> tuple[int, int]:
+    ms, _, n = seq.partition("-")
+    return int(ms), int(n or 0)
+
+
+async def append_message(conversation_id: str, message: dict[str, Any]) -> str:
+    global _append_script
+    if _append_script is None:
+        _append_script = get_redis().register_script(_APPEND_LUA)
+    seq, routed = await _append_script(
+        keys=[stream_key(conversation_id), members_key(conversation_id)],
+        args=[settings.MESSAGE_STREAM_MAXLEN, dumps(message), conversation_id, time.time()],
+    )
+    if not routed:
+        await publish_to_conversation(
+            conversation_id, {"type": "message", "conversation_id": conversation_id, "seq": seq, "message": message}
+        )
+    return seq
+
+
+async def read_since(conversation_id: str, offset: str) -> tuple[list[dict[str, Any]], bool]:
+    # Returns (events after offset, complete). complete=False means the gap is no longer
+    # fully retained in the stream (trimmed or too long) and the client should reload history.
+    r = get_redis()
+    key = stream_key(conversation_id)
+    try:
+        after = parse_seq(offset)
+    except ValueError:
+        return [], False
+    try:
+        info = await r.xinfo_stream(key)
+    except ResponseError:
+        return [], True  # no stream yet: nothing was ever published
+    # Redis 7 tracks the newest trimmed id; older servers only expose the first retained entry
+    max_deleted = info.get("max-deleted-entry-id")
+    if max_deleted:
+        if after < parse_seq(max_deleted):
+            return [], False
+    elif info.get("first-entry") and after < parse_seq(info["first-entry"][0]):
+        return [], False
+    entries = await r.xrange(key, min=f"({after[0]}-{after[1]}", max="+", count=settings.MESSAGE_REPLAY_MAX + 1)
+    if len(entries) > settings.MESSAGE_REPLAY_MAX:
+        return [], False
+    events = [
+        {"type": "message", "conversation_id": conversation_id, "seq": seq, "message": loads(fields["data"])}
+        for seq, fields in entries
+    ]
+    return events, True
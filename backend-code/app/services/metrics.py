@@ -0,0 +1,104 @@
+import os
+import time
+from contextvars import ContextVar
+from typing import Any
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Exposed at GET /metrics. With several uvicorn workers set PROMETHEUS_MULTIPROC_DIR to a shared,
+# emptied-at-boot directory so the scrape aggregates every process.
+
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+HTTP_DB_QUERIES = Histogram(
+    "http_request_db_queries", "SQL statements executed per HTTP request",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100),
+)
+HTTP_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Time spent in SQL per HTTP request",
+    ["route"],
+    buckets=FAST_BUCKETS,
+)
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "SQL statement duration", ["engine"], buckets=FAST_BUCKETS)
+DB_POOL_WAIT_SECONDS = Histogram("db_pool_checkout_wait_seconds", "Time waiting for a pooled connection", ["engine"], buckets=FAST_BUCKETS)
+REDIS_COMMAND_SECONDS = Histogram("redis_command_duration_seconds", "Redis command latency", ["command"], buckets=FAST_BUCKETS)
+MINIO_CALL_SECONDS = Histogram("minio_call_duration_seconds", "MinIO SDK call duration (including thread pool queueing)", ["call"], buckets=FAST_BUCKETS)
+WS_CONNECTIONS = Gauge("ws_connections", "Open WebSocket connections", multiprocess_mode="livesum")
+WS_PUBSUB_LAG_SECONDS = Histogram("ws_pubsub_lag_seconds", "Publish-to-dispatch delay of the node channel probe", buckets=FAST_BUCKETS)
+WS_EVENTS = Counter("ws_events_total", "Events dispatched to local sockets", ["channel"])
+RATE_LIMITED = Counter("http_rate_limited_total", "Requests rejected with 429 by the rate limiter", ["route", "source"])
+
+# (statement count, seconds in SQL) for the HTTP request being served, if any
+_request_db: ContextVar[list | None] = ContextVar("request_db", default=None)
+
+
+def instrument_engine(engine: Engine, role: str) -> None:
+    # Statement timing via engine events; runs on the sync engine behind AsyncEngine
+    duration = DB_QUERY_SECONDS.labels(role)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        duration.observe(elapsed)
+        acc = _request_db.get()
+        if acc is not None:
+            acc[0] += 1
+            acc[1] += elapsed
+
+
+class MetricsMiddleware:
+    # Pure ASGI so streaming responses (attachments) are not buffered; websockets pass through
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = {"code": 500}
+
+        async def send_wrapper(message: dict) -> None:
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        acc = [0, 0.0]
+        token = _request_db.set(acc)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_db.reset(token)
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            HTTP_LATENCY.labels(scope["method"], template, str(status["code"])).observe(time.perf_counter() - started)
+            HTTP_DB_QUERIES.labels(template).observe(acc[0])
+            HTTP_DB_SECONDS.labels(template).observe(acc[1])
+
+
+def render_metrics() -> tuple[bytes, str]:
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -1,7 +1,20 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+from typing import Any, AsyncIterator, Callable, TypeVar
 from minio import Minio
+from minio.datatypes import Object, Part
 from app.core.config import settings
+from app.services.metrics import MINIO_CALL_SECONDS
+
+T = TypeVar("T")
 
 _client: Minio | None = None
+_presign_client: Minio | None = None
+# The MinIO SDK is blocking; every call from async code goes through this bounded pool
+_executor = ThreadPoolExecutor(max_workers=settings.MINIO_THREADS, thread_name_prefix="minio")
 
 
 def get_minio() -> Minio:
@@ -12,12 +25,104 @@ def get_minio() -> Minio:
             access_key=settings.MINIO_ACCESS_KEY,
             secret_key=settings.MINIO_SECRET_KEY,
             secure=bool(settings.MINIO_SECURE),
+            region=settings.MINIO_REGION,
         )
     return _client
 
 
+def get_presign_minio() -> Minio:
+    # Signs URLs for the endpoint clients can reach; signing is local, no request is made
+    global _presign_client
+    if not settings.MINIO_PUBLIC_ENDPOINT:
+        return get_minio()
+    if _presign_client is None:
+        _presign_client = Minio(
+            settings.MINIO_PUBLIC_ENDPOINT,
+            access_key=settings.MINIO_ACCESS_KEY,
+            secret_key=settings.MINIO_SECRET_KEY,
+            secure=bool(settings.MINIO_SECURE),
+            region=settings.MINIO_REGION,
+        )
+    return _presign_client
+
+
+async def run_minio(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    try:
+        return await loop.run_in_executor(_executor, partial(fn, *args, **kwargs))
+    finally:
+        MINIO_CALL_SECONDS.labels(fn.__name__.lstrip("_")).observe(time.perf_counter() - started)
+
+
 async def ensure_bucket():
     client = get_minio()
-    found = client.bucket_exists(settings.MINIO_BUCKET)
+    found = await run_minio(client.bucket_exists, settings.MINIO_BUCKET)
     if not found:
-        client.make_bucket(settings.MINIO_BUCKET)
+        await run_minio(client.make_bucket, settings.MINIO_BUCKET)
+
+
+def _expires() -> timedelta:
+    return timedelta(seconds=settings.MINIO_PRESIGN_EXPIRES_SECONDS)
+
+
+async def presign_put(object_key: str) -> str:
+    return await run_minio(get_presign_minio().presigned_put_object, settings.MINIO_BUCKET, object_key, _expires())
+
+
+async def create_multipart_upload(object_key: str, content_type: str) -> str:
+    # minio-py keeps the multipart primitives private; these are the calls put_object uses internally
+    client = get_minio()
+    return await run_minio(client._create_multipart_upload, settings.MINIO_BUCKET, object_key, {"Content-Type": content_type})
+
+
+async def presign_upload_parts(object_key: str, upload_id: str, part_count: int) -> list[str]:
+    client = get_presign_minio()
+
+    def sign_all() -> list[str]:
+        return [
+            client.get_presigned_url(
+                "PUT",
+                settings.MINIO_BUCKET,
+                object_key,
+                expires=_expires(),
+                extra_query_params={"uploadId": upload_id, "partNumber": str(n)},
+            )
+            for n in range(1, part_count + 1)
+        ]
+
+    return await run_minio(sign_all)
+
+
+async def complete_multipart_upload(object_key: str, upload_id: str, parts: list[tuple[int, str]]) -> None:
+    client = get_minio()
+    await run_minio(
+        client._complete_multipart_upload,
+        settings.MINIO_BUCKET,
+        object_key,
+        upload_id,
+        [Part(number, etag) for number, etag in sorted(parts)],
+    )
+
+
+async def abort_multipart_upload(object_key: str, upload_id: str) -> None:
+    client = get_minio()
+    await run_minio(client._abort_multipart_upload, settings.MINIO_BUCKET, object_key, upload_id)
+
+
+async def stat_object(object_key: str) -> Object:
+    return await run_minio(get_minio().stat_object, settings.MINIO_BUCKET, object_key)
+
+
+async def stream_object(object_key: str, offset: int = 0, length: int = 0) -> AsyncIterator[bytes]:
+    # Yields the object (or a byte range of it) chunk by chunk; memory stays at one chunk
+    resp = await run_minio(get_minio().get_object, settings.MINIO_BUCKET, object_key, offset, length)
+    try:
+        while True:
+            chunk = await run_minio(resp.read, settings.MINIO_DOWNLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        resp.close()
+        resp.release_conn()
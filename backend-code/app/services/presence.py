@@ -0,0 +1,149 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from sqlalchemy import DateTime, String, column, update, values
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.db.models import User
+from app.services.redis_client import get_redis, publish
+
+logger = logging.getLogger(__name__)
+
+DIRTY_KEY = "presence:dirty"  # zset: subject -> last heartbeat (epoch seconds) since the last flush
+PENDING_KEY = "presence:heartbeats:pending"  # heartbeats received since the last flush
+ONLINE_KEY = "presence:online"  # zset: subject -> last heartbeat, used to detect online/offline transitions
+PRESENCE_CHANNEL = "events:presence"
+
+# Atomically pop subjects whose last heartbeat is older than the TTL (bounded per sweep)
+_SWEEP_LUA = """
+local gone = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, 1000)
+if #gone > 0 then redis.call('ZREM', KEYS[1], unpack(gone)) end
+return gone
+"""
+_sweep_script = None
+
+# Per-process flush counters; heartbeats/users of the last flush give the coalescing ratio
+presence_metrics: dict[str, float] = {
+    "flushes": 0,
+    "heartbeats_coalesced": 0,
+    "users_flushed": 0,
+    "last_flush_heartbeats": 0,
+    "last_flush_users": 0,
+}
+
+_flusher_task: asyncio.Task | None = None
+
+
+async def record_heartbeat(subject: str) -> datetime:
+    now = datetime.now(timezone.utc)
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.setex(f"presence:{subject}", settings.PRESENCE_TTL_SECONDS, "online")
+    pipe.set(f"last_seen:{subject}", now.isoformat())
+    pipe.zadd(DIRTY_KEY, {subject: now.timestamp()})
+    pipe.incr(PENDING_KEY)
+    pipe.zadd(ONLINE_KEY, {subject: now.timestamp()})
+    *_, became_online = await pipe.execute()
+    if became_online:
+        await publish(PRESENCE_CHANNEL, {"type": "presence", "user": subject, "online": True, "last_seen": now.isoformat()})
+    return now
+
+
+async def lookup_presence(emails: list[str]) -> dict[str, dict[str, object]]:
+    # One MGET for the whole batch: [presence:e1, last_seen:e1, presence:e2, ...]
+    if not emails:
+        return {}
+    keys = [k for e in emails for k in (f"presence:{e}", f"last_seen:{e}")]
+    vals = await get_redis().mget(keys)
+    return {
+        e: {"online": vals[2 * i] == "online", "last_seen": vals[2 * i + 1]}
+        for i, e in enumerate(emails)
+    }
+
+
+async def sweep_offline() -> int:
+    global _sweep_script
+    if _sweep_script is None:
+        _sweep_script = get_redis().register_script(_SWEEP_LUA)
+    cutoff = datetime.now(timezone.utc).timestamp() - settings.PRESENCE_TTL_SECONDS
+    gone = await _sweep_script(keys=[ONLINE_KEY], args=[cutoff])
+    if not gone:
+        return 0
+    last = await get_redis().mget([f"last_seen:{e}" for e in gone])
+    for email, last_seen in zip(gone, last):
+        await publish(PRESENCE_CHANNEL, {"type": "presence", "user": email, "online": False, "last_seen": last_seen})
+    return len(gone)
+
+
+async def _requeue(dirty: list[tuple[str, float]], pending: str | None) -> None:
+    # put an unapplied batch back; GT keeps a newer heartbeat recorded while it was in flight
+    pipe = get_redis().pipeline(transaction=True)
+    pipe.zadd(DIRTY_KEY, dict(dirty), gt=True)
+    if pending:
+        pipe.incrby(PENDING_KEY, int(pending))
+    await pipe.execute()
+
+
+async def flush_presence() -> int:
+    # Take and clear the dirty set atomically so concurrent workers never double-write
+    pipe = get_redis().pipeline(transaction=True)
+    pipe.zrange(DIRTY_KEY, 0, -1, withscores=True)
+    pipe.get(PENDING_KEY)
+    pipe.delete(DIRTY_KEY, PENDING_KEY)
+    dirty, pending, _ = await pipe.execute()
+    if not dirty:
+        return 0
+
+    # users.last_seen is a naive UTC column
+    rows = [(email, datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None)) for email, ts in dirty]
+    seen = values(column("email", String), column("last_seen", DateTime), name="seen").data(rows)
+    try:
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(User).where(User.email == seen.c.email).values(last_seen=seen.c.last_seen))
+            await db.commit()
+    except BaseException:
+        await _requeue(dirty, pending)  # retried on the next flush instead of being lost
+        raise
+
+    heartbeats = int(pending or 0)
+    presence_metrics["flushes"] += 1
+    presence_metrics["heartbeats_coalesced"] += heartbeats
+    presence_metrics["users_flushed"] += len(rows)
+    presence_metrics["last_flush_heartbeats"] = heartbeats
+    presence_metrics["last_flush_users"] = len(rows)
+    logger.debug("presence flush: %d heartbeats -> %d users", heartbeats, len(rows))
+    return len(rows)
+
+
+async def _flush_loop() -> None:
+    while True:
+        await asyncio.sleep(settings.PRESENCE_FLUSH_INTERVAL_SECONDS)
+        try:
+            await flush_presence()
+        except Exception:
+            logger.exception("presence flush failed")
+        try:
+            await sweep_offline()
+        except Exception:
+            logger.exception("presence sweep failed")
+
+
+def start_presence_flusher() -> None:
+    global _flusher_task
+    if _flusher_task is None or _flusher_task.done():
+        _flusher_task = asyncio.create_task(_flush_loop())
+
+
+async def stop_presence_flusher() -> None:
+    global _flusher_task
+    if _flusher_task is not None:
+        _flusher_task.cancel()
+        try:
+            await _flusher_task
+        except (asyncio.CancelledError, Exception):
+            pass
+        _flusher_task = None
+    # write out whatever is still buffered before the worker exits
+    try:
+        await flush_presence()
+    except Exception:
+        logger.exception("final presence flush failed")
@@ -0,0 +1,186 @@
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+from starlette.routing import Match
+from app.core.config import settings
+from app.services.auth import verify_token
+from app.services.metrics import RATE_LIMITED
+from app.services.redis_client import get_redis
+
+
+class TokenBucket:
+    # Per-key token buckets held in process; least recently used keys are evicted past max_keys
+    def __init__(self, rate: float, burst: float, max_keys: int = 100_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def allow(self, key: str, cost: float = 1.0) -> bool:
+        now = time.monotonic()
+        tokens, last = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed
+
+
+# Sliding window counter: the previous fixed window's count weighted by its remaining overlap plus the
+# current window's count. Grants up to ARGV[4] permits at once (a local lease) and returns how many.
+_WINDOW_LUA = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+local prev = tonumber(redis.call('GET', KEYS[1]) or '0')
+local cur = tonumber(redis.call('GET', KEYS[2]) or '0')
+local elapsed = (now % window) / window
+local grant = math.min(tonumber(ARGV[4]), math.floor(limit - prev * (1 - elapsed) - cur))
+if grant <= 0 then return 0 end
+redis.call('INCRBY', KEYS[2], grant)
+redis.call('EXPIRE', KEYS[2], math.ceil(window * 2))
+return grant
+"""
+
+ratelimit_metrics = {
+    "checked": 0, "local_rejects": 0, "redis_rejects": 0, "redis_calls": 0, "redis_errors": 0, "redis_skipped": 0,
+}
+
+
+@dataclass(frozen=True, slots=True)
+class Limit:
+    requests: int
+    seconds: float
+
+    @classmethod
+    def parse(cls, spec: str) -> "Limit | None":
+        if spec.strip().lower() == "off":
+            return None
+        requests, _, seconds = spec.partition("/")
+        return cls(int(requests), float(seconds or 1))
+
+
+class RateLimiter:
+    # Shared limit in Redis, decided in process where possible: a TokenBucket at the limit's rate rejects
+    # clients already over it from this process alone, and permits are leased from Redis in small batches
+    # (counted there when granted, so the shared limit is never exceeded; unused permits just expire)
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: dict[Limit, TokenBucket] = {}
+        self._leases: OrderedDict[str, tuple[int, float]] = OrderedDict()  # key -> (permits left, expires at)
+        self._script: Any = None
+        # open circuit: after a Redis error, skip Redis until then so an outage costs one timeout, not one per request
+        self._redis_down_until = 0.0
+
+    async def allow(self, route: str, limit: Limit, client: str) -> tuple[bool, str]:
+        ratelimit_metrics["checked"] += 1
+        bucket = self._buckets.get(limit)
+        if bucket is None:
+            bucket = self._buckets[limit] = TokenBucket(limit.requests / limit.seconds, limit.requests, self.max_keys)
+        key = f"{route}|{client}"
+        if not bucket.allow(key):
+            ratelimit_metrics["local_rejects"] += 1
+            return False, "local"
+        now = time.monotonic()
+        left, expires = self._leases.get(key, (0, 0.0))
+        if left > 0 and expires > now:
+            self._leases[key] = (left - 1, expires)
+            return True, "lease"
+        granted = await self._acquire(key, limit)
+        if granted <= 0:
+            ratelimit_metrics["redis_rejects"] += 1
+            return False, "redis"
+        self._leases[key] = (granted - 1, now + settings.RATE_LIMIT_LEASE_SECONDS)
+        self._leases.move_to_end(key)
+        if len(self._leases) > self.max_keys:
+            self._leases.popitem(last=False)
+        return True, "redis"
+
+    async def _acquire(self, key: str, limit: Limit) -> int:
+        if time.monotonic() < self._redis_down_until:
+            ratelimit_metrics["redis_skipped"] += 1
+            return 1
+        if self._script is None:
+            self._script = get_redis().register_script(_WINDOW_LUA)
+        now = time.time()
+        window = int(now // limit.seconds)
+        want = max(1, math.ceil(limit.requests * settings.RATE_LIMIT_LEASE_FRACTION))
+        ratelimit_metrics["redis_calls"] += 1
+        try:
+            return int(await self._script(
+                keys=[f"ratelimit:{key}:{window - 1}", f"ratelimit:{key}:{window}"],
+                args=[now, limit.seconds, limit.requests, want],
+            ))
+        except Exception:
+            # fail open: the per-process bucket still caps each client while Redis is unavailable
+            ratelimit_metrics["redis_errors"] += 1
+            self._redis_down_until = time.monotonic() + settings.RATE_LIMIT_REDIS_COOLDOWN_SECONDS
+            return 1
+
+
+limiter = RateLimiter()
+_default_limit = Limit.parse(settings.RATE_LIMIT_DEFAULT)
+_route_limits = {route: Limit.parse(spec) for route, spec in settings.RATE_LIMIT_ROUTES.items()}
+
+
+def _client_key(scope: dict) -> str:
+    # JWT subject when the request carries a valid bearer token, else the client address
+    for name, value in scope.get("headers") or ():
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                try:
+                    return f"user:{verify_token(token).sub}"
+                except HTTPException:
+                    pass
+            break
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class RateLimitMiddleware:
+    # Pure ASGI, ahead of routing: resolves the route template itself so limits are per endpoint,
+    # not per concrete path. Rejections carry Retry-After and the usual {"detail": ...} body.
+    def __init__(self, app: Any):
+        self.app = app
+
+    @staticmethod
+    def _match(scope: dict) -> Any:
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route
+        return None
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        if (
+            scope["type"] != "http"
+            or not settings.RATE_LIMIT_ENABLED
+            or scope["path"].startswith(tuple(settings.RATE_LIMIT_EXEMPT_PREFIXES))
+        ):
+            await self.app(scope, receive, send)
+            return
+        route = self._match(scope)
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+        name = f"{scope['method']} {route.path}"
+        limit = _route_limits.get(name, _default_limit)
+        if limit is not None:
+            allowed, source = await limiter.allow(name, limit, _client_key(scope))
+            if not allowed:
+                scope["route"] = route  # so MetricsMiddleware labels the 429 with the template
+                RATE_LIMITED.labels(route.path, source).inc()
+                retry_after = max(1, math.ceil(limit.seconds / limit.requests))
+                response = JSONResponse({"detail": "Too many requests"}, status_code=429, headers={"Retry-After": str(retry_after)})
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
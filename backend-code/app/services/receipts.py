@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Iterable
+from sqlalchemy import Boolean, Uuid, and_, case, column, func, or_, select, update, values
+from sqlalchemy.dialects.postgresql import aggregate_order_by, array_agg
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.db.models import ConversationParticipant, Message
+from app.services.ws_registry import publish_to_conversation
+
+logger = logging.getLogger(__name__)
+
+# (conversation_id, reader user id) -> {"subject", "read": ids, "delivered": ids}, swapped out on each flush
+_pending: dict[tuple[uuid.UUID, uuid.UUID], dict[str, Any]] = {}
+
+receipt_metrics: dict[str, int] = {
+    "receipts": 0,
+    "flushes": 0,
+    "rows_updated": 0,
+}
+
+_flusher_task: asyncio.Task | None = None
+
+
+def record_receipts(conversation_id: uuid.UUID, reader_id: uuid.UUID, subject: str, message_ids: Iterable[uuid.UUID], status: str) -> None:
+    entry = _pending.setdefault((conversation_id, reader_id), {"subject": subject, "read": set(), "delivered": set()})
+    entry[status].update(message_ids)
+    receipt_metrics["receipts"] += 1
+
+
+def _requeue(batch: dict[tuple[uuid.UUID, uuid.UUID], dict[str, Any]]) -> None:
+    # put an unapplied batch back, merged with whatever was recorded while it was in flight
+    for key, entry in batch.items():
+        pending = _pending.setdefault(key, {"subject": entry["subject"], "read": set(), "delivered": set()})
+        pending["read"] |= entry["read"]
+        pending["delivered"] |= entry["delivered"]
+
+
+async def flush_receipts() -> int:
+    global _pending
+    batch, _pending = _pending, {}
+    if not batch:
+        return 0
+
+    # read overrides delivered; read also implies delivered for the high-water marks
+    rows = []
+    for (cid, uid), entry in batch.items():
+        rows.extend((cid, uid, mid, True) for mid in entry["read"])
+        rows.extend((cid, uid, mid, False) for mid in entry["delivered"] - entry["read"])
+    r = values(
+        column("cid", Uuid), column("uid", Uuid), column("mid", Uuid), column("is_read", Boolean), name="r"
+    ).data(rows)
+    # newest acknowledged message per (conversation, reader); unknown ids drop out in the join
+    m = (
+        select(
+            r.c.cid,
+            r.c.uid,
+            func.max(Message.created_at).filter(r.c.is_read).label("read_at"),
+            array_agg(aggregate_order_by(Message.id, Message.created_at.desc())).filter(r.c.is_read)[1].label("read_mid"),
+            func.max(Message.created_at).label("delivered_at"),
+        )
+        .select_from(r)
+        .join(Message, and_(Message.id == r.c.mid, Message.conversation_id == r.c.cid))
+        .group_by(r.c.cid, r.c.uid)
+        .subquery("m")
+    )
+    cp = ConversationParticipant
+    stmt = (
+        update(cp)
+        .where(cp.conversation_id == m.c.cid, cp.user_id == m.c.uid)
+        .values(
+            last_read_message_id=case(
+                (or_(cp.last_read_at.is_(None), m.c.read_at > cp.last_read_at), m.c.read_mid),
+                else_=cp.last_read_message_id,
+            ),
+            last_read_at=func.greatest(cp.last_read_at, m.c.read_at),
+            last_delivered_at=func.greatest(cp.last_delivered_at, m.c.read_at, m.c.delivered_at),
+        )
+        .returning(cp.conversation_id, cp.user_id, cp.last_read_at, cp.last_read_message_id, cp.last_delivered_at)
+    )
+    try:
+        async with AsyncSessionLocal() as db:
+            res = await db.execute(stmt)
+            updated = res.all()
+            await db.commit()
+    except BaseException:
+        _requeue(batch)  # retried on the next flush instead of being lost
+        raise
+
+    # one compact event per conversation carrying each reader's new marks
+    events: dict[uuid.UUID, dict[str, Any]] = {}
+    for cid, uid, read_at, read_mid, delivered_at in updated:
+        ev = events.setdefault(cid, {"type": "receipts", "conversation_id": str(cid), "readers": {}})
+        ev["readers"][batch[(cid, uid)]["subject"]] = {
+            "read_up_to": read_at.isoformat() if read_at else None,
+            "last_read_message_id": str(read_mid) if read_mid else None,
+            "delivered_up_to": delivered_at.isoformat() if delivered_at else None,
+        }
+    for cid, ev in events.items():
+        await publish_to_conversation(str(cid), ev)
+
+    receipt_metrics["flushes"] += 1
+    receipt_metrics["rows_updated"] += len(updated)
+    return len(updated)
+
+
+def derive_status(message: Any, marks: list[tuple[uuid.UUID, datetime | None, datetime | None]]) -> str:
+    # Status as seen by the sender: the slowest other participant's high-water mark wins
+    others = [(read_at, delivered_at) for uid, read_at, delivered_at in marks if uid != message.sender_user_id]
+    if not others or message.status == "read":
+        return message.status
+    if all(read_at and read_at >= message.created_at for read_at, _ in others):
+        return "read"
+    if all(
+        (delivered_at and delivered_at >= message.created_at) or (read_at and read_at >= message.created_at)
+        for read_at, delivered_at in others
+    ):
+        return "delivered"
+    return message.status
+
+
+async def _flush_loop() -> None:
+    while True:
+        await asyncio.sleep(settings.RECEIPT_FLUSH_INTERVAL_SECONDS)
+        try:
+            await flush_receipts()
+        except Exception:
+            logger.exception("receipt flush failed")
+
+
+def start_receipt_flusher() -> None:
+    global _flusher_task
+    if _flusher_task is None or _flusher_task.done():
+        _flusher_task = asyncio.create_task(_flush_loop())
+
+
+async def stop_receipt_flusher() -> None:
+    global _flusher_task
+    if _flusher_task is not None:
+        _flusher_task.cancel()
+        try:
+            await _flusher_task
+        except (asyncio.CancelledError, Exception):
+            pass
+        _flusher_task = None
+    try:
+        await flush_receipts()
+    except Exception:
+        logger.exception("final receipt flush failed")
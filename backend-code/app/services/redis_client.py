@@ -1,18 +1,43 @@
 import asyncio
-import json
-from typing import Any
+import time
+from typing import Any, Optional
 from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
 from app.core.config import settings
+from app.services.codec import dumps
+from app.services.metrics import REDIS_COMMAND_SECONDS
 
 redis: Redis | None = None
 
 
+class TimedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True) -> list[Any]:
+        started = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            REDIS_COMMAND_SECONDS.labels("MULTI" if self.is_transaction else "PIPELINE").observe(time.perf_counter() - started)
+
+
+class TimedRedis(Redis):
+    # Per-command latency for /metrics; scripts show up as EVALSHA
+    async def execute_command(self, *args: Any, **options: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            REDIS_COMMAND_SECONDS.labels(str(args[0]).upper()).observe(time.perf_counter() - started)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> Pipeline:
+        return TimedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
 def get_redis() -> Redis:
     global redis
     if redis is None:
-        redis = Redis.from_url(settings.REDIS_URL, decode_responses=True)
+        redis = TimedRedis.from_url(settings.REDIS_URL, decode_responses=True)
     return redis
 
 async def publish(channel: str, message: dict[str, Any]):
     r = get_redis()
-    await r.publish(channel, json.dumps(message))
+    await r.publish(channel, dumps(message))
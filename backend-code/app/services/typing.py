@@ -0,0 +1,52 @@
+import time
+from app.core.config import settings
+from app.services.codec import dumps
+from app.services.ratelimit import TokenBucket
+from app.services.redis_client import get_redis
+from app.services.ws_registry import ROUTE_LUA, members_key, publish_to_conversation
+
+# Refresh the typing key and route the event to the members' nodes only on a state transition,
+# in one round trip. A repeated typing=true inside the TTL just extends the key.
+# Returns 2 when the state changed but the member set was not cached yet.
+_TYPING_LUA = ROUTE_LUA + """
+if ARGV[1] == '1' then
+  local prev = redis.call('SET', KEYS[1], '1', 'EX', ARGV[2], 'GET')
+  if prev then return 0 end
+elseif redis.call('DEL', KEYS[1]) == 0 then
+  return 0
+end
+if route(KEYS[2], ARGV[3], ARGV[4]) < 0 then return 2 end
+return 1
+"""
+_typing_script = None
+
+typing_limiter = TokenBucket(rate=settings.TYPING_RATE_PER_SECOND, burst=settings.TYPING_BURST)
+
+typing_metrics: dict[str, int] = {
+    "calls": 0,
+    "broadcasts": 0,
+    "throttled": 0,
+}
+
+
+async def set_typing_state(conversation_id: str, subject: str, typing: bool) -> bool:
+    # Returns True when the state changed and an event was broadcast
+    global _typing_script
+    if _typing_script is None:
+        _typing_script = get_redis().register_script(_TYPING_LUA)
+    typing_metrics["calls"] += 1
+    event = {
+        "conversation_id": conversation_id,
+        "user": subject,
+        "typing": typing,
+        "ttl": settings.TYPING_TTL_SECONDS,  # clients clear the indicator if no stop event arrives
+    }
+    changed = await _typing_script(
+        keys=[f"typing:{conversation_id}:{subject}", members_key(conversation_id)],
+        args=["1" if typing else "0", settings.TYPING_TTL_SECONDS, time.time(), dumps(event)],
+    )
+    if changed == 2:
+        await publish_to_conversation(conversation_id, event)
+    if changed:
+        typing_metrics["broadcasts"] += 1
+    return bool(changed)
@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import random
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.db.models import User
+from app.services.codec import dumps, loads
+from app.services.redis_client import get_redis, publish
+
+logger = logging.getLogger(__name__)
+
+INVALIDATE_CHANNEL = "events:user_invalidate"
+_MISSING = "null"  # cached negative lookup (no such user)
+
+# Write loaded rows back only if the email's generation is unchanged since it was read, so an
+# invalidate_user() that lands while the DB load is in flight wins over the (possibly stale) row.
+# KEYS: cache key, generation key per email; ARGV: ttl, then generation read ("" if none) and value
+_FILL_LUA = """
+local filled = {}
+for i = 1, #KEYS, 2 do
+    local n = (i + 1) / 2
+    if (redis.call('GET', KEYS[i + 1]) or '') == ARGV[2 * n] then
+        redis.call('SETEX', KEYS[i], ARGV[1], ARGV[2 * n + 1])
+        filled[n] = 1
+    else
+        filled[n] = 0
+    end
+end
+return filled
+"""
+_fill_script = None
+
+# email -> (expires_at, user dict or None)
+_local: OrderedDict[str, tuple[float, dict[str, Any] | None]] = OrderedDict()
+
+user_cache_metrics: dict[str, int] = {
+    "local_hits": 0,
+    "redis_hits": 0,
+    "misses": 0,
+    "invalidations": 0,
+}
+
+_listener_task: asyncio.Task | None = None
+
+
+def user_cache_stats() -> dict[str, int]:
+    return {**user_cache_metrics, "local_entries": len(_local)}
+
+
+def _redis_key(email: str) -> str:
+    return f"user:email:{email}"
+
+
+def _gen_key(email: str) -> str:
+    return f"user:gen:{email}"
+
+
+def _to_dict(user: User) -> dict[str, Any]:
+    return {
+        "id": str(user.id),
+        "email": user.email,
+        "display_name": user.display_name,
+        "avatar_url": user.avatar_url,
+        "provider": user.provider,
+    }
+
+
+def _local_get(email: str) -> tuple[bool, dict[str, Any] | None]:
+    entry = _local.get(email)
+    if entry is None:
+        return False, None
+    expires_at, value = entry
+    if expires_at <= time.monotonic():
+        del _local[email]
+        return False, None
+    _local.move_to_end(email)
+    return True, value
+
+
+def _local_put(email: str, value: dict[str, Any] | None) -> None:
+    _local[email] = (time.monotonic() + settings.USER_CACHE_LOCAL_TTL_SECONDS, value)
+    _local.move_to_end(email)
+    while len(_local) > settings.USER_CACHE_LOCAL_SIZE:
+        _local.popitem(last=False)
+
+
+async def get_users_by_email(db: AsyncSession, emails: list[str]) -> dict[str, dict[str, Any] | None]:
+    # Local LRU, then one Redis MGET, then one IN query for whatever is left
+    global _fill_script
+    found: dict[str, dict[str, Any] | None] = {}
+    pending: list[str] = []
+    for email in dict.fromkeys(emails):
+        hit, value = _local_get(email)
+        if hit:
+            user_cache_metrics["local_hits"] += 1
+            found[email] = value
+        else:
+            pending.append(email)
+    if not pending:
+        return found
+
+    r = get_redis()
+    raw_values = await r.mget([_redis_key(e) for e in pending] + [_gen_key(e) for e in pending])
+    cached, gens = raw_values[: len(pending)], dict(zip(pending, raw_values[len(pending) :]))
+    missing: list[str] = []
+    for email, raw in zip(pending, cached):
+        if raw is None:
+            missing.append(email)
+            continue
+        user_cache_metrics["redis_hits"] += 1
+        value = None if raw == _MISSING else loads(raw)
+        _local_put(email, value)
+        found[email] = value
+    if not missing:
+        return found
+
+    user_cache_metrics["misses"] += len(missing)
+    res = await db.execute(select(User).where(User.email.in_(missing)))
+    loaded = {u.email: _to_dict(u) for u in res.scalars().all()}
+    keys: list[str] = []
+    args: list[Any] = [settings.USER_CACHE_REDIS_TTL_SECONDS]
+    for email in missing:
+        value = loaded.get(email)
+        found[email] = value
+        keys += [_redis_key(email), _gen_key(email)]
+        args += [gens[email] or "", dumps(value) if value else _MISSING]
+    if _fill_script is None:
+        _fill_script = r.register_script(_FILL_LUA)
+    filled = await _fill_script(keys=keys, args=args)
+    for email, ok in zip(missing, filled):
+        if ok:
+            _local_put(email, found[email])
+    return found
+
+
+async def get_user_by_email(db: AsyncSession, email: str) -> dict[str, Any] | None:
+    return (await get_users_by_email(db, [email]))[email]
+
+
+async def get_user_ids(db: AsyncSession, emails: list[str]) -> dict[str, uuid.UUID]:
+    users = await get_users_by_email(db, emails)
+    return {email: uuid.UUID(u["id"]) for email, u in users.items() if u}
+
+
+async def invalidate_user(email: str) -> None:
+    _local.pop(email, None)
+    # bumping the generation stops a lookup already reading the old row from caching it again
+    pipe = get_redis().pipeline(transaction=True)
+    pipe.incr(_gen_key(email))
+    pipe.expire(_gen_key(email), settings.USER_CACHE_REDIS_TTL_SECONDS)
+    pipe.delete(_redis_key(email))
+    await pipe.execute()
+    # drop the entry from every other worker's local layer too
+    await publish(INVALIDATE_CHANNEL, {"email": email})
+
+
+async def _listen() -> None:
+    # Resubscribes with capped exponential backoff whenever the Redis connection drops. Invalidations
+    # published in the gap are lost, so the local layer is emptied once the subscription is back.
+    backoff = 0.5
+    lost = False
+    while True:
+        pubsub = get_redis().pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATE_CHANNEL)
+            if lost:
+                _local.clear()
+                lost = False
+            backoff = 0.5
+            async for msg in pubsub.listen():
+                if msg is None or msg.get("type") != "message":
+                    continue
+                try:
+                    email = loads(msg.get("data")).get("email")
+                except Exception:
+                    continue
+                if email:
+                    _local.pop(email, None)
+                    user_cache_metrics["invalidations"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("user invalidation subscription lost; resubscribing in %.1fs", backoff)
+        finally:
+            try:
+                await pubsub.unsubscribe()
+                await pubsub.aclose()
+            except Exception:
+                pass
+        lost = True
+        await asyncio.sleep(backoff + random.random() * backoff / 2)
+        backoff = min(backoff * 2, 30.0)
+
+
+def start_user_cache_listener() -> None:
+    global _listener_task
+    if _listener_task is None or _listener_task.done():
+        _listener_task = asyncio.create_task(_listen())
+
+
+async def stop_user_cache_listener() -> None:
+    global _listener_task
+    if _listener_task is not None:
+        _listener_task.cancel()
+        try:
+            await _listener_task
+        except (asyncio.CancelledError, Exception):
+            pass
+        _listener_task = None
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Any, Callable, Iterable
+from sqlalchemy import func, select
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.db.models import ConversationParticipant, User
+from app.services.codec import dumps
+from app.services.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Identifies this worker process in the cluster-wide connection registry
+NODE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+NODE_CHANNEL_PREFIX = "ws:node:"
+
+# ws:user:{email}    zset node_id -> lease expiry (epoch seconds), refreshed by each hosting node
+# conv:members:{cid} set of participant emails, cached from conversation_participants
+USER_NODES_PREFIX = "ws:user:"
+MEMBERS_PREFIX = "conv:members:"
+
+# Lua helper shared by every conversation-scoped publisher: publish `payload` once to each node
+# holding a live lease for any member. Returns the node count, or -1 when the member set is not
+# cached (the caller loads it and retries). Keys are derived inside the script, so this assumes a
+# single Redis instance rather than Redis Cluster.
+ROUTE_LUA = """
+local function route(members_key, now, payload)
+  if redis.call('EXISTS', members_key) == 0 then return -1 end
+  local seen = {}
+  local count = 0
+  for _, email in ipairs(redis.call('SMEMBERS', members_key)) do
+    for _, node in ipairs(redis.call('ZRANGEBYSCORE', 'ws:user:' .. email, now, '+inf')) do
+      if not seen[node] then
+        seen[node] = true
+        count = count + 1
+        redis.call('PUBLISH', 'ws:node:' .. node, payload)
+      end
+    end
+  end
+  return count
+end
+"""
+
+_route_script = None
+_heartbeat_task: asyncio.Task | None = None
+
+registry_metrics: dict[str, int] = {
+    "routed_events": 0,
+    "node_publishes": 0,
+    "member_loads": 0,
+}
+
+
+def node_channel(node_id: str = NODE_ID) -> str:
+    return f"{NODE_CHANNEL_PREFIX}{node_id}"
+
+
+def members_key(conversation_id: str) -> str:
+    return f"{MEMBERS_PREFIX}{conversation_id}"
+
+
+async def set_members(conversation_id: str, emails: Iterable[str]) -> None:
+    # "" keeps the key present for conversations without members, so lookups are never repeated
+    pipe = get_redis().pipeline(transaction=True)
+    key = members_key(conversation_id)
+    pipe.delete(key)
+    pipe.sadd(key, "", *emails)
+    pipe.expire(key, settings.CONV_MEMBERS_TTL_SECONDS)
+    await pipe.execute()
+
+
+async def load_members(conversation_id: str) -> None:
+    registry_metrics["member_loads"] += 1
+    async with AsyncSessionLocal() as db:
+        res = await db.execute(
+            select(func.coalesce(User.email, ConversationParticipant.external_email))
+            .select_from(ConversationParticipant)
+            .outerjoin(User, User.id == ConversationParticipant.user_id)
+            .where(ConversationParticipant.conversation_id == uuid.UUID(conversation_id))
+        )
+        emails = [e for e in res.scalars().all() if e]
+    await set_members(conversation_id, emails)
+
+
+async def publish_to_conversation(conversation_id: str, data: dict[str, Any]) -> int:
+    # Deliver to the nodes hosting the conversation's connected members, not to every node
+    global _route_script
+    if _route_script is None:
+        _route_script = get_redis().register_script(ROUTE_LUA + "return route(KEYS[1], ARGV[1], ARGV[2])")
+    payload = dumps(data)
+    for _ in range(2):
+        nodes = await _route_script(keys=[members_key(conversation_id)], args=[time.time(), payload])
+        if nodes >= 0:
+            registry_metrics["routed_events"] += 1
+            registry_metrics["node_publishes"] += nodes
+            return nodes
+        await load_members(conversation_id)
+    return 0
+
+
+async def lease_users(subjects: Iterable[str]) -> None:
+    expires = time.time() + settings.WS_LEASE_SECONDS
+    pipe = get_redis().pipeline(transaction=False)
+    for subject in subjects:
+        key = f"{USER_NODES_PREFIX}{subject}"
+        pipe.zadd(key, {NODE_ID: expires})
+        # trim leases left behind by nodes that died without releasing them
+        pipe.zremrangebyscore(key, "-inf", time.time())
+        pipe.expire(key, settings.WS_LEASE_SECONDS * 2)
+    await pipe.execute()
+
+
+async def release_user(subject: str) -> None:
+    await get_redis().zrem(f"{USER_NODES_PREFIX}{subject}", NODE_ID)
+
+
+async def _heartbeat_loop(local_subjects: Callable[[], Iterable[str]]) -> None:
+    while True:
+        await asyncio.sleep(settings.WS_LEASE_SECONDS / 3)
+        try:
+            subjects = list(local_subjects())
+            if subjects:
+                await lease_users(subjects)
+            await get_redis().publish(node_channel(), dumps({"type": "probe", "sent_at": time.time()}))
+        except Exception:
+            logger.exception("ws registry heartbeat failed")
+
+
+def start_registry_heartbeat(local_subjects: Callable[[], Iterable[str]]) -> None:
+    global _heartbeat_task
+    if _heartbeat_task is None or _heartbeat_task.done():
+        _heartbeat_task = asyncio.create_task(_heartbeat_loop(local_subjects))
+
+
+async def stop_registry_heartbeat(local_subjects: Callable[[], Iterable[str]]) -> None:
+    global _heartbeat_task
+    if _heartbeat_task is not None:
+        _heartbeat_task.cancel()
+        try:
+            await _heartbeat_task
+        except (asyncio.CancelledError, Exception):
+            pass
+        _heartbeat_task = None
+    # give up this node's leases so publishers stop targeting it immediately
+    for subject in list(local_subjects()):
+        try:
+            await release_user(subject)
+        except Exception:
+            pass
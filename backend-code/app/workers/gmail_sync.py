@@ -0,0 +1,140 @@
+"""Gmail sync worker.
+
+    python -m app.workers.gmail_sync [--recover | --fake]
+
+Runs both directions of the Gmail sync against the real API (HttpGmailClient), or with --fake
+against an in-memory FakeGmailClient (for local runs without Google credentials):
+- Inbound: claims accounts that are due from gmail:sync:schedule, up to GMAIL_SYNC_CONCURRENCY
+  at a time, and pulls their history incrementally.
+- Outbound: drains jobs:gmail:send with GMAIL_SEND_WORKERS concurrent sends and promotes
+  delayed retries.
+
+Any number of workers can share one Redis. Accounts are leased while they sync, and sends are
+capped per account by GMAIL_SEND_CONCURRENCY_PER_ACCOUNT. --recover requeues send jobs left in
+the processing list by a crashed worker. Only run it while no other worker is alive.
+"""
+import asyncio
+import json
+import logging
+import random
+import sys
+import uuid
+from sqlalchemy import select
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.db.models import GmailAccount
+from app.services.gmail_client import GmailClient, GmailRateLimited, HttpGmailClient
+from app.services.gmail_sync import (
+    GMAIL_STATS,
+    SEND_PROCESSING,
+    SEND_QUEUE,
+    claim_due_accounts,
+    promote_delayed,
+    record_sync_error,
+    schedule_account,
+    send_one,
+    sync_account,
+)
+from app.services.redis_client import get_redis
+
+logger = logging.getLogger("app.workers.gmail_sync")
+
+
+async def _seed_schedule() -> None:
+    # accounts linked while no worker was running; NX keeps existing due times
+    async with AsyncSessionLocal() as db:
+        ids = (await db.execute(select(GmailAccount.id))).scalars().all()
+    for account_id in ids:
+        await schedule_account(account_id, delay=random.random() * settings.GMAIL_SYNC_INTERVAL_SECONDS, only_new=True)
+
+
+async def _sync_one(client: GmailClient, account_id: uuid.UUID) -> None:
+    interval = settings.GMAIL_SYNC_INTERVAL_SECONDS
+    try:
+        await sync_account(client, account_id)
+        await get_redis().hincrby(GMAIL_STATS, "synced_accounts", 1)
+        next_in = interval
+    except GmailRateLimited as e:
+        next_in = e.retry_after + random.random() * 5
+    except Exception as e:
+        logger.exception("gmail sync failed for account %s", account_id)
+        await record_sync_error(account_id, str(e) or type(e).__name__)
+        next_in = interval * 5
+    # jitter spreads thousands of accounts evenly instead of polling in waves
+    await schedule_account(account_id, delay=next_in * random.uniform(0.8, 1.2))
+
+
+async def sync_loop(client: GmailClient) -> None:
+    tasks: set[asyncio.Task] = set()
+    while True:
+        free = settings.GMAIL_SYNC_CONCURRENCY - len(tasks)
+        due = await claim_due_accounts(free) if free > 0 else []
+        if not due:
+            await asyncio.sleep(1.0)
+            continue
+        for account_id in due:
+            task = asyncio.create_task(_sync_one(client, account_id))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+
+async def _send(client: GmailClient, raw: str) -> None:
+    try:
+        outcome = await send_one(client, json.loads(raw))
+        logger.debug("gmail send job %s: %s", raw, outcome)
+    except Exception:
+        # DB/Redis trouble: leave the job for --recover rather than losing it
+        logger.exception("gmail send job crashed: %s", raw)
+        return
+    await get_redis().lrem(SEND_PROCESSING, 1, raw)
+
+
+async def send_loop(client: GmailClient) -> None:
+    r = get_redis()
+    slots = asyncio.Semaphore(settings.GMAIL_SEND_WORKERS)
+    tasks: set[asyncio.Task] = set()
+    while True:
+        await slots.acquire()
+        raw = await r.blmove(SEND_QUEUE, SEND_PROCESSING, 5, "RIGHT", "LEFT")
+        if raw is None:
+            slots.release()
+            continue
+        task = asyncio.create_task(_send(client, raw))
+        tasks.add(task)
+        task.add_done_callback(lambda t: (tasks.discard(t), slots.release()))
+
+
+async def promote_loop() -> None:
+    while True:
+        try:
+            await promote_delayed()
+        except Exception:
+            logger.exception("promoting delayed gmail sends failed")
+        await asyncio.sleep(1.0)
+
+
+async def run(client: GmailClient | None = None) -> None:
+    client = client or HttpGmailClient()
+    await _seed_schedule()
+    logger.info("gmail sync worker started")
+    await asyncio.gather(sync_loop(client), send_loop(client), promote_loop())
+
+
+async def recover() -> int:
+    r = get_redis()
+    moved = 0
+    while await r.lmove(SEND_PROCESSING, SEND_QUEUE, "RIGHT", "LEFT") is not None:
+        moved += 1
+    return moved
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    if "--recover" in sys.argv:
+        print(f"requeued {asyncio.run(recover())} jobs")
+    elif "--fake" in sys.argv:
+        from app.services.gmail_fake import FakeGmailClient
+
+        asyncio.run(run(FakeGmailClient(units_per_second=settings.GMAIL_QUOTA_UNITS_PER_SECOND)))
+    else:
+        asyncio.run(run())
@@ -0,0 +1,245 @@
+"""Bulk NDJSON ingestion for mailbox backfills.
+
+    python -m app.workers.ingest [FILE ...] [--mailbox EMAIL] [--chunk N]
+
+Reads one message per line from each FILE (plain or .gz; '-' or nothing for stdin). A line is either a
+users.messages.get?format=full resource as returned by the Gmail API, or a flat record:
+
+    {"gmail_message_id", "gmail_thread_id", "mailbox", "from", "to": [...], "cc": [...], "subject",
+     "body_text", "body_html", "internal_date" (epoch ms) | "date" (ISO 8601), "label_ids": [...]}
+
+`mailbox` (or --mailbox) is the account the dump came from: its own mail is stored as outbound and it
+joins every conversation created here. Input is streamed in chunks of INGEST_CHUNK_SIZE records, so
+memory stays at one chunk however large the dump is. Each chunk is COPYed into a temp staging table and
+moved in one transaction by set-based statements: unseen threads become conversations (ON CONFLICT on
+gmail_thread_id) with their participants, messages are inserted ON CONFLICT DO NOTHING (gmail_message_id
+is unique, so reruns and overlap with the sync worker are skipped) and last_message_* is advanced.
+No WebSocket events are emitted; clients see backfilled history through the REST endpoints.
+Progress and rows/s are logged after every chunk.
+"""
+import argparse
+import asyncio
+import email.utils
+import gzip
+import json
+import logging
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import IO, Any, Iterator
+from app.core.config import settings
+from app.db.session import engine
+from app.services.gmail_client import GmailMessage, parse_message
+from app.services.gmail_sync import SKIP_LABELS
+
+logger = logging.getLogger("app.workers.ingest")
+
+STAGE_TABLE = "ingest_stage"
+_STAGE_COLUMNS = [
+    "gmail_message_id", "gmail_thread_id", "mailbox", "from_email", "recipients",
+    "subject", "body_text", "body_html", "direction", "created_at",
+]
+_STAGE_DDL = f"""
+CREATE TEMP TABLE IF NOT EXISTS {STAGE_TABLE} (
+    gmail_message_id varchar(128) NOT NULL,
+    gmail_thread_id varchar(128) NOT NULL,
+    mailbox varchar(320),
+    from_email varchar(320),
+    recipients varchar(320)[] NOT NULL,
+    subject text,
+    body_text text,
+    body_html text,
+    direction varchar(10) NOT NULL,
+    created_at timestamp NOT NULL
+) ON COMMIT DELETE ROWS
+"""
+# New threads -> conversations; participants (mailbox, sender, recipients) only for the ones created here
+_CONVERSATIONS_SQL = f"""
+WITH first AS (
+    SELECT DISTINCT ON (gmail_thread_id) gmail_thread_id, mailbox, from_email, recipients, subject, created_at
+    FROM {STAGE_TABLE}
+    ORDER BY gmail_thread_id, created_at
+), created AS (
+    INSERT INTO conversations (id, subject, gmail_thread_id, created_at, last_message_at)
+    SELECT gen_random_uuid(), left(subject, 255), gmail_thread_id, created_at, NULL FROM first
+    ON CONFLICT (gmail_thread_id) DO NOTHING
+    RETURNING id, gmail_thread_id
+), members AS (
+    SELECT DISTINCT c.id AS conversation_id, e.email
+    FROM created c
+    JOIN first f USING (gmail_thread_id)
+    CROSS JOIN LATERAL unnest(ARRAY[f.mailbox, f.from_email] || f.recipients) AS e(email)
+    WHERE e.email IS NOT NULL
+), participants AS (
+    INSERT INTO conversation_participants (id, conversation_id, user_id, external_email)
+    SELECT gen_random_uuid(), m.conversation_id, u.id, CASE WHEN u.id IS NULL THEN m.email END
+    FROM members m
+    LEFT JOIN users u ON u.email = m.email
+)
+SELECT count(*) FROM created
+"""
+_MESSAGES_SQL = f"""
+WITH inserted AS (
+    INSERT INTO messages (
+        id, conversation_id, sender_user_id, external_from_email, body_text, body_html,
+        direction, gmail_message_id, status, created_at
+    )
+    SELECT gen_random_uuid(), c.id, u.id, CASE WHEN u.id IS NULL THEN s.from_email END, s.body_text, s.body_html,
+           s.direction, s.gmail_message_id, CASE WHEN s.direction = 'outbound' THEN 'sent' ELSE 'delivered' END, s.created_at
+    FROM {STAGE_TABLE} s
+    JOIN conversations c ON c.gmail_thread_id = s.gmail_thread_id
+    LEFT JOIN users u ON u.email = s.from_email
+    ON CONFLICT DO NOTHING
+    RETURNING id, conversation_id, created_at
+), newest AS (
+    SELECT DISTINCT ON (conversation_id) conversation_id, id, created_at
+    FROM inserted
+    ORDER BY conversation_id, created_at DESC
+), bumped AS (
+    UPDATE conversations c SET last_message_at = n.created_at, last_message_id = n.id
+    FROM newest n
+    WHERE c.id = n.conversation_id AND (c.last_message_at IS NULL OR c.last_message_at < n.created_at)
+)
+SELECT count(*) FROM inserted
+"""
+
+
+@dataclass
+class IngestStats:
+    lines: int = 0
+    skipped: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    conversations: int = 0
+    started: float = 0.0
+
+    def rate(self) -> float:
+        return self.lines / max(time.perf_counter() - self.started, 1e-9)
+
+    def summary(self) -> str:
+        return (
+            f"{self.lines} rows ({self.inserted} new, {self.duplicates} duplicate, {self.skipped} skipped), "
+            f"{self.conversations} new conversations, {self.rate():.0f} rows/s"
+        )
+
+
+def _addr(value: str | None) -> str | None:
+    return email.utils.parseaddr(value or "")[1].lower() or None
+
+
+def _timestamp(raw: dict[str, Any]) -> datetime:
+    if raw.get("internal_date") is not None:
+        return datetime.fromtimestamp(int(raw["internal_date"]) / 1000, tz=timezone.utc).replace(tzinfo=None)
+    ts = datetime.fromisoformat(raw["date"])
+    return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts
+
+
+def _flat_message(raw: dict[str, Any]) -> GmailMessage:
+    recipients = [a for v in [*(raw.get("to") or []), *(raw.get("cc") or [])] if (a := _addr(v))]
+    return GmailMessage(
+        id=str(raw["gmail_message_id"]),
+        thread_id=str(raw["gmail_thread_id"]),
+        internal_date=_timestamp(raw),
+        from_email=_addr(raw.get("from")),
+        recipients=recipients,
+        subject=raw.get("subject"),
+        body_text=raw.get("body_text"),
+        body_html=raw.get("body_html"),
+        label_ids=list(raw.get("label_ids") or []),
+    )
+
+
+def _stage_row(line: bytes, default_mailbox: str | None) -> tuple | None:
+    raw = json.loads(line)
+    m = parse_message(raw) if "payload" in raw else _flat_message(raw)
+    if SKIP_LABELS.intersection(m.label_ids):
+        return None
+    mailbox = _addr(raw.get("mailbox")) or default_mailbox
+    outbound = mailbox is not None and m.from_email == mailbox
+    return (
+        m.id, m.thread_id, mailbox, m.from_email, list(dict.fromkeys(m.recipients)),
+        m.subject, m.body_text, m.body_html, "outbound" if outbound else "inbound", m.internal_date,
+    )
+
+
+def _chunks(files: list[IO[bytes]], mailbox: str | None, size: int, stats: IngestStats) -> Iterator[list[tuple]]:
+    # gmail_message_id -> row; also drops duplicates inside a chunk before they reach the database
+    chunk: dict[str, tuple] = {}
+    for fh in files:
+        for lineno, line in enumerate(fh, 1):
+            if not line.strip():
+                continue
+            stats.lines += 1
+            try:
+                row = _stage_row(line, mailbox)
+            except (ValueError, KeyError, TypeError) as e:
+                stats.skipped += 1
+                if stats.skipped <= 10:
+                    logger.warning("%s:%d skipped: %r", getattr(fh, "name", "-"), lineno, e)
+                continue
+            if row is None:
+                stats.skipped += 1
+                continue
+            if row[0] in chunk:
+                stats.duplicates += 1
+                continue
+            chunk[row[0]] = row
+            if len(chunk) >= size:
+                yield list(chunk.values())
+                chunk = {}
+    if chunk:
+        yield list(chunk.values())
+
+
+async def _ingest_chunk(conn: Any, rows: list[tuple]) -> tuple[int, int]:
+    async with conn.transaction():
+        await conn.execute(f"SET LOCAL statement_timeout = {int(settings.INGEST_STATEMENT_TIMEOUT_MS)}")
+        await conn.copy_records_to_table(STAGE_TABLE, records=rows, columns=_STAGE_COLUMNS)
+        # temp tables are never auto-analyzed; real row counts keep the joins on hash/index plans
+        await conn.execute(f"ANALYZE {STAGE_TABLE}")
+        created = await conn.fetchval(_CONVERSATIONS_SQL)
+        inserted = await conn.fetchval(_MESSAGES_SQL)
+    return created, inserted
+
+
+async def ingest(files: list[IO[bytes]], mailbox: str | None = None, chunk_size: int | None = None) -> IngestStats:
+    stats = IngestStats(started=time.perf_counter())
+    size = chunk_size or settings.INGEST_CHUNK_SIZE
+    async with engine.connect() as sa_conn:
+        # COPY needs the asyncpg connection itself; SQLAlchemy only lends it from the pool
+        conn = (await sa_conn.get_raw_connection()).driver_connection
+        await conn.execute(_STAGE_DDL)
+        try:
+            for rows in _chunks(files, mailbox, size, stats):
+                created, inserted = await _ingest_chunk(conn, rows)
+                stats.conversations += created
+                stats.inserted += inserted
+                stats.duplicates += len(rows) - inserted
+                logger.info("ingested %s", stats.summary())
+        finally:
+            await conn.execute(f"DROP TABLE IF EXISTS {STAGE_TABLE}")
+    return stats
+
+
+def _open(path: str) -> IO[bytes]:
+    if path == "-":
+        return sys.stdin.buffer
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    parser = argparse.ArgumentParser(prog="python -m app.workers.ingest", description="Bulk-load NDJSON mail into MailChat")
+    parser.add_argument("files", nargs="*", default=["-"])
+    parser.add_argument("--mailbox", help="account the dump belongs to (overridden by a record's own 'mailbox')")
+    parser.add_argument("--chunk", type=int, help=f"records per transaction (default INGEST_CHUNK_SIZE={settings.INGEST_CHUNK_SIZE})")
+    args = parser.parse_args()
+    handles = [_open(p) for p in args.files]
+    try:
+        result = asyncio.run(ingest(handles, _addr(args.mailbox), args.chunk))
+    finally:
+        for fh in handles:
+            if fh is not sys.stdin.buffer:
+                fh.close()
+    print(result.summary())
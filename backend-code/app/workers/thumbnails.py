@@ -0,0 +1,201 @@
+"""Thumbnail / poster-frame worker.
+
+    python -m app.workers.thumbnails [--recover]
+
+Pulls jobs from the Redis queue filled by send_message, renders in a process pool,
+uploads the result next to the original in MINIO_BUCKET, records Attachment.thumbnail_url
+and announces it to the conversation's connected members. Failed jobs wait in a delayed zset with
+exponential backoff before they are retried; images over THUMBNAIL_MAX_SOURCE_BYTES or
+THUMBNAIL_MAX_IMAGE_PIXELS are skipped. --recover requeues jobs left in the processing list by a crashed
+worker (only run it while no other worker is alive).
+"""
+import asyncio
+import io
+import json
+import logging
+import random
+import shutil
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from typing import Any
+from sqlalchemy import update
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.db.models import Attachment
+from app.services.attachments import (
+    THUMBNAIL_DELAYED,
+    THUMBNAIL_PREFIX,
+    THUMBNAIL_PROCESSING,
+    THUMBNAIL_QUEUE,
+    THUMBNAIL_STATS,
+)
+from app.services.minio_client import get_minio
+from app.services.redis_client import get_redis
+from app.services.ws_registry import publish_to_conversation
+
+logger = logging.getLogger("app.workers.thumbnails")
+
+_PROMOTE_LUA = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, 500)
+for _, job in ipairs(due) do
+  redis.call('ZREM', KEYS[1], job)
+  redis.call('LPUSH', KEYS[2], job)
+end
+return #due
+"""
+
+
+class Unthumbnailable(Exception):
+    # the source itself is refused (too large, too many pixels); retrying cannot help
+    pass
+
+
+def _image_thumbnail(object_key: str) -> bytes:
+    from PIL import Image
+
+    Image.MAX_IMAGE_PIXELS = settings.THUMBNAIL_MAX_IMAGE_PIXELS
+    limit = settings.THUMBNAIL_MAX_SOURCE_BYTES
+    client = get_minio()
+    if client.stat_object(settings.MINIO_BUCKET, object_key).size > limit:
+        raise Unthumbnailable(f"larger than {limit} bytes")
+    resp = client.get_object(settings.MINIO_BUCKET, object_key)
+    try:
+        data = resp.read(limit + 1)  # bounded even if the object was replaced after the stat
+    finally:
+        resp.close()
+        resp.release_conn()
+    if len(data) > limit:
+        raise Unthumbnailable(f"larger than {limit} bytes")
+    size = (settings.THUMBNAIL_MAX_PX, settings.THUMBNAIL_MAX_PX)
+    try:
+        img = Image.open(io.BytesIO(data))
+    except Image.DecompressionBombError as e:
+        raise Unthumbnailable(str(e))
+    with img:
+        # open() only reads the header; refuse before anything is decoded
+        if img.width * img.height > settings.THUMBNAIL_MAX_IMAGE_PIXELS:
+            raise Unthumbnailable(f"{img.width}x{img.height} exceeds THUMBNAIL_MAX_IMAGE_PIXELS")
+        img.draft("RGB", size)  # JPEG: decode at reduced scale
+        img.thumbnail(size)
+        out = io.BytesIO()
+        img.convert("RGB").save(out, format="JPEG", quality=80, optimize=True)
+    return out.getvalue()
+
+
+def _video_poster(object_key: str) -> bytes:
+    if shutil.which("ffmpeg") is None:
+        raise RuntimeError("ffmpeg not installed")
+    # ffmpeg seeks over HTTP range requests, so the video is never downloaded in full
+    url = get_minio().presigned_get_object(settings.MINIO_BUCKET, object_key, expires=timedelta(minutes=10))
+    scale = f"scale='min({settings.THUMBNAIL_MAX_PX},iw)':-2"
+    for offset in ("1", "0"):  # fall back to the first frame for sub-second clips
+        proc = subprocess.run(
+            ["ffmpeg", "-loglevel", "error", "-ss", offset, "-i", url, "-frames:v", "1",
+             "-vf", scale, "-f", "image2", "-c:v", "mjpeg", "pipe:1"],
+            capture_output=True,
+            timeout=60,
+        )
+        if proc.returncode == 0 and proc.stdout:
+            return proc.stdout
+    raise RuntimeError(f"ffmpeg failed: {proc.stderr[-200:]!r}")
+
+
+def render_thumbnail(job: dict[str, Any]) -> str:
+    # Runs in a pool process: fetch, render, upload; returns the thumbnail object key
+    data = _video_poster(job["object_key"]) if job["type"] == "video" else _image_thumbnail(job["object_key"])
+    key = f"{THUMBNAIL_PREFIX}{job['attachment_id']}.jpg"
+    get_minio().put_object(settings.MINIO_BUCKET, key, io.BytesIO(data), len(data), content_type="image/jpeg")
+    return key
+
+
+async def _finish(job: dict[str, Any], key: str) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(Attachment)
+            .where(Attachment.id == uuid.UUID(job["attachment_id"]))
+            .values(thumbnail_url=key)
+        )
+        await db.commit()
+    await publish_to_conversation(job["conversation_id"], {
+        "type": "attachment.thumbnail",
+        "conversation_id": job["conversation_id"],
+        "message_id": job["message_id"],
+        "attachment_id": job["attachment_id"],
+        "thumbnail_url": key,
+    })
+
+
+async def _handle(pool: ProcessPoolExecutor, raw: str) -> None:
+    r = get_redis()
+    job = json.loads(raw)
+    started = time.monotonic()
+    try:
+        key = await asyncio.get_running_loop().run_in_executor(pool, render_thumbnail, job)
+        await _finish(job, key)
+        await r.hincrby(THUMBNAIL_STATS, "processed", 1)
+        await r.hincrby(THUMBNAIL_STATS, "total_ms", int((time.monotonic() - started) * 1000))
+        logger.info("thumbnail %s ready in %.0fms (queued %.1fs)", job["attachment_id"],
+                    (time.monotonic() - started) * 1000, time.time() - job.get("enqueued_at", time.time()))
+    except Unthumbnailable as e:
+        await r.hincrby(THUMBNAIL_STATS, "skipped", 1)
+        logger.warning("thumbnail %s skipped: %s", job.get("attachment_id"), e)
+    except Exception:
+        job["attempt"] = job.get("attempt", 0) + 1
+        if job["attempt"] < settings.THUMBNAIL_MAX_ATTEMPTS:
+            delay = settings.THUMBNAIL_RETRY_BASE_SECONDS * 2 ** (job["attempt"] - 1) * (1 + random.random() / 4)
+            await r.zadd(THUMBNAIL_DELAYED, {json.dumps(job): time.time() + delay})
+            await r.hincrby(THUMBNAIL_STATS, "retried", 1)
+        else:
+            await r.hincrby(THUMBNAIL_STATS, "failed", 1)
+        logger.exception("thumbnail %s failed (attempt %d)", job.get("attachment_id"), job["attempt"])
+    finally:
+        await r.lrem(THUMBNAIL_PROCESSING, 1, raw)
+
+
+async def promote_loop() -> None:
+    # due retries go back on the queue; the script keeps concurrent workers from moving a job twice
+    promote = get_redis().register_script(_PROMOTE_LUA)
+    while True:
+        try:
+            await promote(keys=[THUMBNAIL_DELAYED, THUMBNAIL_QUEUE], args=[time.time()])
+        except Exception:
+            logger.exception("promoting delayed thumbnail jobs failed")
+        await asyncio.sleep(1.0)
+
+
+async def run() -> None:
+    r = get_redis()
+    slots = asyncio.Semaphore(settings.THUMBNAIL_PROCESSES)
+    tasks: set[asyncio.Task] = set()
+    promoter = asyncio.create_task(promote_loop())  # referenced for the life of run()
+    with ProcessPoolExecutor(max_workers=settings.THUMBNAIL_PROCESSES) as pool:
+        logger.info("thumbnail worker started with %d processes", settings.THUMBNAIL_PROCESSES)
+        while True:
+            await slots.acquire()
+            raw = await r.blmove(THUMBNAIL_QUEUE, THUMBNAIL_PROCESSING, 5, "RIGHT", "LEFT")
+            if raw is None:
+                slots.release()
+                continue
+            task = asyncio.create_task(_handle(pool, raw))
+            tasks.add(task)
+            task.add_done_callback(lambda t: (tasks.discard(t), slots.release()))
+
+
+async def recover() -> int:
+    r = get_redis()
+    moved = 0
+    while await r.lmove(THUMBNAIL_PROCESSING, THUMBNAIL_QUEUE, "RIGHT", "LEFT") is not None:
+        moved += 1
+    return moved
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    if "--recover" in sys.argv:
+        print(f"requeued {asyncio.run(recover())} jobs")
+    else:
+        asyncio.run(run())
@@ -1,26 +1,362 @@
 import asyncio
-import json
-from typing import Dict, Set
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, HTTPException
-from jose import jwt
+import heapq
+import logging
+import random
+import time
+from typing import Any, Dict, Set
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
+from sqlalchemy import select, or_
 from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.db.models import ConversationParticipant, User
+from app.services.auth import verify_token
+from app.services.codec import dumps, loads
 from app.services.redis_client import get_redis
+from app.services.message_stream import read_since
+from app.services.metrics import WS_CONNECTIONS, WS_EVENTS, WS_PUBSUB_LAG_SECONDS
+from app.services.presence import PRESENCE_CHANNEL
+from app.services.ws_registry import (
+    NODE_ID,
+    lease_users,
+    node_channel,
+    registry_metrics,
+    release_user,
+    start_registry_heartbeat,
+    stop_registry_heartbeat,
+)
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Channels consumed by the per-process subscriber and routed to local sockets. Conversation
+# events (messages, typing, receipts, thumbnails) arrive only on this node's own channel, published
+# by ws_registry to the nodes that lease one of the conversation's members.
+NODE_CHANNEL = node_channel()
+EVENT_CHANNELS = (
+    "events:conversations",
+    PRESENCE_CHANNEL,
+    NODE_CHANNEL,
+)
+PRESENCE_WATCH_MAX = 500
+# Connections listed individually in ws_stats(): the deepest queues, then the most drops
+WS_STATS_TOP = 5
+
+# Events that may be dropped when a client's queue is full; everything else must arrive or the
+# client is disconnected (it can resume from its last seq, see replay())
+DROPPABLE = ("typing", "presence")
+
+ws_metrics: dict[str, int] = {
+    "connections": 0,
+    "sent": 0,
+    "dropped": 0,
+    "coalesced": 0,
+    "evicted_slow": 0,
+    "closed_idle": 0,
+}
+
+
+class Connection:
+    # One socket plus its bounded outbound queue, drained by a single writer task
+    def __init__(self, websocket: WebSocket, subject: str):
+        self.websocket = websocket
+        self.subject = subject
+        self.queue: asyncio.Queue[list] = asyncio.Queue(maxsize=settings.WS_SEND_QUEUE_SIZE)
+        self.pending: dict[tuple, list] = {}  # coalesce key -> queued [text, data] box
+        self.closed = False
+        self.last_rx = time.monotonic()
+        self.stats = {"sent": 0, "dropped": 0, "coalesced": 0, "max_queue": 0}
+        self.writer: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self.writer = asyncio.create_task(self._write_loop())
+
+    def offer(self, data: dict[str, Any], text: str | None = None) -> None:
+        # Non-blocking enqueue used by the fan-out path; never awaits a slow socket
+        if self.closed:
+            return
+        kind, key = _classify(data)
+        box = self.pending.get(key) if key else None
+        if box is not None:
+            if kind == "receipts":
+                box[1] = {**box[1], "readers": {**box[1].get("readers", {}), **data.get("readers", {})}}
+            else:
+                box[1] = data
+            box[0] = None if kind == "receipts" else text
+            self.stats["coalesced"] += 1
+            ws_metrics["coalesced"] += 1
+            return
+        if self.queue.full():
+            if kind in DROPPABLE:
+                self.stats["dropped"] += 1
+                ws_metrics["dropped"] += 1
+                return
+            self.evict()
+            return
+        box = [text, data]
+        if key:
+            self.pending[key] = box
+        self.queue.put_nowait(box)
+        self.stats["max_queue"] = max(self.stats["max_queue"], self.queue.qsize())
+
+    async def put(self, data: dict[str, Any]) -> None:
+        # Blocking enqueue for replies to this client (replay, pong); backpressures its own reads
+        if not self.closed:
+            await self.queue.put([None, data])
+
+    def put_all(self, events: list[dict[str, Any]]) -> bool:
+        # Enqueue a replay only if all of it fits in the free queue space; False leaves the queue untouched
+        if self.closed or len(events) > self.queue.maxsize - self.queue.qsize():
+            return False
+        for data in events:
+            self.queue.put_nowait([None, data])
+        self.stats["max_queue"] = max(self.stats["max_queue"], self.queue.qsize())
+        return True
+
+    async def _write_loop(self) -> None:
+        try:
+            while True:
+                box = await self.queue.get()
+                kind, key = _classify(box[1])
+                if key and self.pending.get(key) is box:
+                    del self.pending[key]
+                text = box[0] if box[0] is not None else dumps(box[1])
+                try:
+                    await asyncio.wait_for(self.websocket.send_text(text), settings.WS_SEND_TIMEOUT_SECONDS)
+                except asyncio.TimeoutError:
+                    self.evict()
+                    return
+                self.stats["sent"] += 1
+                ws_metrics["sent"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._shutdown()
+
+    def evict(self) -> None:
+        # Slow consumer: too far behind to deliver must-arrive events; it reconnects and resumes
+        if self.closed:
+            return
+        ws_metrics["evicted_slow"] += 1
+        self._shutdown(code=1013)
+
+    def _shutdown(self, code: int = 1000) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        if self.writer is not None and self.writer is not asyncio.current_task():
+            self.writer.cancel()
+        # drop queued payloads right away so dead sockets hold no event memory
+        self.pending.clear()
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        asyncio.create_task(self._close_socket(code))
+
+    async def _close_socket(self, code: int) -> None:
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def close(self) -> None:
+        self._shutdown()
+
+
+def _classify(data: dict[str, Any]) -> tuple[str, tuple | None]:
+    if "typing" in data and "user" in data:
+        return "typing", ("typing", data.get("conversation_id"), data.get("user"))
+    kind = data.get("type") or ""
+    if kind == "presence":
+        return kind, ("presence", data.get("user"))
+    if kind == "receipts":
+        return kind, ("receipts", data.get("conversation_id"))
+    return kind, None
+
+
 # Simple connection manager per user (by email subject)
-connections: Dict[str, Set[WebSocket]] = {}
+connections: Dict[str, Set[Connection]] = {}
+# Routing table: conversation_id -> locally connected participant subjects, and the reverse index
+conversation_members: Dict[str, Set[str]] = {}
+user_conversations: Dict[str, Set[str]] = {}
+# Presence subscriptions: watched email -> connections, and per-connection watch lists for cleanup
+presence_watchers: Dict[str, Set[Connection]] = {}
+socket_watches: Dict[Connection, Set[str]] = {}
+
+_listener_task: asyncio.Task | None = None
 
 
 def authenticate_token(token: str) -> str:
-    try:
-        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
-        sub = payload.get("sub")
-        if not sub:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return sub
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    return verify_token(token).sub
+
+
+async def _load_conversation_ids(subject: str) -> Set[str]:
+    async with AsyncSessionLocal() as db:
+        res = await db.execute(
+            select(ConversationParticipant.conversation_id)
+            .outerjoin(User, User.id == ConversationParticipant.user_id)
+            .where(or_(User.email == subject, ConversationParticipant.external_email == subject))
+        )
+        return {str(cid) for cid in res.scalars().all()}
+
+
+def _join(subject: str, conversation_ids: Set[str]) -> None:
+    user_conversations.setdefault(subject, set()).update(conversation_ids)
+    for cid in conversation_ids:
+        conversation_members.setdefault(cid, set()).add(subject)
+
+
+def _leave(subject: str) -> None:
+    for cid in user_conversations.pop(subject, set()):
+        members = conversation_members.get(cid)
+        if members is None:
+            continue
+        members.discard(subject)
+        if not members:
+            del conversation_members[cid]
+
+
+async def register(subject: str, conn: Connection) -> None:
+    first = subject not in connections
+    connections.setdefault(subject, set()).add(conn)
+    ws_metrics["connections"] += 1
+    WS_CONNECTIONS.inc()
+    if first:
+        _join(subject, await _load_conversation_ids(subject))
+        await lease_users([subject])
+
+
+def watch_presence(conn: Connection, emails: list[str]) -> None:
+    watched = socket_watches.setdefault(conn, set())
+    for email in emails:
+        if len(watched) >= PRESENCE_WATCH_MAX:
+            break
+        if isinstance(email, str):
+            watched.add(email)
+            presence_watchers.setdefault(email, set()).add(conn)
+
+
+def _unwatch(conn: Connection) -> None:
+    for email in socket_watches.pop(conn, set()):
+        watchers = presence_watchers.get(email)
+        if watchers is None:
+            continue
+        watchers.discard(conn)
+        if not watchers:
+            del presence_watchers[email]
+
+
+async def unregister(subject: str, conn: Connection) -> None:
+    _unwatch(conn)
+    conns = connections.get(subject)
+    if conns is None or conn not in conns:
+        return
+    ws_metrics["connections"] -= 1
+    WS_CONNECTIONS.dec()
+    conns.discard(conn)
+    if not conns:
+        del connections[subject]
+        _leave(subject)
+        try:
+            await release_user(subject)
+        except Exception:
+            pass  # the lease lapses on its own without heartbeats
+
+
+def _send_all(conns: Any, data: dict[str, Any], text: str | None) -> None:
+    # encode once per event, not once per socket
+    if text is None:
+        text = dumps(data)
+    for conn in conns:
+        conn.offer(data, text)
+
+
+async def dispatch(channel: str, data: dict[str, Any], text: str | None = None) -> None:
+    if data.get("type") == "probe":
+        # heartbeat probe published to our own node channel: measures pubsub + event loop delay
+        WS_PUBSUB_LAG_SECONDS.observe(max(0.0, time.time() - data.get("sent_at", time.time())))
+        return
+    WS_EVENTS.labels("node" if channel == NODE_CHANNEL else channel).inc()
+    if channel == PRESENCE_CHANNEL:
+        _send_all(list(presence_watchers.get(data.get("user"), ())), data, text)
+        return
+    cid = data.get("conversation_id")
+    if not cid:
+        return
+    cid = str(cid)
+    if channel == "events:conversations":
+        # New conversation: extend the routing table for locally connected participants
+        for email in data.get("participants") or []:
+            if email in connections:
+                _join(email, {cid})
+    subjects = conversation_members.get(cid, ())
+    _send_all([c for s in subjects for c in connections.get(s, ())], data, text)
+
+
+async def _listen() -> None:
+    # Resubscribes with capped exponential backoff whenever the Redis connection drops; clients
+    # recover anything published in the gap from the message streams (see replay())
+    backoff = 0.5
+    while True:
+        pubsub = get_redis().pubsub()
+        try:
+            await pubsub.subscribe(*EVENT_CHANNELS)
+            backoff = 0.5
+            async for msg in pubsub.listen():
+                if msg is None or msg.get("type") != "message":
+                    continue
+                raw = msg.get("data")
+                try:
+                    data = loads(raw)
+                except Exception:
+                    continue
+                try:
+                    await dispatch(msg.get("channel"), data, raw)
+                except Exception:
+                    logger.exception("dispatching event on %s failed", msg.get("channel"))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("event subscription lost; resubscribing in %.1fs", backoff)
+        finally:
+            try:
+                await pubsub.unsubscribe()
+                await pubsub.aclose()
+            except Exception:
+                pass
+        await asyncio.sleep(backoff + random.random() * backoff / 2)
+        backoff = min(backoff * 2, 30.0)
+
+
+def start_event_listener() -> None:
+    # One shared Redis subscription per worker process
+    global _listener_task
+    if _listener_task is None or _listener_task.done():
+        _listener_task = asyncio.create_task(_listen())
+    start_registry_heartbeat(connections.keys)
+
+
+async def stop_event_listener() -> None:
+    global _listener_task
+    if _listener_task is not None:
+        _listener_task.cancel()
+        try:
+            await _listener_task
+        except (asyncio.CancelledError, Exception):
+            pass
+        _listener_task = None
+    await stop_registry_heartbeat(connections.keys)
+
+
+async def replay(conn: Connection, offsets: dict[str, str]) -> None:
+    # Resume: send only what the client missed since its last seen seq per conversation
+    allowed = user_conversations.get(conn.subject, set())
+    for cid, offset in offsets.items():
+        if cid not in allowed or not isinstance(offset, str):
+            continue
+        events, complete = await read_since(cid, offset)
+        # a gap larger than the free send-queue space is reloaded over REST instead
+        if not complete or not conn.put_all(events):
+            await conn.put({"type": "resync", "conversation_id": cid})
 
 
 @router.websocket("/ws")
@@ -28,45 +364,53 @@ async def ws_endpoint(websocket: WebSocket, token: str = Query(...)):
     subject = authenticate_token(token)
     await websocket.accept()
 
-    # Register connection
-    conns = connections.setdefault(subject, set())
-    conns.add(websocket)
+    start_event_listener()
+    conn = Connection(websocket, subject)
+    conn.start()
 
-    # Start Redis pubsub listener
-    redis = get_redis()
-    pubsub = redis.pubsub()
-    await pubsub.subscribe("events:typing", "events:receipts")
-
-    async def reader():
-        async for msg in pubsub.listen():
-            if msg is None:
+    # registered inside the try so a failure part-way (conversation load, lease) is still unwound below
+    try:
+        await register(subject, conn)
+        while not conn.closed:
+            # wake at least every ping interval to send keepalives and enforce the idle timeout
+            try:
+                frame = loads(await asyncio.wait_for(websocket.receive_text(), settings.WS_PING_INTERVAL_SECONDS))
+            except asyncio.TimeoutError:
+                if time.monotonic() - conn.last_rx > settings.WS_IDLE_TIMEOUT_SECONDS:
+                    ws_metrics["closed_idle"] += 1
+                    break
+                conn.offer({"type": "ping"})
                 continue
-            if msg.get("type") != "message":
+            except (ValueError, KeyError):
+                conn.last_rx = time.monotonic()
                 continue
-            try:
-                data = json.loads(msg.get("data"))
-            except Exception:
+            conn.last_rx = time.monotonic()
+            if not isinstance(frame, dict):
                 continue
-            # Forward all for now; client filters by conversation_id
-            try:
-                await websocket.send_json(data)
-            except Exception:
-                break
-
-    reader_task = asyncio.create_task(reader())
-
-    try:
-        while True:
-            # keepalive: receive pings if any; sleep to yield control
-            await asyncio.sleep(1)
-    except WebSocketDisconnect:
+            kind = frame.get("type")
+            if kind == "ping":
+                await conn.put({"type": "pong"})
+            elif kind == "resume" and isinstance(frame.get("offsets"), dict):
+                await replay(conn, frame["offsets"])
+            elif kind == "presence.watch" and isinstance(frame.get("emails"), list):
+                watch_presence(conn, frame["emails"])
+    except (WebSocketDisconnect, RuntimeError):
         pass
     finally:
-        reader_task.cancel()
-        try:
-            await pubsub.unsubscribe()
-        except Exception:
-            pass
-        conns = connections.get(subject)
-        if conns and websocket in conns:
-            conns.remove(websocket)
+        await unregister(subject, conn)
+        await conn.close()
+
+
+def ws_stats() -> dict[str, Any]:
+    conns = [c for cs in connections.values() for c in cs]
+    queued = [c.queue.qsize() for c in conns]
+    worst = heapq.nlargest(WS_STATS_TOP, conns, key=lambda c: (c.queue.qsize(), c.stats["dropped"]))
+    return {
+        **ws_metrics,
+        "queued_events": sum(queued),
+        "max_queue_depth": max(queued, default=0),
+        "top_connections": [{"subject": c.subject, "queued": c.queue.qsize(), **c.stats} for c in worst],
+        "node_id": NODE_ID,
+        "local_users": len(connections),
+        "registry": registry_metrics,
+    }
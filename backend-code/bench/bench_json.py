@@ -0,0 +1,168 @@
+"""History page serialization: ORM + response_model validation vs Core rows + orjson.
+
+    python -m bench.bench_json [--db] [rounds]
+
+Times building and encoding a message page of 1,000 and 10,000 rows both ways:
+- legacy: Message ORM objects -> MessageOut.model_validate -> MessagePage, then FastAPI's
+  response_model handling (serialize_response) and JSONResponse (stdlib json)
+- fast: Core rows of MESSAGE_OUT_COLUMNS -> dicts -> RowJSONResponse (orjson), as list_messages does now
+plus encode+decode of the same number of WebSocket message events with stdlib json vs app.services.codec.
+
+Without --db the rows are built in memory (ORM objects are constructed directly). With --db they
+are fetched from Postgres (DATABASE_URL; expects a migrated database), seeding one conversation with
+10,000 messages owned by json-bench@example.com on the first run.
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("MINIO_ENDPOINT", "localhost:9000")
+os.environ.setdefault("MINIO_ACCESS_KEY", "minioadmin")
+os.environ.setdefault("MINIO_SECRET_KEY", "minioadmin")
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_model_field  # noqa: E402
+from sqlalchemy import select, text  # noqa: E402
+from sqlalchemy.engine.result import IteratorResult, SimpleResultMetaData  # noqa: E402
+from app.api.routes.messages import MESSAGE_OUT_COLUMNS  # noqa: E402
+from app.db.models import Message  # noqa: E402
+from app.schemas.common import MessageOut, MessagePage  # noqa: E402
+from app.services.codec import RowJSONResponse, dumps, loads  # noqa: E402
+
+SIZES = (1_000, 10_000)
+BENCH_SUBJECT = "json-bench"
+# what FastAPI builds for response_model=MessagePage
+RESPONSE_FIELD = create_model_field(name="Response_list_messages", type_=MessagePage, mode="serialization")
+
+_SEED_SQL = """
+WITH c AS (
+  INSERT INTO conversations (id, subject, created_at) VALUES (gen_random_uuid(), :subject, now()) RETURNING id
+)
+INSERT INTO messages (id, conversation_id, external_from_email, body_text, direction, status, created_at)
+SELECT gen_random_uuid(), c.id, 'sender' || (g % 7) || '@example.com',
+       repeat('Lorem ipsum dolor sit amet, consectetur adipiscing elit. ', 1 + g % 4), 'inbound', 'delivered',
+       now() - make_interval(secs => g)
+FROM c, generate_series(1, :n) AS g
+"""
+
+
+def _row_values(n: int) -> list[tuple]:
+    base = datetime(2024, 1, 1)
+    cid = uuid.uuid4()
+    return [
+        (uuid.uuid4(), cid, None, f"sender{i % 7}@example.com",
+         "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * (1 + i % 4), None,
+         "inbound", "delivered", base + timedelta(seconds=i))
+        for i in range(n)
+    ]
+
+
+def _memory_orm(values: list[tuple]) -> list[Message]:
+    keys = [c.name for c in MESSAGE_OUT_COLUMNS]
+    return [Message(**dict(zip(keys, v))) for v in values]
+
+
+def _memory_rows(values: list[tuple]) -> list:
+    return IteratorResult(SimpleResultMetaData([c.name for c in MESSAGE_OUT_COLUMNS]), iter(values)).all()
+
+
+async def legacy_page(messages: list[Message]) -> bytes:
+    items = [MessageOut.model_validate(m) for m in messages]
+    page = MessagePage(items=items, next_cursor=None)
+    content = await serialize_response(field=RESPONSE_FIELD, response_content=page)
+    return JSONResponse(content).body
+
+
+def fast_page(rows: list) -> bytes:
+    items = [dict(r._mapping) for r in rows]
+    for item in items:
+        item["attachments"] = []
+    return RowJSONResponse({"items": items, "next_cursor": None}).body
+
+
+def _events(page: bytes) -> list[dict]:
+    cid = str(uuid.uuid4())
+    return [
+        {"type": "message", "conversation_id": cid, "seq": f"{1700000000000 + i}-0", "message": m}
+        for i, m in enumerate(json.loads(page)["items"])
+    ]
+
+
+async def _best(fn, rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        out = fn()
+        if asyncio.iscoroutine(out):
+            await out
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+async def _seed_and_fetch(n: int) -> tuple:
+    from app.db.session import AsyncSessionLocal, engine
+
+    async with AsyncSessionLocal() as db:
+        cid = (await db.execute(text("SELECT id FROM conversations WHERE subject = :s"), {"s": BENCH_SUBJECT})).scalar()
+        if cid is None:
+            await db.execute(text(_SEED_SQL), {"subject": BENCH_SUBJECT, "n": max(SIZES)})
+            await db.commit()
+            cid = (await db.execute(text("SELECT id FROM conversations WHERE subject = :s"), {"s": BENCH_SUBJECT})).scalar()
+    order = (Message.created_at.desc(), Message.id.desc())
+
+    async def fetch_orm() -> list[Message]:
+        async with AsyncSessionLocal() as db:
+            return list((await db.execute(select(Message).where(Message.conversation_id == cid).order_by(*order).limit(n))).scalars().all())
+
+    async def fetch_rows() -> list:
+        async with AsyncSessionLocal() as db:
+            return (await db.execute(select(*MESSAGE_OUT_COLUMNS).where(Message.conversation_id == cid).order_by(*order).limit(n))).all()
+
+    return fetch_orm, fetch_rows, engine
+
+
+async def main() -> None:
+    use_db = "--db" in sys.argv
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    rounds = int(args[0]) if args else 5
+    print(f"{'rows':>6s}  {'legacy ms':>10s}  {'fast ms':>8s}  {'speedup':>7s}   {'events json ms':>14s}  {'codec ms':>8s}  {'speedup':>7s}")
+    for n in SIZES:
+        if use_db:
+            fetch_orm, fetch_rows, engine = await _seed_and_fetch(n)
+
+            async def legacy() -> bytes:
+                return await legacy_page(await fetch_orm())
+
+            async def fast() -> bytes:
+                return fast_page(await fetch_rows())
+        else:
+            values = _row_values(n)
+
+            async def legacy() -> bytes:
+                return await legacy_page(_memory_orm(values))
+
+            async def fast() -> bytes:
+                return fast_page(_memory_rows(values))
+
+        # both paths must produce the same document
+        assert json.loads(await legacy()) == json.loads(await fast())
+        t_legacy = await _best(legacy, rounds)
+        t_fast = await _best(fast, rounds)
+
+        events = _events(await fast())
+        t_json = await _best(lambda: [json.loads(json.dumps(e)) for e in events], rounds)
+        t_codec = await _best(lambda: [loads(dumps(e)) for e in events], rounds)
+        print(f"{n:6d}  {t_legacy * 1000:10.1f}  {t_fast * 1000:8.1f}  {t_legacy / t_fast:6.1f}x   "
+              f"{t_json * 1000:14.1f}  {t_codec * 1000:8.1f}  {t_json / t_codec:6.1f}x")
+    if use_db:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,119 @@
+"""Full-text search latency over a synthetic corpus.
+
+    DATABASE_URL=postgresql+asyncpg://... python -m bench.bench_search [messages] [queries]
+
+Expects a migrated database (`alembic upgrade head`).
+Seeds `messages` (once; reruns reuse the corpus owned by search-bench@example.com) with
+server-side generated bodies whose terms follow a skewed distribution, so queries cover
+both common and rare words, then runs the /search/messages handler against it and reports
+p50/p95/p99 latency for the first page. Defaults: 2,000,000 messages, 500 queries.
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("MINIO_ENDPOINT", "localhost:9000")
+os.environ.setdefault("MINIO_ACCESS_KEY", "minioadmin")
+os.environ.setdefault("MINIO_SECRET_KEY", "minioadmin")
+
+from sqlalchemy import func, select, text  # noqa: E402
+from app.api.routes.search import search_messages  # noqa: E402
+from app.db.models import ConversationParticipant, Message, User  # noqa: E402
+from app.db.session import AsyncSessionLocal, engine  # noqa: E402
+from app.services.auth import Principal  # noqa: E402
+
+BENCH_EMAIL = "search-bench@example.com"
+CONVERSATIONS = 2000
+VOCABULARY = 20000
+CHUNK = 200_000
+
+# 8-40 terms per body; power(random(), 3) skews towards low term numbers (frequent words).
+# Every fifth message only has an HTML body, to exercise tag stripping in the generated column.
+_SEED_SQL = """
+INSERT INTO messages (id, conversation_id, body_text, body_html, direction, status, created_at)
+SELECT gen_random_uuid(), c.ids[1 + (g % array_length(c.ids, 1))],
+       CASE WHEN g % 5 <> 0 THEN b.body END,
+       CASE WHEN g % 5 = 0 THEN '<div><p>' || b.body || '</p></div>' END,
+       'inbound', 'sent', now() - make_interval(secs => g)
+FROM generate_series(:start, :stop - 1) AS g
+CROSS JOIN (SELECT array_agg(conversation_id) AS ids FROM conversation_participants WHERE user_id = :uid) AS c
+CROSS JOIN LATERAL (
+  SELECT string_agg('term' || floor(:vocab * power(random(), 3))::int, ' ') AS body
+  FROM generate_series(1, 8 + (g % 33))
+) AS b
+"""
+
+
+async def seed(n: int) -> uuid.UUID:
+    async with AsyncSessionLocal() as db:
+        uid = (await db.execute(select(User.id).where(User.email == BENCH_EMAIL))).scalar_one_or_none()
+        if uid is None:
+            uid = uuid.uuid4()
+            await db.execute(text("INSERT INTO users (id, email, provider, created_at) VALUES (:id, :email, 'bench', now())"),
+                             {"id": uid, "email": BENCH_EMAIL})
+            await db.execute(text("""
+                WITH c AS (
+                  INSERT INTO conversations (id, subject, created_at)
+                  SELECT gen_random_uuid(), 'bench ' || g, now() FROM generate_series(1, :n) AS g
+                  RETURNING id
+                )
+                INSERT INTO conversation_participants (id, conversation_id, user_id)
+                SELECT gen_random_uuid(), id, :uid FROM c
+            """), {"n": CONVERSATIONS, "uid": uid})
+            await db.commit()
+        have = (await db.execute(
+            select(func.count())
+            .select_from(Message)
+            .join(ConversationParticipant, ConversationParticipant.conversation_id == Message.conversation_id)
+            .where(ConversationParticipant.user_id == uid)
+        )).scalar_one()
+    for start in range(have, n, CHUNK):
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            await db.execute(text(_SEED_SQL), {"start": start, "stop": min(start + CHUNK, n), "uid": uid, "vocab": VOCABULARY})
+            await db.commit()
+        print(f"seeded {min(start + CHUNK, n):>10,d} messages ({time.perf_counter() - started:.1f}s)")
+    async with engine.begin() as conn:
+        await conn.execute(text("ANALYZE messages"))
+    return uid
+
+
+def _queries(count: int) -> list[str]:
+    rng = random.Random(17)
+    out = []
+    for i in range(count):
+        # mix of frequent, mid and rare terms, single words and two-word AND queries
+        terms = [f"term{int(VOCABULARY * rng.random() ** 3)}" for _ in range(1 + i % 2)]
+        out.append(" ".join(terms))
+    return out
+
+
+async def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    uid = await seed(n)
+    principal = Principal(sub=BENCH_EMAIL, uid=uid, exp=0)
+    timings = []
+    hits = 0
+    async with AsyncSessionLocal() as db:
+        for q in _queries(count):
+            started = time.perf_counter()
+            page = await search_messages(q=q, conversation_id=None, cursor=None, limit=20, principal=principal, db=db)
+            timings.append((time.perf_counter() - started) * 1000)
+            hits += len(page.items)
+    timings.sort()
+
+    def pct(p: float) -> float:
+        return timings[min(len(timings) - 1, int(p * len(timings)))]
+
+    print(f"{count} queries over {n:,d} messages, {hits / count:.1f} hits/page")
+    print(f"p50 {pct(0.50):.1f}ms  p95 {pct(0.95):.1f}ms  p99 {pct(0.99):.1f}ms  max {timings[-1]:.1f}ms")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+"""Typing-path throughput against a local Redis: per-keystroke SETEX+PUBLISH vs transition-only Lua.
+
+    REDIS_URL=redis://localhost:6380/0 python -m bench.bench_typing [users] [keystrokes_per_user]
+
+Simulates users typing in parallel (typing=true per keystroke, typing=false at the end) and
+reports calls/s plus the number of typing events actually published.
+"""
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+os.environ.setdefault("REDIS_URL", "redis://localhost:6380/0")
+os.environ.setdefault("MINIO_ENDPOINT", "localhost:9002")
+os.environ.setdefault("MINIO_ACCESS_KEY", "minioadmin")
+os.environ.setdefault("MINIO_SECRET_KEY", "minioadmin")
+
+from app.services.redis_client import get_redis, publish  # noqa: E402
+from app.services.typing import set_typing_state, typing_metrics  # noqa: E402
+from app.services.ws_registry import set_members  # noqa: E402
+
+
+async def legacy_set_typing(conversation_id: str, subject: str, typing: bool) -> bool:
+    # the pre-debounce implementation: write + global publish on every call
+    r = get_redis()
+    key = f"typing:{conversation_id}:{subject}"
+    if typing:
+        await r.setex(key, 5, "1")
+    else:
+        await r.delete(key)
+    await publish("events:typing", {"conversation_id": conversation_id, "user": subject, "typing": typing})
+    return True
+
+
+async def drive(fn, users: int, keystrokes: int) -> tuple[float, int]:
+    cid = str(uuid.uuid4())
+    # seed the member cache so the routed path never falls back to Postgres
+    await set_members(cid, [f"bench{i}@example.com" for i in range(users)])
+
+    async def one(i: int) -> int:
+        subject = f"bench{i}@example.com"
+        sent = 0
+        for _ in range(keystrokes):
+            sent += await fn(cid, subject, True)
+        sent += await fn(cid, subject, False)
+        return sent
+
+    started = time.perf_counter()
+    sent = sum(await asyncio.gather(*(one(i) for i in range(users))))
+    return time.perf_counter() - started, sent
+
+
+async def main() -> None:
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    keystrokes = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    calls = users * (keystrokes + 1)
+    for name, fn in (("legacy (per keystroke)", legacy_set_typing), ("debounced (transitions)", set_typing_state)):
+        elapsed, broadcasts = await drive(fn, users, keystrokes)
+        print(f"{name:26s} {calls / elapsed:10.0f} calls/s  {broadcasts:8d} events broadcast  ({elapsed:.2f}s)")
+    print("metrics:", typing_metrics)
+    await get_redis().aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
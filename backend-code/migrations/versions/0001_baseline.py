@@ -0,0 +1,97 @@
+"""baseline: the schema create_all produced before migrations were introduced
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+Databases that were bootstrapped by the old startup create_all are adopted with
+`alembic stamp 0001` followed by `alembic upgrade head`.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Uuid(), primary_key=True),
+        sa.Column("email", sa.String(320), nullable=False),
+        sa.Column("display_name", sa.String(120), nullable=True),
+        sa.Column("avatar_url", sa.String(512), nullable=True),
+        sa.Column("provider", sa.String(50), nullable=False),
+        sa.Column("google_account_id", sa.String(64), nullable=True),
+        sa.Column("last_seen", sa.DateTime(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+    op.create_index("ix_users_google_account_id", "users", ["google_account_id"])
+
+    op.create_table(
+        "invites",
+        sa.Column("id", sa.Uuid(), primary_key=True),
+        sa.Column("email", sa.String(320), nullable=False),
+        sa.Column("inviter_user_id", sa.Uuid(), sa.ForeignKey("users.id"), nullable=True),
+        sa.Column("token", sa.String(64), nullable=False),
+        sa.Column("status", sa.String(20), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_invites_email", "invites", ["email"], unique=True)
+    op.create_index("ix_invites_token", "invites", ["token"])
+
+    op.create_table(
+        "conversations",
+        sa.Column("id", sa.Uuid(), primary_key=True),
+        sa.Column("subject", sa.String(255), nullable=True),
+        sa.Column("gmail_thread_id", sa.String(128), nullable=True),
+        sa.Column("created_by_user_id", sa.Uuid(), sa.ForeignKey("users.id"), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+
+    op.create_table(
+        "conversation_participants",
+        sa.Column("id", sa.Uuid(), primary_key=True),
+        sa.Column("conversation_id", sa.Uuid(), sa.ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("user_id", sa.Uuid(), sa.ForeignKey("users.id"), nullable=True),
+        sa.Column("external_email", sa.String(320), nullable=True),
+    )
+
+    op.create_table(
+        "messages",
+        sa.Column("id", sa.Uuid(), primary_key=True),
+        sa.Column("conversation_id", sa.Uuid(), sa.ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("sender_user_id", sa.Uuid(), sa.ForeignKey("users.id"), nullable=True),
+        sa.Column("external_from_email", sa.String(320), nullable=True),
+        sa.Column("body_text", sa.Text(), nullable=True),
+        sa.Column("body_html", sa.Text(), nullable=True),
+        sa.Column("direction", sa.String(10), nullable=False),
+        sa.Column("gmail_message_id", sa.String(128), nullable=True),
+        sa.Column("status", sa.String(12), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+
+    op.create_table(
+        "attachments",
+        sa.Column("id", sa.Uuid(), primary_key=True),
+        sa.Column("message_id", sa.Uuid(), sa.ForeignKey("messages.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("type", sa.String(10), nullable=False),
+        sa.Column("file_name", sa.String(255), nullable=False),
+        sa.Column("content_type", sa.String(127), nullable=False),
+        sa.Column("size_bytes", sa.Integer(), nullable=False),
+        sa.Column("storage_url", sa.String(512), nullable=False),
+        sa.Column("thumbnail_url", sa.String(512), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("attachments")
+    op.drop_table("messages")
+    op.drop_table("conversation_participants")
+    op.drop_table("conversations")
+    op.drop_table("invites")
+    op.drop_table("users")
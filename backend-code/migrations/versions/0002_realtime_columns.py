@@ -0,0 +1,51 @@
+"""inbox, receipt and search columns
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+IF NOT EXISTS throughout: dev databases stamped at 0001 may already have some of these from
+create_all. Adding the generated search_tsv column rewrites `messages` under an exclusive lock;
+on a large production table schedule it in a maintenance window.
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        ALTER TABLE conversations
+            ADD COLUMN IF NOT EXISTS last_message_at TIMESTAMP WITHOUT TIME ZONE,
+            ADD COLUMN IF NOT EXISTS last_message_id UUID
+    """)
+    op.execute("""
+        ALTER TABLE conversation_participants
+            ADD COLUMN IF NOT EXISTS last_read_message_id UUID,
+            ADD COLUMN IF NOT EXISTS last_read_at TIMESTAMP WITHOUT TIME ZONE,
+            ADD COLUMN IF NOT EXISTS last_delivered_at TIMESTAMP WITHOUT TIME ZONE
+    """)
+    op.execute("""
+        ALTER TABLE messages
+            ADD COLUMN IF NOT EXISTS search_tsv TSVECTOR GENERATED ALWAYS AS (
+                to_tsvector('english', coalesce(body_text, regexp_replace(coalesce(body_html, ''), '<[^>]*>', ' ', 'g')))
+            ) STORED
+    """)
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE messages DROP COLUMN IF EXISTS search_tsv")
+    op.execute("""
+        ALTER TABLE conversation_participants
+            DROP COLUMN IF EXISTS last_delivered_at,
+            DROP COLUMN IF EXISTS last_read_at,
+            DROP COLUMN IF EXISTS last_read_message_id
+    """)
+    op.execute("""
+        ALTER TABLE conversations
+            DROP COLUMN IF EXISTS last_message_id,
+            DROP COLUMN IF EXISTS last_message_at
+    """)
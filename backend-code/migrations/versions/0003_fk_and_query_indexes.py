@@ -0,0 +1,44 @@
+"""foreign-key and query indexes, built online
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+CREATE INDEX CONCURRENTLY cannot run inside a transaction, so each index is built in an
+autocommit block and never blocks writes. A failed concurrent build leaves an INVALID index
+behind; drop it and rerun the upgrade.
+"""
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+# (name, table, columns, postgresql_using)
+INDEXES = [
+    ("ix_conversation_participants_conversation_id", "conversation_participants", ["conversation_id"], None),
+    ("ix_conversation_participants_user_id", "conversation_participants", ["user_id"], None),
+    # also serves the messages.conversation_id foreign key (cascades from conversations)
+    ("ix_messages_conversation_created_id", "messages", ["conversation_id", "created_at", "id"], None),
+    ("ix_messages_sender_user_id", "messages", ["sender_user_id"], None),
+    ("ix_messages_search_tsv", "messages", ["search_tsv"], "gin"),
+    ("ix_attachments_message_id", "attachments", ["message_id"], None),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns, using in INDEXES:
+            op.create_index(
+                name, table, columns,
+                postgresql_concurrently=True,
+                postgresql_using=using,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
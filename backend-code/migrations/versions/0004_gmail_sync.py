@@ -0,0 +1,48 @@
+"""gmail accounts and sync idempotency keys
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+
+The unique indexes are built CONCURRENTLY; they fail (leaving an INVALID index to drop) if
+duplicate gmail_message_id / gmail_thread_id values already exist, so dedupe those first.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "gmail_accounts",
+        sa.Column("id", sa.Uuid(), primary_key=True),
+        sa.Column("user_id", sa.Uuid(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False, unique=True),
+        sa.Column("email", sa.String(320), nullable=False),
+        sa.Column("refresh_token", sa.Text(), nullable=False),
+        sa.Column("history_id", sa.String(32), nullable=True),
+        sa.Column("last_synced_at", sa.DateTime(), nullable=True),
+        sa.Column("sync_error", sa.String(255), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "messages_gmail_message_id_key", "messages", ["gmail_message_id"],
+            unique=True, postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            "conversations_gmail_thread_id_key", "conversations", ["gmail_thread_id"],
+            unique=True, postgresql_concurrently=True, if_not_exists=True,
+        )
+    # promote to the named UNIQUE constraints the models declare; metadata-only once the index exists
+    op.execute("ALTER TABLE messages ADD CONSTRAINT messages_gmail_message_id_key UNIQUE USING INDEX messages_gmail_message_id_key")
+    op.execute("ALTER TABLE conversations ADD CONSTRAINT conversations_gmail_thread_id_key UNIQUE USING INDEX conversations_gmail_thread_id_key")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE conversations DROP CONSTRAINT IF EXISTS conversations_gmail_thread_id_key")
+    op.execute("ALTER TABLE messages DROP CONSTRAINT IF EXISTS messages_gmail_message_id_key")
+    op.drop_table("gmail_accounts")
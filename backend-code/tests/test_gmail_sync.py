@@ -0,0 +1,182 @@
+"""Gmail sync pipeline (sync_account, ingest_messages, send_one) end to end against FakeGmailClient."""
+import json
+import uuid
+from datetime import datetime
+
+import httpx
+import pytest
+from sqlalchemy import func, insert, select
+from app.db.models import Conversation, ConversationParticipant, GmailAccount, Message, User
+from app.db.session import AsyncSessionLocal, engine
+from app.services.gmail_client import GmailMessage, rfc822_id
+from app.services.gmail_fake import FakeGmailClient
+from app.services.gmail_sync import GMAIL_STATS, SEND_DELAYED, account_ref, ingest_messages, send_one, sync_account
+
+ALICE = "alice@example.com"
+BOB = "bob@example.com"
+
+
+async def _link(email: str) -> uuid.UUID:
+    # a registered user with a linked Gmail account; returns the account id
+    user_id, account_id = uuid.uuid4(), uuid.uuid4()
+    async with engine.begin() as conn:
+        await conn.execute(insert(User.__table__), [{"id": user_id, "email": email}])
+        await conn.execute(insert(GmailAccount.__table__), [
+            {"id": account_id, "user_id": user_id, "email": email, "refresh_token": "fake"},
+        ])
+    return account_id
+
+
+async def _ref(account_id: uuid.UUID):
+    async with AsyncSessionLocal() as db:
+        return account_ref(await db.get(GmailAccount, account_id))
+
+
+async def _account(account_id: uuid.UUID) -> GmailAccount:
+    async with AsyncSessionLocal() as db:
+        return await db.get(GmailAccount, account_id)
+
+
+async def _messages() -> list[Message]:
+    async with AsyncSessionLocal() as db:
+        return list((await db.execute(select(Message).order_by(Message.created_at))).scalars().all())
+
+
+async def _count(model) -> int:
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(select(func.count()).select_from(model))).scalar_one()
+
+
+def _inbound(sender: str, to: str, subject: str, body: str) -> GmailMessage:
+    return GmailMessage(
+        id="", thread_id="", internal_date=datetime.utcnow(), from_email=sender, recipients=[to],
+        subject=subject, body_text=body, body_html=None, label_ids=["INBOX"],
+        headers={"message-id": f"<{uuid.uuid4()}@external>"},
+    )
+
+
+async def _queue_outbound(sender: str, recipient: str) -> uuid.UUID:
+    # a conversation between two linked users with one queued outbound message, as send_message leaves it
+    async with AsyncSessionLocal() as db:
+        users = dict((await db.execute(select(User.email, User.id).where(User.email.in_([sender, recipient])))).tuples().all())
+        cid, mid = uuid.uuid4(), uuid.uuid4()
+        await db.execute(insert(Conversation.__table__), [{"id": cid, "subject": "lunch?", "last_message_id": mid}])
+        await db.execute(insert(ConversationParticipant.__table__), [
+            {"id": uuid.uuid4(), "conversation_id": cid, "user_id": users[e]} for e in (sender, recipient)
+        ])
+        await db.execute(insert(Message.__table__), [{
+            "id": mid, "conversation_id": cid, "sender_user_id": users[sender], "body_text": "noon at the usual place?",
+            "direction": "outbound", "status": "queued", "created_at": datetime.utcnow(),
+        }])
+        await db.commit()
+    return mid
+
+
+def _job(message_id: uuid.UUID, account_id: uuid.UUID, attempt: int = 0) -> dict:
+    return {"message_id": str(message_id), "account_id": str(account_id), "attempt": attempt}
+
+
+def test_sync_ingests_once_per_gmail_message_id(run, db, redis):
+    fake = FakeGmailClient()
+    account_id = run(_link(ALICE))
+    assert run(sync_account(fake, account_id)) == 0  # first run only records the history cursor
+    first = fake.deliver(ALICE, _inbound("carol@elsewhere.org", ALICE, "hello", "first"))
+    reply = _inbound("carol@elsewhere.org", ALICE, "Re: hello", "second")
+    reply.headers["references"] = first.headers["message-id"]
+    fake.deliver(ALICE, reply)
+
+    assert run(sync_account(fake, account_id)) == 2
+    msgs = run(_messages())
+    assert [m.body_text for m in msgs] == ["first", "second"]
+    assert all(m.direction == "inbound" and m.status == "delivered" for m in msgs)
+    assert len({m.conversation_id for m in msgs}) == 1  # the reply joins the first message's thread
+
+    # the same Gmail messages again, directly and through a replayed cursor, insert nothing
+    ref = run(_ref(account_id))
+    assert run(ingest_messages(ref, run(fake.batch_get(ref, [m.gmail_message_id for m in msgs])))) == 0
+    assert run(sync_account(fake, account_id)) == 0
+    assert run(_count(Message)) == 2
+    assert run(_count(Conversation)) == 1
+    assert {m.gmail_message_id for m in msgs} >= {first.id}
+
+
+def test_expired_history_restarts_from_mailbox_head(run, db, redis):
+    fake = FakeGmailClient()
+    account_id = run(_link(ALICE))
+    run(sync_account(fake, account_id))
+    fake.deliver(ALICE, _inbound("carol@elsewhere.org", ALICE, "missed", "lost in the gap"))
+    fake.expire_history(ALICE)
+
+    assert run(sync_account(fake, account_id)) == 0
+    account = run(_account(account_id))
+    assert account.sync_error == "history expired; resumed from head"
+    assert account.history_id == run(fake.current_history_id(run(_ref(account_id))))
+
+    fake.deliver(ALICE, _inbound("carol@elsewhere.org", ALICE, "later", "after the restart"))
+    assert run(sync_account(fake, account_id)) == 1
+    assert [m.body_text for m in run(_messages())] == ["after the restart"]
+    assert run(_account(account_id)).sync_error is None
+
+
+def test_rate_limited_send_is_deferred(run, db, redis):
+    fake = FakeGmailClient(units_per_second=50)  # a send costs 100 units: Gmail always answers 429
+    account_id = run(_link(ALICE))
+    run(_link(BOB))
+    message_id = run(_queue_outbound(ALICE, BOB))
+
+    assert run(send_one(fake, _job(message_id, account_id))) == "deferred"
+    (msg,) = run(_messages())
+    assert msg.status == "queued" and msg.gmail_message_id is None
+    delayed = run(redis.zrange(SEND_DELAYED, 0, -1))
+    assert [json.loads(j)["message_id"] for j in delayed] == [str(message_id)]
+    assert run(redis.hget(GMAIL_STATS, "throttled")) == "1"
+    assert fake.mailboxes.get(ALICE, []) == []
+
+
+class CrashAfterSend(FakeGmailClient):
+    # delivers the message, then loses the response the way a dropped connection or a dying worker would
+    def __init__(self, error: Exception):
+        super().__init__()
+        self.error: Exception | None = error
+
+    async def send(self, account, raw, thread_id=None):
+        sent = await super().send(account, raw, thread_id)
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+        return sent
+
+
+@pytest.mark.parametrize("error", [httpx.ConnectError("connection reset"), RuntimeError("worker died")])
+def test_resend_after_lost_response_is_idempotent(error, run, db, redis):
+    fake = CrashAfterSend(error)
+    alice_id = run(_link(ALICE))
+    bob_id = run(_link(BOB))
+    fake.mailboxes[BOB] = []
+    run(sync_account(fake, alice_id))
+    run(sync_account(fake, bob_id))
+    message_id = run(_queue_outbound(ALICE, BOB))
+
+    job = _job(message_id, alice_id)
+    if isinstance(error, httpx.TransportError):
+        # transport failure: retried with attempt=1
+        assert run(send_one(fake, job)) == "retry"
+        assert job["attempt"] == 1
+    else:
+        # the worker crashed mid-send: the row is left in "sending" and --recover requeues the same job
+        with pytest.raises(RuntimeError):
+            run(send_one(fake, dict(job)))
+        assert run(_messages())[0].status == "sending"
+    assert run(send_one(fake, job)) == "sent"
+
+    assert fake.calls["send"] == 1
+    (copy,) = fake.mailboxes[ALICE]
+    assert copy[1].headers["message-id"] == rfc822_id(message_id)
+    (msg,) = run(_messages())
+    assert msg.status == "sent" and msg.gmail_message_id == copy[1].id
+
+    # both mailboxes now hold the mail; syncing them stores nothing twice
+    assert run(sync_account(fake, alice_id)) == 0
+    assert run(sync_account(fake, bob_id)) == 0
+    assert run(_count(Message)) == 1
+    assert run(_count(Conversation)) == 1
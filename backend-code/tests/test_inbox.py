@@ -0,0 +1,51 @@
+"""Inbox listing: one statement per page however many conversations the caller is in."""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+from app.db.models import Conversation, ConversationParticipant, Message, User
+from app.db.session import engine
+from app.services.auth import create_access_token
+
+SIZES = (1, 10, 50)
+INBOX_MAX_STATEMENTS = 1
+
+
+async def _seed_inbox(conversations: int) -> str:
+    # one user in `conversations` conversations, each with two external members and a last message;
+    # returns a bearer token for that user
+    user_id, email = uuid.uuid4(), f"inbox-{uuid.uuid4().hex[:8]}@example.com"
+    now = datetime.utcnow()
+    convs, members, messages = [], [], []
+    for i in range(conversations):
+        cid, mid = uuid.uuid4(), uuid.uuid4()
+        at = now - timedelta(minutes=i)
+        convs.append({"id": cid, "subject": f"inbox {i}", "created_at": at, "last_message_at": at, "last_message_id": mid})
+        messages.append({"id": mid, "conversation_id": cid, "external_from_email": "peer0@example.com",
+                         "body_text": "hello", "direction": "inbound", "status": "delivered", "created_at": at})
+        members.append({"id": uuid.uuid4(), "conversation_id": cid, "user_id": user_id, "external_email": None})
+        members += [
+            {"id": uuid.uuid4(), "conversation_id": cid, "user_id": None, "external_email": f"peer{j}@example.com"}
+            for j in range(2)
+        ]
+    async with engine.begin() as conn:
+        await conn.execute(insert(User.__table__), [{"id": user_id, "email": email}])
+        await conn.execute(insert(Conversation.__table__), convs)
+        await conn.execute(insert(ConversationParticipant.__table__), members)
+        await conn.execute(insert(Message.__table__), messages)
+    return create_access_token(email, {"uid": str(user_id)})
+
+
+@pytest.mark.parametrize("n", SIZES)
+def test_inbox_statement_count(n, run, db, api, statements):
+    token = run(_seed_inbox(n))
+    statements.count = 0
+    resp = run(api.get("/conversations/", params={"limit": 100}, headers={"Authorization": f"Bearer {token}"}))
+    assert resp.status_code == 200, resp.text
+    items = resp.json()["items"]
+    assert len(items) == n
+    assert [i["subject"] for i in items] == [f"inbox {i}" for i in range(n)]  # newest activity first
+    assert items[0]["last_message"]["body_text"] == "hello"
+    assert items[0]["unread_count"] == 1
+    assert statements.count <= INBOX_MAX_STATEMENTS, f"{statements.count} statements for {n} conversations"
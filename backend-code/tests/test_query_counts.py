@@ -0,0 +1,54 @@
+"""Statement-count regressions for conversation creation and participant listing.
+
+Each endpoint must stay within a fixed number of statements however many participants a conversation
+has: one IN lookup plus one multi-row insert for create, one join for the participant list.
+"""
+import uuid
+
+import pytest
+from sqlalchemy import insert
+from app.db.models import User
+from app.db.session import engine
+
+SIZES = (1, 10, 50)
+# insert conversation, IN lookup of participant users, multi-row participant insert
+CREATE_MAX_STATEMENTS = 3
+PARTICIPANTS_MAX_STATEMENTS = 1
+
+
+async def _seed_users(emails: list[str]) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(insert(User), [{"id": uuid.uuid4(), "email": e} for e in emails])
+
+
+async def _create(api, emails: list[str]) -> str:
+    resp = await api.post("/conversations/", json={"participants": emails, "subject": "query count"})
+    assert resp.status_code == 200, resp.text
+    return resp.json()["id"]
+
+
+def _participants(n: int) -> list[str]:
+    # half registered users, half external addresses
+    tag = uuid.uuid4().hex[:8]
+    return [f"qc-{tag}-{i}@example.com" for i in range(n)]
+
+
+@pytest.mark.parametrize("n", SIZES)
+def test_create_conversation_statement_count(n, run, db, redis, api, statements):
+    emails = _participants(n)
+    run(_seed_users(emails[::2]))
+    statements.count = 0
+    run(_create(api, emails))
+    assert statements.count <= CREATE_MAX_STATEMENTS, f"{statements.count} statements for {n} participants"
+
+
+@pytest.mark.parametrize("n", SIZES)
+def test_participants_statement_count(n, run, db, redis, api, statements):
+    emails = _participants(n)
+    run(_seed_users(emails[::2]))
+    cid = run(_create(api, emails))
+    statements.count = 0
+    resp = run(api.get(f"/conversations/{cid}/participants"))
+    assert resp.status_code == 200, resp.text
+    assert sorted(resp.json()["emails"]) == sorted(emails)
+    assert statements.count <= PARTICIPANTS_MAX_STATEMENTS, f"{statements.count} statements for {n} participants"
@@ -8,7 +8,7 @@ import { EmojiPicker } from "./EmojiPicker";
 import { FileUpload } from "./FileUpload";
 import { useMutation, useQuery, useQueryClient } from "@tanstack/react-query";
 import { getMe, listMessages, sendMessage as apiSendMessage, type Message as ApiMessage, receiptsDelivered, receiptsRead, setTyping, heartbeat, getParticipants, getLastSeen } from "@/lib/api";
-import { openWS, type WSEvent } from "@/lib/ws";
+import { openWS, watchPresence, type WSEvent } from "@/lib/ws";
 
 interface FileAttachment {
   file: File;
@@ -173,13 +173,23 @@ export function ChatArea({ chatId, onBack }: ChatAreaProps) {
   useEffect(() => {
     if (wsRef.current) return; // single connection for this component
     const ws = openWS((ev: WSEvent) => {
+      // presence events only arrive for emails this socket watches (the other participant)
+      if (ev && ev.type === 'presence') {
+        if (typeof ev.online === 'boolean') setOnline(ev.online);
+        if (ev.last_seen) setLastSeen(ev.last_seen);
+        return;
+      }
       if (!ev || !ev.conversation_id || ev.conversation_id !== chatId) return;
       // typing events
       if (typeof ev.typing === 'boolean' && ev.user && ev.user !== meQuery.data?.email) {
         setTypingOther(ev.typing);
       }
+      // new message pushed, or history gap too large to replay → refresh messages
+      if (ev.type === 'message' || ev.type === 'resync') {
+        qc.invalidateQueries({ queryKey: ["messages", chatId] });
+      }
       // receipt updates → refresh messages
-      if (ev.status && ev.message_ids && ev.message_ids.length) {
+      if (ev.type === 'receipts' || (ev.status && ev.message_ids && ev.message_ids.length)) {
         qc.invalidateQueries({ queryKey: ["messages", chatId] });
       }
     });
@@ -190,6 +200,16 @@ export function ChatArea({ chatId, onBack }: ChatAreaProps) {
     };
   }, [chatId, meQuery.data?.email, qc]);
 
+  // Presence pushed over WS instead of polling last-seen
+  useEffect(() => {
+    const ws = wsRef.current;
+    if (!ws || !otherEmail) return;
+    const send = () => watchPresence(ws, [otherEmail]);
+    if (ws.readyState === WebSocket.OPEN) send();
+    else ws.addEventListener('open', send, { once: true });
+    return () => ws.removeEventListener('open', send);
+  }, [otherEmail, meQuery.data?.email]);
+
   // Heartbeat every 30s
   useEffect(() => {
     const tick = async () => { try { await heartbeat(); } catch {} };
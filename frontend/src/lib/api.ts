@@ -45,9 +45,21 @@ export async function updateProfile(data: { display_name?: string; avatar_url?:
 }
 
 // Conversations
-export type Conversation = { id: string; subject?: string | null; created_at: string };
+export type Conversation = {
+  id: string;
+  subject?: string | null;
+  created_at: string;
+  last_message_at?: string | null;
+  last_message?: { id: string; sender_user_id?: string | null; external_from_email?: string | null; body_text?: string | null; created_at: string } | null;
+  unread_count?: number;
+};
+export type InboxPage = { items: Conversation[]; next_cursor?: string | null };
+export async function listInbox(cursor?: string): Promise<InboxPage> {
+  return request(`/conversations${cursor ? `?cursor=${encodeURIComponent(cursor)}` : ""}`);
+}
 export async function listConversations(): Promise<Conversation[]> {
-  return request("/conversations");
+  const page = await listInbox();
+  return page.items;
 }
 export async function createConversation(payload: { participants: string[]; subject?: string | null }): Promise<Conversation> {
   return request("/conversations", { method: "POST", body: JSON.stringify(payload) });
@@ -65,10 +77,35 @@ export type Message = {
   status: 'sent' | 'delivered' | 'read' | string;
   created_at: string;
 };
+export type MessagePage = { items: Message[]; next_cursor?: string | null };
+export async function listMessagesPage(conversationId: string, params: { before?: string; after?: string; limit?: number } = {}): Promise<MessagePage> {
+  const q = new URLSearchParams();
+  if (params.before) q.set("before", params.before);
+  if (params.after) q.set("after", params.after);
+  if (params.limit) q.set("limit", String(params.limit));
+  const qs = q.toString();
+  return request(`/messages/${conversationId}${qs ? `?${qs}` : ""}`);
+}
 export async function listMessages(conversationId: string): Promise<Message[]> {
-  return request(`/messages/${conversationId}`);
+  const page = await listMessagesPage(conversationId);
+  return page.items;
+}
+export type AttachmentIn = { object_key: string; file_name: string; content_type: string; size_bytes: number; type?: string };
+export type UploadTicket = {
+  object_key: string;
+  expires_in: number;
+  url?: string | null;
+  upload_id?: string | null;
+  part_size?: number | null;
+  parts: { part_number: number; url: string }[];
+};
+export async function createUpload(payload: { file_name: string; content_type: string; size_bytes: number }): Promise<UploadTicket> {
+  return request("/uploads/", { method: "POST", body: JSON.stringify(payload) });
 }
-export async function sendMessage(conversationId: string, payload: { text?: string; attachments?: string[] }): Promise<Message> {
+export async function completeUpload(payload: { object_key: string; upload_id: string; parts: { part_number: number; etag: string }[] }): Promise<{ ok: boolean }> {
+  return request("/uploads/complete", { method: "POST", body: JSON.stringify(payload) });
+}
+export async function sendMessage(conversationId: string, payload: { text?: string; attachments?: AttachmentIn[] }): Promise<Message> {
   return request(`/messages/${conversationId}`, { method: "POST", body: JSON.stringify(payload) });
 }
 
@@ -99,6 +136,9 @@ export async function getLastSeen(user_email: string): Promise<{ online: boolean
   if (!res.ok) throw new Error(await res.text());
   return res.json();
 }
+export async function lookupPresence(emails: string[]): Promise<{ users: Record<string, { online: boolean; last_seen: string | null }> }> {
+  return request("/presence/lookup", { method: "POST", body: JSON.stringify({ emails }) });
+}
 export async function setTyping(conversation_id: string, typing: boolean): Promise<{ ok: boolean }> {
   return request(`/typing`, { method: "POST", body: JSON.stringify({ conversation_id, typing }) });
 }
@@ -1,11 +1,17 @@
-import { WS_BASE } from "@/lib/api";
+import { WS_BASE, type Message } from "@/lib/api";
 
 export type WSEvent = {
+  type?: string; // message|resync|...
   conversation_id?: string;
+  seq?: string; // stream offset of a message event; send back in {type: "resume"} after reconnecting
+  message?: Message;
   user?: string;
   typing?: boolean;
   message_ids?: string[];
   status?: string; // delivered|read
+  readers?: Record<string, { read_up_to: string | null; last_read_message_id: string | null; delivered_up_to: string | null }>; // receipts events
+  online?: boolean; // presence events
+  last_seen?: string | null;
 };
 
 export function openWS(onMessage: (ev: WSEvent) => void): WebSocket | null {
@@ -16,8 +22,21 @@ export function openWS(onMessage: (ev: WSEvent) => void): WebSocket | null {
   ws.onmessage = (e) => {
     try {
       const data = JSON.parse(e.data);
+      // keepalive: the server closes sockets that stay silent past its idle timeout
+      if (data && data.type === "ping") {
+        ws.send(JSON.stringify({ type: "pong" }));
+        return;
+      }
       onMessage(data as WSEvent);
     } catch {}
   };
   return ws;
 }
+
+export function sendResume(ws: WebSocket, offsets: Record<string, string>) {
+  ws.send(JSON.stringify({ type: "resume", offsets }));
+}
+
+export function watchPresence(ws: WebSocket, emails: string[]) {
+  ws.send(JSON.stringify({ type: "presence.watch", emails }));
+}